@@ -0,0 +1,31 @@
+"""
+Composite (location_id, timestamp) index on sensor_readings
+
+Revision ID: 20261016_01
+Revises: 20250927_01
+Create Date: 2026-10-16
+"""
+from typing import Optional
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '20261016_01'
+down_revision: Optional[str] = '20250927_01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # sensor_readings is created by the app (Base.metadata.create_all), so it may
+    # not exist yet; the model declares the same index for fresh databases.
+    if not sa.inspect(op.get_bind()).has_table('sensor_readings'):
+        return
+    op.execute(sa.text(
+        'CREATE INDEX IF NOT EXISTS ix_sensor_readings_location_timestamp '
+        'ON sensor_readings (location_id, timestamp)'
+    ))
+
+
+def downgrade() -> None:
+    op.execute(sa.text('DROP INDEX IF EXISTS ix_sensor_readings_location_timestamp'))
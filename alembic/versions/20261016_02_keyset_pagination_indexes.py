@@ -0,0 +1,39 @@
+"""
+Composite indexes for keyset (cursor) pagination of list endpoints
+
+Revision ID: 20261016_02
+Revises: 20261016_01
+Create Date: 2026-10-16
+"""
+from typing import Optional
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '20261016_02'
+down_revision: Optional[str] = '20261016_01'
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns); the models declare the same indexes
+INDEXES = [
+    ('ix_sensor_readings_timestamp_id', 'sensor_readings', 'timestamp, id'),
+    ('ix_alerts_location_created_id', 'alerts', 'location_id, created_at, id'),
+    ('ix_alerts_created_id', 'alerts', 'created_at, id'),
+    ('ix_households_zipcode_id', 'households', 'zipcode, household_id'),
+    ('ix_household_sensor_readings_household_time_id', 'household_sensor_readings', 'household_id, timestamp, reading_id'),
+    ('ix_household_alerts_household_time_id', 'household_alerts', 'household_id, timestamp, alert_id'),
+]
+
+
+def upgrade() -> None:
+    # App tables are created by Base.metadata.create_all and may not exist yet
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        if inspector.has_table(table):
+            op.execute(sa.text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})'))
+
+
+def downgrade() -> None:
+    for name, _, _ in INDEXES:
+        op.execute(sa.text(f'DROP INDEX IF EXISTS {name}'))
@@ -0,0 +1,40 @@
+"""
+Overlay source column and lookup indexes for bulk-loaded open data
+
+Revision ID: 20261016_03
+Revises: 20261016_02
+Create Date: 2026-10-16
+"""
+from typing import Optional
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '20261016_03'
+down_revision: Optional[str] = '20261016_02'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_overlays_location_type_year', 'location_id, type, year'),
+    ('ix_overlays_source', 'source'),
+]
+
+
+def upgrade() -> None:
+    # App tables are created by Base.metadata.create_all and may not exist yet
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('overlays'):
+        return
+    if 'source' not in {c['name'] for c in inspector.get_columns('overlays')}:
+        op.add_column('overlays', sa.Column('source', sa.String(length=50), nullable=True))
+    for name, columns in INDEXES:
+        op.execute(sa.text(f'CREATE INDEX IF NOT EXISTS {name} ON overlays ({columns})'))
+
+
+def downgrade() -> None:
+    for name, _ in INDEXES:
+        op.execute(sa.text(f'DROP INDEX IF EXISTS {name}'))
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table('overlays') and 'source' in {c['name'] for c in inspector.get_columns('overlays')}:
+        op.drop_column('overlays', 'source')
@@ -0,0 +1,27 @@
+"""
+Time index on household_sensor_readings for zip-trend windows
+
+Revision ID: 20261017_01
+Revises: 20261016_03
+Create Date: 2026-10-17
+"""
+from typing import Optional
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '20261017_01'
+down_revision: Optional[str] = '20261016_03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # App tables are created by Base.metadata.create_all and may not exist yet
+    if not sa.inspect(op.get_bind()).has_table('household_sensor_readings'):
+        return
+    op.execute(sa.text('CREATE INDEX IF NOT EXISTS ix_household_sensor_readings_time ON household_sensor_readings (timestamp)'))
+
+
+def downgrade() -> None:
+    op.execute(sa.text('DROP INDEX IF EXISTS ix_household_sensor_readings_time'))
@@ -0,0 +1,146 @@
+"""
+Monthly range partitions for readings and alerts (Postgres)
+
+sensor_readings, household_sensor_readings, alerts and household_alerts
+become tables partitioned by month on their time column, with partitions
+named <table>_pYYYY_MM from the oldest row through three months ahead and
+a <table>_default partition for anything else. Each table is rebuilt:
+rename, create the partitioned parent, copy, drop the old table, then
+restore the primary key (now including the time column), indexes and
+foreign keys.
+
+Foreign keys that point at a partitioned table (alerts.reading_id,
+household_alerts.reading_id) cannot be kept: Postgres requires the
+referenced key to include the partition column. The reading ids stay as
+plain columns.
+
+This revision is a no-op on SQLite, which has no partitioning. The tables
+stay whole there and new rows are not routed by month. The retention job
+(app/services/partitions.py) falls back to one range DELETE per expired
+month, which is not O(1).
+
+Revision ID: 20261018_01
+Revises: 20261017_01
+Create Date: 2026-10-18
+"""
+from datetime import datetime
+from typing import Optional
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '20261018_01'
+down_revision: Optional[str] = '20261017_01'
+branch_labels = None
+depends_on = None
+
+# (table, primary key, partition column), readings before the alerts that point at them
+TABLES = (
+    ('sensor_readings', 'id', 'timestamp'),
+    ('household_sensor_readings', 'reading_id', 'timestamp'),
+    ('alerts', 'id', 'created_at'),
+    ('household_alerts', 'alert_id', 'timestamp'),
+)
+PARTITIONED = {t for t, _, _ in TABLES}
+PREMAKE_MONTHS = 3
+
+# Foreign keys into the readings tables, restored (NOT VALID) on downgrade
+READING_FKS = {
+    'alerts': 'FOREIGN KEY (reading_id) REFERENCES sensor_readings(id)',
+    'household_alerts': 'FOREIGN KEY (reading_id) REFERENCES household_sensor_readings(reading_id) ON DELETE SET NULL',
+}
+
+
+def _add_months(month: datetime, n: int) -> datetime:
+    years, index = divmod(month.month - 1 + n, 12)
+    return month.replace(year=month.year + years, month=index + 1)
+
+
+def _bound(month: datetime) -> str:
+    return f"'{month:%Y-%m-%d} 00:00:00+00'"
+
+
+def _is_partitioned(bind, table: str) -> bool:
+    return bool(bind.scalar(sa.text(
+        'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid '
+        'WHERE c.relname = :t AND pg_table_is_visible(c.oid))'
+    ), {'t': table}))
+
+
+def _definitions(bind, table: str, pk: str):
+    """Serial sequence, non-unique index DDL and outgoing foreign keys of ``table``."""
+    sequence = bind.scalar(sa.text('SELECT pg_get_serial_sequence(:t, :c)'), {'t': table, 'c': pk})
+    indexes = bind.scalars(sa.text(
+        "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :t AND indexdef NOT LIKE 'CREATE UNIQUE%'"
+    ), {'t': table}).all()
+    fks = bind.execute(sa.text(
+        "SELECT conname, pg_get_constraintdef(oid), confrelid::regclass::text FROM pg_constraint "
+        "WHERE conrelid = CAST(:t AS regclass) AND contype = 'f'"
+    ), {'t': table}).all()
+    return sequence, indexes, fks
+
+
+def _restore(table: str, pk_columns: str, sequence, indexes, fks, pk: str) -> None:
+    if sequence:
+        # The old table owned the serial sequence; keep it alive and in step
+        op.execute(f'ALTER SEQUENCE {sequence} OWNED BY {table}.{pk}')
+        op.execute(f'SELECT setval(\'{sequence}\', COALESCE((SELECT max({pk}) FROM {table}), 0) + 1, false)')
+    op.execute(f'ALTER TABLE {table} ADD PRIMARY KEY ({pk_columns})')
+    for indexdef in indexes:
+        op.execute(indexdef)
+    for name, definition, target in fks:
+        if target.split('.')[-1] not in PARTITIONED:
+            op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}')
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    inspector = sa.inspect(bind)
+    this_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    for table, pk, column in TABLES:
+        # App tables are created by Base.metadata.create_all and may not exist yet
+        if not inspector.has_table(table) or _is_partitioned(bind, table):
+            continue
+        sequence, indexes, fks = _definitions(bind, table, pk)
+        oldest = bind.scalar(sa.text(f'SELECT min("{column}") FROM {table}'))
+        old = f'{table}_unpartitioned'
+
+        op.execute(f'UPDATE {table} SET "{column}" = timezone(\'utc\', now()) WHERE "{column}" IS NULL')
+        op.execute(f'ALTER TABLE {table} RENAME TO {old}')
+        op.execute(f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING IDENTITY) PARTITION BY RANGE ("{column}")')
+        op.execute(f'ALTER TABLE {table} ALTER COLUMN "{column}" SET NOT NULL')
+        month = min(oldest.replace(tzinfo=None), this_month).replace(day=1, hour=0, minute=0, second=0, microsecond=0) if oldest else this_month
+        while month <= _add_months(this_month, PREMAKE_MONTHS):
+            op.execute(f'CREATE TABLE {table}_p{month:%Y_%m} PARTITION OF {table} '
+                       f'FOR VALUES FROM ({_bound(month)}) TO ({_bound(_add_months(month, 1))})')
+            month = _add_months(month, 1)
+        op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+        op.execute(f'INSERT INTO {table} SELECT * FROM {old}')
+        if sequence:
+            op.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+        op.execute(f'DROP TABLE {old} CASCADE')
+        _restore(table, f'{pk}, "{column}"', sequence, indexes, fks, pk)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    for table, pk, column in TABLES:
+        if not _is_partitioned(bind, table):
+            continue
+        sequence, indexes, fks = _definitions(bind, table, pk)
+        old = f'{table}_partitioned'
+
+        op.execute(f'ALTER TABLE {table} RENAME TO {old}')
+        op.execute(f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING IDENTITY)')
+        op.execute(f'INSERT INTO {table} SELECT * FROM {old}')
+        if sequence:
+            op.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+        op.execute(f'DROP TABLE {old} CASCADE')
+        _restore(table, pk, sequence, indexes, fks, pk)
+        if table in READING_FKS:
+            # Retention may have dropped readings that old alerts point at
+            op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_reading_id_fkey {READING_FKS[table]} NOT VALID')
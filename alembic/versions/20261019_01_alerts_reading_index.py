@@ -0,0 +1,30 @@
+"""
+Index on alerts.reading_id for reading compaction
+
+Compaction clears reading_id on alerts whose readings it replaces with
+5-minute aggregates; without the index every batch scans alerts.
+
+Revision ID: 20261019_01
+Revises: 20261018_01
+Create Date: 2026-10-19
+"""
+from typing import Optional
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '20261019_01'
+down_revision: Optional[str] = '20261018_01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # App tables are created by Base.metadata.create_all and may not exist yet
+    if not sa.inspect(op.get_bind()).has_table('alerts'):
+        return
+    op.execute(sa.text('CREATE INDEX IF NOT EXISTS ix_alerts_reading_id ON alerts (reading_id)'))
+
+
+def downgrade() -> None:
+    op.execute(sa.text('DROP INDEX IF EXISTS ix_alerts_reading_id'))
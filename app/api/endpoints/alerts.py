@@ -1,109 +1,69 @@
+import asyncio
+import json
+import os
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ...database import get_db
-from ... import models, schemas
-from ...crud import crud_sensor_reading as readings_crud
-from ...crud import crud_alerts as alerts_crud
-from ...crud import crud_households as hh_crud
-from ...schemas.alerts import IngestPayload, AlertsResponse, AlertOut, OverlayOut, RecommendationsResponse
+from ...database import get_async_db
+from ...crud.aio import crud_alerts as alerts_crud
+from ...crud.aio import crud_households as hh_crud
+from ...schemas.alerts import (
+    IngestPayload,
+    IngestBatch,
+    IngestBatchResponse,
+    IngestResult,
+    AlertsResponse,
+    AlertOut,
+    OverlayOut,
+    OutdoorBatchRequest,
+    OutdoorBatchResponse,
+    OutdoorResponse,
+    RecommendationsResponse,
+)
 from ...services.alert_engine import evaluate_reading
+from ...services.alert_hub import alert_hub, HubFull
+from ...services.alert_state import alert_states
+from ...services.columnar import arrow_response
+from ...services.conditional import check_not_modified, make_etag
+from ...services.ingest import ingest_batch_async
+from ...services.indicator_store import indicator_store
+from ...services.ingest_queue import ingest_queue, QueueClosed, QueueFull
+from ...services.pagination import cursor_param, set_next_page, split_page
 from ...services.recommendations import actions_for_alerts
-from app.schemas.sensor_reading import LocationCreate
+from ...services.response_cache import response_cache
+from ...services.spatial_index import outdoor_index
 
 router = APIRouter()
 
 @router.post("/sensor-ingest", response_model=Dict[str, Any])
-def sensor_ingest(payload: IngestPayload, db: Session = Depends(get_db)):
-    """Accept a single sensor reading, store it, evaluate alerts, and persist alerts."""
-    # Ensure location exists
-    location = readings_crud.get_or_create_location(
-        db,
-        LocationCreate(
-            zipcode=payload.zipcode,
-            borough=payload.borough or "",
-        ),
-    )
+async def sensor_ingest(payload: IngestPayload, db: AsyncSession = Depends(get_async_db)):
+    """Accept a single sensor reading, store it, evaluate alerts, and persist alerts.
 
-    # Persist the reading (Step 1/2 tables)
-    reading = models.SensorReading(
-        location_id=location.id,
-        timestamp=payload.timestamp or datetime.utcnow(),
-        pm25=payload.pm25,
-        co2=payload.co2,
-        tvoc=payload.tvoc,
-        temperature=payload.temperature,
-        humidity=payload.humidity,
-        mold_risk=payload.mold_risk,
-    )
-    db.add(reading)
-    db.commit()
-    db.refresh(reading)
-
-    # Evaluate alerts
-    triggered = evaluate_reading(payload.dict())
-    saved_alerts: List[models.Alert] = []
-    for a in triggered:
-        saved = alerts_crud.create_alert(
-            db,
-            location_id=location.id,
-            reading_id=reading.id,
-            metric=a["metric"],
-            threshold=a["threshold"],
-            value=a["value"],
-            severity=a["severity"],
-            message=a["message"],
-        )
-        saved_alerts.append(saved)
-
-    # If a household_id is provided, also persist to Step 3 tables
-    household_reading_id = None
-    if payload.household_id is not None:
-        # Map tvoc -> voc; mold_flag -> bool based on mold_risk threshold
-        mold_flag = False
-        if payload.mold_risk is not None:
-            mold_flag = bool(payload.mold_risk >= 0.6)
-
-        hh_reading = hh_crud.add_sensor_reading(
-            db,
-            household_id=payload.household_id,
-            device_id=None,
-            timestamp=payload.timestamp or datetime.utcnow(),
-            pm25=payload.pm25,
-            co2=int(payload.co2) if payload.co2 is not None else None,
-            voc=payload.tvoc,
-            humidity=payload.humidity,
-            mold_flag=mold_flag,
-        )
-        household_reading_id = hh_reading.reading_id
-
-        # Mirror alerts into household_alerts with event_type derived from metric/direction
-        for a in triggered:
-            metric = a["metric"]
-            value = a["value"]
-            threshold = a["threshold"]
-            # Determine event type suffix
-            if metric == "humidity":
-                suffix = "low" if value < threshold else "high"
-                event_type = f"humidity_{suffix}"
-            elif metric in ("pm25", "co2", "tvoc", "mold_risk"):
-                event_type = f"{metric}_high"
-            else:
-                event_type = metric
-
-            hh_crud.create_alert(
-                db,
-                household_id=payload.household_id,
-                event_type=event_type,
-                alert_message=a["message"],
-                reading_id=household_reading_id,
-                timestamp=datetime.utcnow(),
-            )
+    The location, reading, alerts and any mirrored household rows are written as one
+    unit of work with a single commit.
+
+    With ``INGEST_MODE=queue`` the reading is only validated and queued, and the
+    response is 202; the background writer persists it and evaluates alerts.
+    A full queue answers 429 and a stopped/draining one 503.
+    """
+    if ingest_queue.enabled:
+        try:
+            depth = ingest_queue.submit(payload)
+        except QueueFull:
+            raise HTTPException(status_code=429, detail="Ingest queue is full", headers={"Retry-After": "1"})
+        except QueueClosed:
+            raise HTTPException(status_code=503, detail="Ingest queue is not accepting readings", headers={"Retry-After": "5"})
+        return JSONResponse(status_code=202, content={"status": "accepted", "queue_depth": depth})
+
+    result = (await ingest_batch_async(db, [payload]))[0]
+    triggered = result["triggered"]
 
-    # Prepare advice if alerts were triggered
+    # Advice covers every condition the reading meets, even when the alert
+    # itself was deduplicated against an already active one
     advice = None
     reasons = None
     if triggered:
@@ -112,63 +72,277 @@ def sensor_ingest(payload: IngestPayload, db: Session = Depends(get_db)):
 
     return {
         "status": "ok",
-        "reading_id": reading.id,
-        "alerts_created": len(saved_alerts),
-        "household_reading_id": household_reading_id,
+        "reading_id": result["reading_id"],
+        "alerts_created": len(result["alerts"]),
+        "household_reading_id": result["household_reading_id"],
         "advice": advice,
         "reasons": reasons,
     }
 
 
+@router.post("/sensor-ingest/batch", response_model=IngestBatchResponse)
+async def sensor_ingest_batch(batch: IngestBatch, db: AsyncSession = Depends(get_async_db)):
+    """Accept a buffered batch of readings and persist readings and alerts in one transaction."""
+    household_ids = {p.household_id for p in batch.readings if p.household_id is not None}
+    unknown = household_ids - await hh_crud.get_existing_household_ids(db, household_ids)
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown household_id(s): {sorted(unknown)}")
+
+    results = await ingest_batch_async(db, batch.readings)
+    out = [
+        IngestResult(
+            index=i,
+            reading_id=r["reading_id"],
+            alerts_created=len(r["alerts"]),
+            household_reading_id=r["household_reading_id"],
+        )
+        for i, r in enumerate(results)
+    ]
+    return IngestBatchResponse(
+        status="ok",
+        count=len(out),
+        alerts_created=sum(r.alerts_created for r in out),
+        results=out,
+    )
+
+
+@router.get("/sensor-ingest/queue", response_model=Dict[str, Any])
+async def sensor_ingest_queue_stats():
+    """Depth, throughput and lag of the write-behind ingest queue."""
+    return ingest_queue.stats()
+
+
+@router.get("/alerts/state", response_model=Dict[str, Any])
+async def alert_state_stats():
+    """Alert state machine counters: states by status, alerts emitted and suppressed."""
+    return alert_states.stats()
+
+
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("ALERT_STREAM_HEARTBEAT_SECONDS", "15"))
+
+
+@router.get("/alerts/stream")
+async def stream_alerts(
+    request: Request,
+    zipcode: List[str] = Query([]),
+    borough: List[str] = Query([]),
+    household_id: List[int] = Query([]),
+):
+    """Push new alerts as Server-Sent Events (``event: alert``, JSON ``data``).
+
+    Filter by any number of zipcodes, boroughs and household ids; without a
+    filter every location alert is sent. A client that falls too far behind
+    gets ``event: dropped`` and is disconnected, and should reconnect and
+    backfill from GET /alerts. Comment lines are sent as a heartbeat.
+    """
+    try:
+        sub = alert_hub.subscribe(zipcode, borough, household_id)
+    except HubFull:
+        raise HTTPException(status_code=503, detail="Too many alert stream subscribers", headers={"Retry-After": "5"})
+
+    async def events():
+        try:
+            yield ": connected\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await sub.next(STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    yield "event: dropped\ndata: {}\n\n"
+                    return
+                yield f"event: alert\ndata: {json.dumps(event)}\n\n"
+        finally:
+            alert_hub.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/alerts/ws")
+async def alerts_websocket(
+    websocket: WebSocket,
+    zipcode: List[str] = Query([]),
+    borough: List[str] = Query([]),
+    household_id: List[int] = Query([]),
+):
+    """Push new alerts over a WebSocket as JSON messages; same filters as /alerts/stream.
+
+    A client that falls too far behind is closed with code 1013 (try again later).
+    """
+    try:
+        sub = alert_hub.subscribe(zipcode, borough, household_id)
+    except HubFull:
+        await websocket.close(code=1013)
+        return
+    await websocket.accept()
+    # Clients only listen; a receive completes when they disconnect
+    closed = asyncio.ensure_future(websocket.receive())
+    try:
+        while True:
+            pending = asyncio.ensure_future(sub.next())
+            done, _ = await asyncio.wait({pending, closed}, return_when=asyncio.FIRST_COMPLETED)
+            if closed in done:
+                pending.cancel()
+                if closed.result()["type"] == "websocket.disconnect":
+                    return
+                closed = asyncio.ensure_future(websocket.receive())
+                if pending not in done:
+                    continue
+            event = pending.result()
+            if event is None:
+                await websocket.close(code=1013)
+                return
+            await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        closed.cancel()
+        alert_hub.unsubscribe(sub)
+
+
+@router.get("/cache/stats", response_model=Dict[str, Any])
+async def response_cache_stats():
+    """Read-endpoint cache entries, hit/miss counts per route, evictions and invalidations."""
+    return response_cache.stats()
+
+
+@router.get("/alerts/stream/stats", response_model=Dict[str, Any])
+async def alert_stream_stats():
+    """Alert stream subscribers, events published and slow subscribers dropped."""
+    return alert_hub.stats()
+
+
 @router.get("/alerts", response_model=AlertsResponse)
-def get_alerts(
+async def get_alerts(
+    request: Request,
+    response: Response,
     zipcode: Optional[str] = Query(None),
     time_window_hours: int = Query(24, ge=1, le=168),
-    db: Session = Depends(get_db),
+    limit: int = Query(200, ge=1, le=1000),
+    after: Optional[tuple] = Depends(cursor_param(datetime.fromisoformat, int)),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    since = datetime.utcnow() - timedelta(hours=time_window_hours)
-    alerts = alerts_crud.get_alerts(db, zipcode=zipcode, since=since)
-
-    out: List[AlertOut] = []
-    for a in alerts:
-        out.append(
-            AlertOut(
-                metric=a.metric,
-                threshold=a.threshold,
-                value=a.value,
-                severity=a.severity,
-                message=a.message,
-                created_at=a.created_at,
-                zipcode=a.location.zipcode if a.location else "",
-                borough=a.location.borough if a.location else None,
+    """Alerts in the time window, newest first.
+
+    Carries an ETag and Last-Modified derived from the newest alert and the
+    alerts in the window; polls with a current If-None-Match (or
+    If-Modified-Since) get 304 without the page being built.
+    """
+    window = timedelta(hours=time_window_hours)
+    since = datetime.utcnow() - window
+    version = await alerts_crud.get_alerts_version(db, zipcode=zipcode, since=since)
+    count, _, newest, expired = version
+    changes = [t for t in (newest, expired + window if expired else None) if t is not None]
+    etag = make_etag("alerts", count, version[1], zipcode, time_window_hours, limit, after)
+    not_modified = check_not_modified(request, response, etag, max(changes) if changes else None)
+    if not_modified is not None:
+        return not_modified
+
+    async def page() -> AlertsResponse:
+        rows = await alerts_crud.get_alerts(db, zipcode=zipcode, since=since, limit=limit + 1, after=after)
+        alerts, next_cursor = split_page(rows, limit, lambda a: (a.created_at, a.id))
+
+        out: List[AlertOut] = []
+        for a in alerts:
+            out.append(
+                AlertOut(
+                    metric=a.metric,
+                    threshold=a.threshold,
+                    value=a.value,
+                    severity=a.severity,
+                    message=a.message,
+                    created_at=a.created_at,
+                    zipcode=a.location.zipcode if a.location else "",
+                    borough=a.location.borough if a.location else None,
+                )
             )
-        )
-    return AlertsResponse(count=len(out), alerts=out)
+        return AlertsResponse(count=len(out), alerts=out, next_cursor=next_cursor)
+
+    result = await response_cache.get_or_compute(
+        "alerts", page, zipcode=zipcode, time_window_hours=time_window_hours, limit=limit, after=after, version=etag
+    )
+    set_next_page(request, response, result.next_cursor)
+    return result
+
+
+@router.get("/alerts/arrow")
+async def export_alerts_arrow(
+    zipcode: Optional[str] = Query(None),
+    start_time: Optional[datetime] = Query(None, description="Start time (inclusive)"),
+    end_time: Optional[datetime] = Query(None, description="End time (exclusive)"),
+):
+    """Stream alerts created in the time range as an Arrow IPC stream."""
+    return arrow_response("alerts", zipcode=zipcode, start_time=start_time, end_time=end_time)
 
 
 @router.get("/context", response_model=Dict[str, Any])
-def get_context(
+async def get_context(
     zipcode: Optional[str] = Query(None),
     year: Optional[int] = Query(None),
-    db: Session = Depends(get_db),
+    type: Optional[str] = Query(None, description="Overlay type, e.g. pm25 or asthma_ed_pm25_adults"),
+    limit: int = Query(200, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    # Mock overlays now; in future, fetch from public datasets and cache
-    overlays: List[OverlayOut] = []
-    if zipcode:
-        overlays.append(OverlayOut(type="asthma_rate", zipcode=zipcode, year=year or 2023, value=18.3))
-    else:
-        overlays.append(OverlayOut(type="asthma_rate", zipcode="10001", year=2023, value=18.3))
+    """Neighborhood overlays, newest year first.
+
+    Served from the in-memory indicator store when the open-data CSV is
+    available, otherwise from the overlays table (scripts/load_air_quality).
+    """
+    if indicator_store.loaded:
+        overlays = [OverlayOut(**o) for o in indicator_store.query(zipcode=zipcode, year=year, type=type, limit=limit)]
+        return {"overlays": [o.dict() for o in overlays]}
+    rows = await alerts_crud.get_overlays(db, zipcode=zipcode, year=year, type=type, limit=limit)
+    overlays = [
+        OverlayOut(type=o.type, zipcode=o.location.zipcode, year=o.year, value=o.value, meta=o.meta)
+        for o in rows
+    ]
     return {"overlays": [o.dict() for o in overlays]}
 
 
+def _require_outdoor_index() -> None:
+    if not outdoor_index.loaded:
+        raise HTTPException(status_code=503, detail="Outdoor air quality index is not loaded")
+
+
+@router.get("/outdoor", response_model=OutdoorResponse)
+async def get_outdoor(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(3, ge=1, le=20),
+):
+    """The k nearest neighborhoods to a coordinate with their latest outdoor PM2.5/NO2/O3."""
+    _require_outdoor_index()
+    return OutdoorResponse(neighborhoods=outdoor_index.query([lat], [lon], k)[0])
+
+
+@router.post("/outdoor/batch", response_model=OutdoorBatchResponse)
+async def get_outdoor_batch(body: OutdoorBatchRequest):
+    """Nearest neighborhoods for up to 10,000 points in one vectorized lookup, in request order."""
+    _require_outdoor_index()
+    lats = [p.lat for p in body.points]
+    lons = [p.lon for p in body.points]
+    return OutdoorBatchResponse(results=outdoor_index.query(lats, lons, body.k))
+
+
 @router.get("/recommendations", response_model=RecommendationsResponse)
-def get_recommendations(
+async def get_recommendations(
     zipcode: Optional[str] = Query(None),
     latest: bool = Query(True),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
+    return await response_cache.get_or_compute(
+        "recommendations", lambda: _recommendations(db, zipcode), zipcode=zipcode, latest=latest
+    )
+
+
+async def _recommendations(db: AsyncSession, zipcode: Optional[str]) -> RecommendationsResponse:
     # Find latest reading and evaluate
-    reading = alerts_crud.get_latest_reading_for_zip(db, zipcode)
+    reading = await alerts_crud.get_latest_reading_for_zip(db, zipcode)
     if not reading:
         return RecommendationsResponse(status="no data", zipcode=zipcode)
 
@@ -184,10 +358,20 @@ def get_recommendations(
         "mold_risk": reading.mold_risk,
     }
 
+    # Outdoor levels of the nearest neighborhood, when the location is geocoded
+    outdoor = None
+    location = reading.location
+    if outdoor_index.loaded and location is not None and location.latitude is not None and location.longitude is not None:
+        outdoor = outdoor_index.query([location.latitude], [location.longitude], 1)[0][0]
+
     triggered = evaluate_reading(payload)
     if not triggered:
-        return RecommendationsResponse(status="no action needed", zipcode=payload["zipcode"]) 
+        return RecommendationsResponse(status="no action needed", zipcode=payload["zipcode"], outdoor=outdoor)
 
     actions = actions_for_alerts(triggered)
     reasons = [f"{a['metric']}={a['value']} threshold={a['threshold']} ({a['severity']})" for a in triggered]
-    return RecommendationsResponse(status="action recommended", zipcode=payload["zipcode"], actions=actions, reasons=reasons)
+    if outdoor and outdoor["pm25"] is not None and any(a["metric"] == "pm25" for a in triggered):
+        reasons.append(f"outdoor pm25={outdoor['pm25']:.1f} in {outdoor['name']} ({outdoor['periods']['pm25']})")
+    return RecommendationsResponse(
+        status="action recommended", zipcode=payload["zipcode"], actions=actions, reasons=reasons, outdoor=outdoor
+    )
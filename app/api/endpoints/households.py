@@ -1,10 +1,10 @@
 from datetime import datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ...database import get_db
+from ...database import get_async_db
 from ...schemas.household import (
     HouseholdCreate,
     Household,
@@ -15,14 +15,23 @@ from ...schemas.household import (
     HealthContextUpsert,
     HealthContext,
 )
-from ...crud import crud_households as hh
+from ...crud.aio import crud_households as hh
+from ...crud.crud_households import EXPORT_COLUMNS, readings_export_query
+from ...services.alert_hub import alert_hub
+from ...services.columnar import arrow_response
+from ...services.conditional import check_not_modified, make_etag
+from ...services.export import export_response
+from ...services.ingest import household_alert_event
+from ...services.pagination import cursor_param, set_next_page, split_page
+from ...services.response_cache import response_cache
+from ... import models
 
 router = APIRouter()
 
 # Households CRUD
 @router.post("/households", response_model=Household)
-def create_household(payload: HouseholdCreate, db: Session = Depends(get_db)):
-    return hh.create_household(
+async def create_household(payload: HouseholdCreate, db: AsyncSession = Depends(get_async_db)):
+    return await hh.create_household(
         db,
         zipcode=payload.zipcode,
         housing_type=payload.housing_type,
@@ -31,25 +40,33 @@ def create_household(payload: HouseholdCreate, db: Session = Depends(get_db)):
     )
 
 @router.get("/households/{household_id}", response_model=Household)
-def get_household(household_id: int, db: Session = Depends(get_db)):
-    obj = hh.get_household_by_id(db, household_id)
+async def get_household(household_id: int, db: AsyncSession = Depends(get_async_db)):
+    obj = await hh.get_household_by_id(db, household_id)
     if not obj:
         raise HTTPException(status_code=404, detail="Household not found")
     return obj
 
 @router.get("/households", response_model=List[Household])
-def list_households(zipcode: Optional[str] = Query(None), db: Session = Depends(get_db)):
-    if zipcode:
-        return hh.get_households_by_zip(db, zipcode)
-    # Simple fallback list
-    return hh.get_households_by_zip(db, zipcode="10001")
+async def list_households(
+    request: Request,
+    response: Response,
+    zipcode: Optional[str] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[tuple] = Depends(cursor_param(int)),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Households by id, optionally in one zipcode; the next page's cursor is in `X-Next-Cursor`/`Link`."""
+    rows = await hh.list_households(db, zipcode=zipcode, limit=limit + 1, after=after)
+    page, next_cursor = split_page(rows, limit, lambda h: (h.household_id,))
+    set_next_page(request, response, next_cursor)
+    return page
 
 # Readings
 @router.post("/households/{household_id}/readings", response_model=HouseholdReading)
-def add_reading(household_id: int, payload: HouseholdReadingCreate, db: Session = Depends(get_db)):
+async def add_reading(household_id: int, payload: HouseholdReadingCreate, db: AsyncSession = Depends(get_async_db)):
     if payload.household_id != household_id:
         raise HTTPException(status_code=400, detail="household_id mismatch in path and payload")
-    return hh.add_sensor_reading(
+    return await hh.add_sensor_reading(
         db,
         household_id=payload.household_id,
         device_id=payload.device_id,
@@ -62,19 +79,59 @@ def add_reading(household_id: int, payload: HouseholdReadingCreate, db: Session
     )
 
 @router.get("/households/{household_id}/readings", response_model=List[HouseholdReading])
-def get_readings(household_id: int, limit: int = Query(50, le=500), db: Session = Depends(get_db)):
+async def get_readings(
+    household_id: int,
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    after: Optional[tuple] = Depends(cursor_param(datetime.fromisoformat, int)),
+    db: AsyncSession = Depends(get_async_db),
+):
     # use zip-based listing for now by fetching zip of household, then latest-by-zip
-    obj = hh.get_household_by_id(db, household_id)
+    obj = await hh.get_household_by_id(db, household_id)
+    if not obj:
+        raise HTTPException(status_code=404, detail="Household not found")
+    rows = await hh.get_latest_readings_for_zip(db, obj.zipcode, limit=limit + 1, after=after)
+    page, next_cursor = split_page(rows, limit, lambda r: (r.timestamp, r.reading_id))
+    set_next_page(request, response, next_cursor)
+    return page
+
+@router.get("/households/{household_id}/readings/latest", response_model=List[HouseholdReading])
+async def get_latest_readings(household_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Last known reading for each device in the household."""
+    obj = await hh.get_household_by_id(db, household_id)
     if not obj:
         raise HTTPException(status_code=404, detail="Household not found")
-    return hh.get_latest_readings_for_zip(db, obj.zipcode, limit=limit)
+    return await hh.get_latest_household_readings(db, household_id)
+
+@router.get("/household-readings/export")
+async def export_readings(
+    household_id: Optional[int] = Query(None),
+    zipcode: Optional[str] = Query(None),
+    start_time: Optional[datetime] = Query(None, description="Start time (inclusive)"),
+    end_time: Optional[datetime] = Query(None, description="End time (exclusive)"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = Query(False),
+):
+    """Stream all matching household readings as NDJSON or CSV, oldest first."""
+    stmt = readings_export_query(household_id=household_id, zipcode=zipcode, start_time=start_time, end_time=end_time)
+    return export_response(stmt, EXPORT_COLUMNS, format, gzip, "household_readings")
+
+@router.get("/household-readings/arrow")
+async def export_readings_arrow(
+    zipcode: Optional[str] = Query(None),
+    start_time: Optional[datetime] = Query(None, description="Start time (inclusive)"),
+    end_time: Optional[datetime] = Query(None, description="End time (exclusive)"),
+):
+    """Stream matching household readings as an Arrow IPC stream."""
+    return arrow_response("household_sensor_readings", zipcode=zipcode, start_time=start_time, end_time=end_time)
 
 # Alerts
 @router.post("/households/{household_id}/alerts", response_model=HouseholdAlert)
-def add_alert(household_id: int, payload: HouseholdAlertCreate, db: Session = Depends(get_db)):
+async def add_alert(household_id: int, payload: HouseholdAlertCreate, db: AsyncSession = Depends(get_async_db)):
     if payload.household_id != household_id:
         raise HTTPException(status_code=400, detail="household_id mismatch in path and payload")
-    return hh.create_alert(
+    alert = await hh.create_alert(
         db,
         household_id=payload.household_id,
         event_type=payload.event_type,
@@ -82,15 +139,40 @@ def add_alert(household_id: int, payload: HouseholdAlertCreate, db: Session = De
         reading_id=payload.reading_id,
         timestamp=payload.timestamp,
     )
+    alert_hub.publish([household_alert_event(
+        {
+            "household_id": alert.household_id,
+            "reading_id": alert.reading_id,
+            "event_type": alert.event_type,
+            "alert_message": alert.alert_message,
+            "timestamp": alert.timestamp,
+        },
+        None,
+    )])
+    return alert
 
 @router.get("/households/{household_id}/alerts", response_model=List[HouseholdAlert])
-def get_alerts(household_id: int, hours_back: int = Query(24, ge=1, le=168), db: Session = Depends(get_db)):
-    return hh.get_alerts_for_household(db, household_id=household_id, hours_back=hours_back)
+async def get_alerts(
+    household_id: int,
+    request: Request,
+    response: Response,
+    hours_back: int = Query(24, ge=1, le=168),
+    limit: int = Query(200, ge=1, le=1000),
+    after: Optional[tuple] = Depends(cursor_param(datetime.fromisoformat, int)),
+    db: AsyncSession = Depends(get_async_db),
+):
+    rows = await hh.get_alerts_for_household(
+        db, household_id=household_id, hours_back=hours_back, limit=limit + 1, after=after
+    )
+    page, next_cursor = split_page(rows, limit, lambda a: (a.timestamp, a.alert_id))
+    set_next_page(request, response, next_cursor)
+    return page
 
 # Health Context
 @router.put("/health-context", response_model=HealthContext)
-def upsert_context(payload: HealthContextUpsert, db: Session = Depends(get_db)):
-    return hh.upsert_health_context(
+async def upsert_context(payload: HealthContextUpsert, db: AsyncSession = Depends(get_async_db)):
+    response_cache.stage(db, [payload.zipcode])
+    return await hh.upsert_health_context(
         db,
         zipcode=payload.zipcode,
         asthma_rate=payload.asthma_rate,
@@ -99,8 +181,12 @@ def upsert_context(payload: HealthContextUpsert, db: Session = Depends(get_db)):
     )
 
 @router.get("/health-context/{zipcode}", response_model=HealthContext)
-def get_context(zipcode: str, db: Session = Depends(get_db)):
-    ctx = db.get(hh.HealthContext, zipcode)
+async def get_context(zipcode: str, db: AsyncSession = Depends(get_async_db)):
+    async def load() -> Optional[HealthContext]:
+        ctx = await db.get(models.HealthContext, zipcode)
+        return HealthContext.model_validate(ctx) if ctx else None
+
+    ctx = await response_cache.get_or_compute("health_context", load, zipcode=zipcode)
     if not ctx:
         raise HTTPException(status_code=404, detail="Not found")
     return ctx
@@ -108,13 +194,26 @@ def get_context(zipcode: str, db: Session = Depends(get_db)):
 
 # Aggregations and context refresh (Step 4)
 @router.get("/aggregations/zip-trends")
-def get_zip_trends(hours_back: int = Query(24, ge=1, le=168), db: Session = Depends(get_db)):
-    """Return anonymized zip-level trends for the last N hours."""
-    return {"results": hh.aggregate_zip_trends(db, hours_back=hours_back)}
+async def get_zip_trends(
+    request: Request,
+    response: Response,
+    hours_back: int = Query(24, ge=1, le=168),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Return anonymized zip-level trends for the last N hours (304 when If-None-Match is current)."""
+    etag = make_etag("zip_trends", await hh.zip_trends_version(db, hours_back=hours_back), hours_back)
+    not_modified = check_not_modified(request, response, etag)
+    if not_modified is not None:
+        return not_modified
+
+    async def trends():
+        return {"results": await hh.aggregate_zip_trends(db, hours_back=hours_back)}
+
+    return await response_cache.get_or_compute("zip_trends", trends, hours_back=hours_back, version=etag)
 
 
 @router.post("/context/refresh")
-def refresh_context(zipcode: Optional[str] = Query(None), db: Session = Depends(get_db)):
+async def refresh_context(zipcode: Optional[str] = Query(None), db: AsyncSession = Depends(get_async_db)):
     """Mock external PEDP/NYC health context refresh.
     If zipcode provided, refresh for that zip; else refresh for zipcodes seen in households.
     """
@@ -123,8 +222,10 @@ def refresh_context(zipcode: Optional[str] = Query(None), db: Session = Depends(
         zips = [zipcode]
     else:
         # collect distinct zips from households
-        zips = list({h.zipcode for h in db.query(hh.Household).all()})
+        zips = await hh.get_distinct_household_zipcodes(db)
     # mock values; in a real impl, call external APIs and map
-    for z in zips:
-        hh.upsert_health_context(db, zipcode=z, asthma_rate=18.3, er_visit_rate=22.7, ej_index=0.63)
+    response_cache.stage(db, zips)
+    await hh.upsert_health_contexts(
+        db, [{"zipcode": z, "asthma_rate": 18.3, "er_visit_rate": 22.7, "ej_index": 0.63} for z in zips]
+    )
     return {"status": "ok", "updated": zips}
@@ -1,10 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ... import crud, schemas, models
-from ...database import get_db
+from ... import schemas
+from ...crud.aio import crud_sensor_reading as crud
+from ...crud.crud_sensor_reading import EXPORT_COLUMNS, readings_export_query
+from ...database import get_async_db
+from ...services.columnar import arrow_response
+from ...services.conditional import check_not_modified, make_etag
+from ...services.export import export_response
+from ...services.pagination import cursor_param, set_next_page, split_page
+from ...services.response_cache import response_cache
 
 router = APIRouter()
 
@@ -21,64 +28,122 @@ def generate_sensor_data() -> Dict[str, float]:
     }
 
 @router.post("/readings/", response_model=schemas.SensorReadingOut)
-def create_reading(
+async def create_reading(
     reading: schemas.SensorReadingCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create a new sensor reading.
     """
-    return crud.create_sensor_reading(db=db, reading=reading)
+    response_cache.stage(db, [reading.location_zipcode])
+    return await crud.create_sensor_reading(db=db, reading=reading)
 
 @router.post("/readings/bulk/", response_model=List[schemas.SensorReadingOut])
-def create_bulk_readings(
+async def create_bulk_readings(
     readings: schemas.BulkSensorReading,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create multiple sensor readings in a single request.
     """
-    return crud.create_bulk_sensor_readings(db=db, readings=readings.readings)
+    response_cache.stage(db, {r.location_zipcode for r in readings.readings})
+    return await crud.create_bulk_sensor_readings(db=db, readings=readings.readings)
 
 @router.get("/readings/", response_model=List[schemas.SensorReadingOut])
-def read_readings(
+async def read_readings(
+    request: Request,
+    response: Response,
     location_zipcode: Optional[str] = Query(None, description="Filter by location zipcode"),
     start_time: Optional[datetime] = Query(None, description="Start time for filtering"),
     end_time: Optional[datetime] = Query(None, description="End time for filtering"),
-    limit: int = Query(100, le=1000, description="Limit number of results"),
-    db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1, le=1000, description="Limit number of results"),
+    after: Optional[tuple] = Depends(cursor_param(datetime.fromisoformat, int)),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Retrieve sensor readings with optional filters.
+    Retrieve sensor readings with optional filters, newest first.
+    
+    When more rows match, the `X-Next-Cursor` and `Link` response headers carry
+    the cursor for the next page; pass it back as `cursor`.
     """
-    return crud.get_sensor_readings(
+    rows = await crud.get_sensor_readings(
         db=db,
         location_zipcode=location_zipcode,
         start_time=start_time,
         end_time=end_time,
-        limit=limit
+        limit=limit + 1,
+        after=after,
     )
+    page, next_cursor = split_page(rows, limit, lambda r: (r.timestamp, r.id))
+    set_next_page(request, response, next_cursor)
+    return page
 
 @router.get("/readings/latest/", response_model=List[schemas.SensorReadingOut])
-def read_latest_readings(
+async def read_latest_readings(
+    request: Request,
+    response: Response,
     limit: int = Query(10, le=100, description="Number of latest readings to return"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get the latest sensor readings from different locations.
+
+    Answers `304 Not Modified` when `If-None-Match` carries the current ETag.
+    """
+    version = await crud.get_latest_readings_version(db)
+    not_modified = check_not_modified(request, response, make_etag("readings_latest", version, limit))
+    if not_modified is not None:
+        return not_modified
+    return await crud.get_latest_readings_by_location(db=db, limit=limit)
+
+@router.get("/readings/export")
+async def export_readings(
+    location_zipcode: Optional[str] = Query(None, description="Filter by location zipcode"),
+    start_time: Optional[datetime] = Query(None, description="Start time (inclusive)"),
+    end_time: Optional[datetime] = Query(None, description="End time (exclusive)"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson or csv"),
+    gzip: bool = Query(False, description="Gzip the stream"),
+):
+    """
+    Stream all matching readings, oldest first, without a row limit.
+    """
+    stmt = readings_export_query(location_zipcode=location_zipcode, start_time=start_time, end_time=end_time)
+    return export_response(stmt, EXPORT_COLUMNS, format, gzip, "readings")
+
+@router.get("/readings/arrow")
+async def export_readings_arrow(
+    location_zipcode: Optional[str] = Query(None, description="Filter by location zipcode"),
+    start_time: Optional[datetime] = Query(None, description="Start time (inclusive)"),
+    end_time: Optional[datetime] = Query(None, description="End time (exclusive)"),
+):
+    """
+    Stream matching readings as an Arrow IPC stream (`pyarrow.ipc.open_stream`).
     """
-    return crud.get_latest_readings_by_location(db=db, limit=limit)
+    return arrow_response("sensor_readings", zipcode=location_zipcode, start_time=start_time, end_time=end_time)
+
+def _format_totals(totals, unit: str) -> Dict[str, Any]:
+    if totals is None:
+        return {"min": None, "max": None, "avg": None, "stddev": None, "unit": unit}
+    return {"min": totals.min, "max": totals.max, "avg": totals.mean, "stddev": totals.stddev, "unit": unit}
 
 @router.get("/readings/stats/", response_model=Dict[str, Any])
-def get_statistics(
+async def get_statistics(
     location_zipcode: Optional[str] = Query(None, description="Filter by location zipcode"),
     time_window_hours: int = Query(24, description="Time window in hours for statistics"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get statistics for sensor readings within a time window.
     """
-    stats = crud.get_sensor_stats(
+    return await response_cache.get_or_compute(
+        "readings_stats",
+        lambda: _statistics(db, location_zipcode, time_window_hours),
+        zipcode=location_zipcode,
+        time_window_hours=time_window_hours,
+    )
+
+async def _statistics(db: AsyncSession, location_zipcode: Optional[str], time_window_hours: int) -> Dict[str, Any]:
+    stats = await crud.get_sensor_stats(
         db=db,
         location_zipcode=location_zipcode,
         time_window_hours=time_window_hours
@@ -87,7 +152,7 @@ def get_statistics(
     # Format the response
     result = []
     for stat in stats:
-        location, min_pm25, max_pm25, avg_pm25, min_co2, max_co2, avg_co2, last_updated = stat
+        location = stat["location"]
         result.append({
             "location": {
                 "zipcode": location.zipcode,
@@ -96,26 +161,16 @@ def get_statistics(
                 "longitude": location.longitude
             },
             "stats": {
-                "pm25": {
-                    "min": float(min_pm25) if min_pm25 is not None else None,
-                    "max": float(max_pm25) if max_pm25 is not None else None,
-                    "avg": float(avg_pm25) if avg_pm25 is not None else None,
-                    "unit": "μg/m³"
-                },
-                "co2": {
-                    "min": float(min_co2) if min_co2 is not None else None,
-                    "max": float(max_co2) if max_co2 is not None else None,
-                    "avg": float(avg_co2) if avg_co2 is not None else None,
-                    "unit": "ppm"
-                }
+                metric: _format_totals(stat["stats"].get(metric), unit)
+                for metric, unit in (("pm25", "μg/m³"), ("co2", "ppm"))
             },
-            "last_updated": last_updated
+            "last_updated": stat["last_updated"]
         })
     
     return {"results": result}
 
 @router.get("/readings/simulate/")
-def simulate_reading(
+async def simulate_reading(
     zipcode: str = Query("10001", description="Zipcode for the simulated reading"),
     borough: str = Query("Manhattan", description="Borough for the simulated reading")
 ):
@@ -131,33 +186,26 @@ def simulate_reading(
     }
 
 @router.post("/public-health/", response_model=schemas.PublicHealthData)
-def add_public_health_data(
+async def add_public_health_data(
     health_data: schemas.PublicHealthDataCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Add public health data for a location.
     """
-    return crud.add_public_health_data(db=db, health_data=health_data)
+    return await crud.add_public_health_data(db=db, health_data=health_data)
 
 @router.get("/public-health/{zipcode}", response_model=List[schemas.PublicHealthData])
-def get_public_health_data(
+async def get_public_health_data(
     zipcode: str,
     year: Optional[int] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get public health data for a location.
     """
-    location = crud.get_location(db, zipcode=zipcode)
+    location = await crud.get_location(db, zipcode=zipcode)
     if not location:
         raise HTTPException(status_code=404, detail="Location not found")
     
-    query = db.query(models.PublicHealthData).filter(
-        models.PublicHealthData.location_id == location.id
-    )
-    
-    if year is not None:
-        query = query.filter(models.PublicHealthData.year == year)
-    
-    return query.all()
+    return await crud.get_public_health_data(db, location.id, year=year)
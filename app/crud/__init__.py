@@ -8,4 +8,5 @@ from .crud_sensor_reading import (
     get_latest_readings_by_location,
     get_sensor_stats,
     add_public_health_data,
+    get_public_health_data,
 )
@@ -0,0 +1,21 @@
+"""AsyncSession counterparts of the CRUD modules.
+
+Each function takes an ``AsyncSession`` and runs the matching sync CRUD
+function through ``AsyncSession.run_sync``: statements go through the async
+driver (asyncpg / aiosqlite) and the event loop is never blocked, while the
+query logic (upserts, rollups, the location cache) stays in one place.
+
+Lazy loading is not available once control is back on the event loop, so
+objects returned from here have every relationship the API serializes loaded.
+"""
+from functools import wraps
+
+
+def to_async(fn):
+    """Turn a sync CRUD function ``fn(db, ...)`` into ``await fn(async_db, ...)``."""
+
+    @wraps(fn)
+    async def wrapper(db, *args, **kwargs):
+        return await db.run_sync(fn, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,8 @@
+from .. import crud_alerts as sync
+from . import to_async
+
+insert_alerts = to_async(sync.insert_alerts)
+get_alerts = to_async(sync.get_alerts)
+get_alerts_version = to_async(sync.get_alerts_version)
+get_latest_reading_for_zip = to_async(sync.get_latest_reading_for_zip)
+get_overlays = to_async(sync.get_overlays)
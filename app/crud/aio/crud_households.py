@@ -0,0 +1,18 @@
+from .. import crud_households as sync
+from . import to_async
+
+create_household = to_async(sync.create_household)
+get_household_by_id = to_async(sync.get_household_by_id)
+get_existing_household_ids = to_async(sync.get_existing_household_ids)
+get_distinct_household_zipcodes = to_async(sync.get_distinct_household_zipcodes)
+get_households_by_zip = to_async(sync.get_households_by_zip)
+list_households = to_async(sync.list_households)
+add_sensor_reading = to_async(sync.add_sensor_reading)
+get_latest_household_readings = to_async(sync.get_latest_household_readings)
+get_latest_readings_for_zip = to_async(sync.get_latest_readings_for_zip)
+create_alert = to_async(sync.create_alert)
+get_alerts_for_household = to_async(sync.get_alerts_for_household)
+upsert_health_context = to_async(sync.upsert_health_context)
+upsert_health_contexts = to_async(sync.upsert_health_contexts)
+aggregate_zip_trends = to_async(sync.aggregate_zip_trends)
+zip_trends_version = to_async(sync.zip_trends_version)
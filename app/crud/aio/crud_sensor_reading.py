@@ -0,0 +1,46 @@
+from typing import List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from ... import models, schemas
+from .. import crud_sensor_reading as sync
+from . import to_async
+
+get_location = to_async(sync.get_location)
+get_location_id = to_async(sync.get_location_id)
+get_sensor_readings = to_async(sync.get_sensor_readings)
+get_latest_readings_by_location = to_async(sync.get_latest_readings_by_location)
+get_latest_readings_version = to_async(sync.get_latest_readings_version)
+get_sensor_stats = to_async(sync.get_sensor_stats)
+add_public_health_data = to_async(sync.add_public_health_data)
+get_public_health_data = to_async(sync.get_public_health_data)
+
+
+def _attach_locations(db: Session, readings: List[models.SensorReading]) -> None:
+    """Load the Location of each reading with one query."""
+    ids = {r.location_id for r in readings}
+    if not ids:
+        return
+    locations = {loc.id: loc for loc in db.query(models.Location).filter(models.Location.id.in_(ids))}
+    for r in readings:
+        set_committed_value(r, "location", locations.get(r.location_id))
+
+
+async def create_sensor_reading(db: AsyncSession, reading: schemas.SensorReadingCreate) -> models.SensorReading:
+    def create(session: Session) -> models.SensorReading:
+        db_reading = sync.create_sensor_reading(session, reading)
+        _attach_locations(session, [db_reading])
+        return db_reading
+
+    return await db.run_sync(create)
+
+
+async def create_bulk_sensor_readings(db: AsyncSession, readings: List[schemas.SensorReadingCreate]) -> List[models.SensorReading]:
+    def create(session: Session) -> List[models.SensorReading]:
+        db_readings = sync.create_bulk_sensor_readings(session, readings)
+        _attach_locations(session, db_readings)
+        return db_readings
+
+    return await db.run_sync(create)
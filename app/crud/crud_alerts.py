@@ -1,9 +1,12 @@
 from datetime import datetime, timedelta
-from typing import List, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from typing import Any, Dict, Iterable, List, Optional
+from sqlalchemy.orm import Session, contains_eager
+from sqlalchemy import and_, delete, func, insert, select
 
 from .. import models
+from ..database import dialect_insert
+from ..services.pagination import after_key
+from ..services.partitions import time_window
 
 
 def create_alert(
@@ -16,7 +19,10 @@ def create_alert(
     value: float,
     severity: str,
     message: str,
+    commit: bool = True,
 ) -> models.Alert:
+    """Create an alert. With ``commit=False`` the row is only flushed so callers
+    can compose several writes into one transaction."""
     alert = models.Alert(
         location_id=location_id,
         reading_id=reading_id,
@@ -27,8 +33,11 @@ def create_alert(
         message=message,
     )
     db.add(alert)
-    db.commit()
-    db.refresh(alert)
+    if commit:
+        db.commit()
+        db.refresh(alert)
+    else:
+        db.flush()
     return alert
 
 
@@ -39,26 +48,61 @@ def create_alerts_bulk(db: Session, alerts: List[models.Alert]) -> List[models.A
     return alerts
 
 
+def insert_alerts(db: Session, rows: List[Dict[str, Any]]) -> int:
+    """Bulk insert alert rows (dicts of Alert columns) without committing."""
+    if rows:
+        db.execute(insert(models.Alert), rows)
+    return len(rows)
+
+
 def get_alerts(
     db: Session,
     *,
     zipcode: Optional[str] = None,
     since: Optional[datetime] = None,
     limit: int = 200,
+    after: Optional[tuple] = None,
 ) -> List[models.Alert]:
-    q = db.query(models.Alert).join(models.Location, models.Location.id == models.Alert.location_id)
+    """Alerts newest first, ordered by (created_at, id); ``after`` is the key of
+    the last alert of the previous page."""
+    q = (
+        db.query(models.Alert)
+        .join(models.Location, models.Location.id == models.Alert.location_id)
+        .options(contains_eager(models.Alert.location))
+    )
     if zipcode:
         q = q.filter(models.Location.zipcode == zipcode)
     if since:
-        q = q.filter(models.Alert.created_at >= since)
-    return q.order_by(models.Alert.created_at.desc()).limit(limit).all()
+        q = q.filter(time_window(models.Alert.created_at, since))
+    key = (models.Alert.created_at, models.Alert.id)
+    if after:
+        q = q.filter(after_key(key, after, descending=True))
+    return q.order_by(*(c.desc() for c in key)).limit(limit).all()
+
+
+def get_alerts_version(db: Session, *, zipcode: Optional[str] = None, since: datetime) -> tuple:
+    """(count, max id, newest created_at) of the alerts `get_alerts` would page
+    through, plus the newest created_at before ``since``. Any new alert or
+    alert leaving the window changes it; both parts are index seeks."""
+    a = models.Alert
+
+    def scoped(stmt):
+        if zipcode:
+            stmt = stmt.join(models.Location, models.Location.id == a.location_id).where(models.Location.zipcode == zipcode)
+        return stmt
 
+    expired = scoped(select(func.max(a.created_at)).select_from(a).where(a.created_at < since))
+    window = scoped(select(func.count(), func.max(a.id), func.max(a.created_at)).select_from(a).where(time_window(a.created_at, since)))
+    window = window.add_columns(expired.correlate(None).scalar_subquery())
+    return tuple(db.execute(window).one())
 
-def get_latest_reading_for_zip(db: Session, zipcode: Optional[str]) -> Optional[models.SensorReading]:
-    q = db.query(models.SensorReading).join(models.Location)
+
+def get_latest_reading_for_zip(db: Session, zipcode: Optional[str]) -> Optional[models.LatestReading]:
+    """Last known reading for a zipcode (or the newest overall), from latest_readings."""
+    q = db.query(models.LatestReading).join(models.Location).options(contains_eager(models.LatestReading.location))
     if zipcode:
-        q = q.filter(models.Location.zipcode == zipcode)
-    return q.order_by(models.SensorReading.timestamp.desc()).first()
+        return q.filter(models.Location.zipcode == zipcode).first()
+    return q.order_by(models.LatestReading.timestamp.desc()).first()
 
 
 def add_overlay(
@@ -79,13 +123,77 @@ def add_overlay(
     return overlay
 
 
+def get_alert_states(db: Session, scope: str, subject_ids: Iterable[int]) -> List[models.AlertState]:
+    ids = list(subject_ids)
+    if not ids:
+        return []
+    return db.query(models.AlertState).filter(
+        models.AlertState.scope == scope, models.AlertState.subject_id.in_(ids)
+    ).all()
+
+
+def upsert_alert_states(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Write alert state transitions (dicts of AlertState columns) without committing."""
+    if not rows:
+        return
+    stmt = dialect_insert(db, models.AlertState)
+    ex = stmt.excluded
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["scope", "subject_id", "rule"],
+            set_={c: getattr(ex, c) for c in ("status", "since", "last_notified_at", "value", "updated_at")},
+        ),
+        rows,
+    )
+
+
+def insert_overlays(db: Session, rows: List[Dict[str, Any]]) -> int:
+    """Bulk insert overlay rows (dicts of Overlay columns) without committing."""
+    if rows:
+        db.execute(insert(models.Overlay), rows)
+    return len(rows)
+
+
+def delete_overlays_from_source(db: Session, source: str) -> int:
+    """Delete every overlay loaded from ``source`` without committing."""
+    return db.execute(delete(models.Overlay.__table__).where(models.Overlay.source == source)).rowcount
+
+
 def get_overlays(
     db: Session,
     *,
     zipcode: Optional[str] = None,
+    year: Optional[int] = None,
+    type: Optional[str] = None,
     limit: int = 200,
 ) -> List[models.Overlay]:
-    q = db.query(models.Overlay).join(models.Location)
+    q = db.query(models.Overlay).join(models.Location).options(contains_eager(models.Overlay.location))
     if zipcode:
         q = q.filter(models.Location.zipcode == zipcode)
-    return q.order_by(models.Overlay.year.desc().nullslast()).limit(limit).all()
+    if year is not None:
+        q = q.filter(models.Overlay.year == year)
+    if type:
+        q = q.filter(models.Overlay.type == type)
+    return q.order_by(models.Overlay.year.desc().nullslast(), models.Overlay.type, models.Overlay.id).limit(limit).all()
+
+
+EXPORT_COLUMNS = ("id", "created_at", "zipcode", "borough", "reading_id", "metric", "threshold", "value", "severity", "message")
+
+
+def alerts_export_query(
+    *,
+    zipcode: Optional[str] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+):
+    """Column-only SELECT of alerts (EXPORT_COLUMNS) in (created_at, id) order, for streaming."""
+    a, loc = models.Alert, models.Location
+    stmt = select(
+        a.id, a.created_at, loc.zipcode, loc.borough, a.reading_id,
+        a.metric, a.threshold, a.value, a.severity, a.message,
+    ).join(loc, loc.id == a.location_id)
+    if zipcode:
+        stmt = stmt.where(loc.zipcode == zipcode)
+    if start_time or end_time:
+        stmt = stmt.where(time_window(a.created_at, start_time, end_time))
+    return stmt.order_by(a.created_at, a.id)
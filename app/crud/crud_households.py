@@ -1,14 +1,20 @@
 from __future__ import annotations
 from datetime import datetime, timedelta, timezone
-from typing import Optional, List
+from typing import Any, Dict, Iterable, Optional, List, Set
 
 from sqlalchemy.orm import Session
-from sqlalchemy import select, desc, func
+from sqlalchemy import select, desc, func, insert
 
+from ..database import dialect_insert
+from ..services.pagination import after_key
+from ..services.partitions import time_window
+from ..services.timeutil import utc_naive
+from . import crud_rollups
 from ..models import (
     Household,
     HouseholdSensorReading,
     HouseholdAlert,
+    LatestHouseholdReading,
     HealthContext,
 )
 
@@ -38,11 +44,41 @@ def get_household_by_id(db: Session, household_id: int) -> Optional[Household]:
     return db.get(Household, household_id)
 
 
+def get_existing_household_ids(db: Session, household_ids: Iterable[int]) -> Set[int]:
+    return set(get_household_zipcodes(db, household_ids))
+
+
+def get_household_zipcodes(db: Session, household_ids: Iterable[int]) -> Dict[int, str]:
+    ids = set(household_ids)
+    if not ids:
+        return {}
+    stmt = select(Household.household_id, Household.zipcode).where(Household.household_id.in_(ids))
+    return {household_id: zipcode for household_id, zipcode in db.execute(stmt)}
+
+
+def get_distinct_household_zipcodes(db: Session) -> List[str]:
+    """Distinct zipcodes that have at least one household."""
+    return list(db.scalars(select(Household.zipcode).distinct()))
+
+
 def get_households_by_zip(db: Session, zipcode: str, limit: int = 100) -> List[Household]:
     stmt = select(Household).where(Household.zipcode == zipcode).limit(limit)
     return list(db.scalars(stmt))
 
 
+def list_households(
+    db: Session, *, zipcode: Optional[str] = None, limit: int = 100, after: Optional[tuple] = None
+) -> List[Household]:
+    """Households in household_id order, optionally in one zipcode; ``after`` is
+    the (household_id,) of the last row of the previous page."""
+    stmt = select(Household)
+    if zipcode:
+        stmt = stmt.where(Household.zipcode == zipcode)
+    if after:
+        stmt = stmt.where(after_key((Household.household_id,), after))
+    return list(db.scalars(stmt.order_by(Household.household_id).limit(limit)))
+
+
 # Sensor readings
 
 def add_sensor_reading(
@@ -56,11 +92,14 @@ def add_sensor_reading(
     voc: Optional[float] = None,
     humidity: Optional[float] = None,
     mold_flag: bool = False,
+    commit: bool = True,
 ) -> HouseholdSensorReading:
+    """Add a household reading; ``commit=False`` flushes only (see create_alert)."""
     reading = HouseholdSensorReading(
         household_id=household_id,
         device_id=device_id,
-        timestamp=timestamp or datetime.now(timezone.utc),
+        # Naive UTC, as ingest_batch writes, so latest/rollup comparisons never mix naive and aware
+        timestamp=utc_naive(timestamp) if timestamp else datetime.utcnow(),
         pm25=pm25,
         co2=co2,
         voc=voc,
@@ -68,22 +107,121 @@ def add_sensor_reading(
         mold_flag=mold_flag,
     )
     db.add(reading)
-    db.commit()
-    db.refresh(reading)
+    db.flush()
+    row = {c: getattr(reading, c) for c in ("household_id", "device_id", *LATEST_COLUMNS)}
+    upsert_latest_readings(db, [row])
+    household = db.get(Household, household_id)
+    if household is not None:
+        crud_rollups.add_household_readings(db, [{**row, "zipcode": household.zipcode}])
+    if commit:
+        db.commit()
+        db.refresh(reading)
     return reading
 
 
-def get_latest_readings_for_zip(db: Session, zipcode: str, limit: int = 20) -> List[HouseholdSensorReading]:
+def insert_sensor_readings(db: Session, rows: List[Dict[str, Any]]) -> List[int]:
+    """Bulk insert household reading rows without committing; returns ids in input order."""
+    if not rows:
+        return []
+    stmt = insert(HouseholdSensorReading).returning(
+        HouseholdSensorReading.reading_id, sort_by_parameter_order=True
+    )
+    return list(db.scalars(stmt, rows))
+
+
+LATEST_COLUMNS = ("reading_id", "timestamp", "pm25", "co2", "voc", "humidity", "mold_flag")
+
+
+def upsert_latest_readings(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Record household readings as the last known value per (household, device),
+    without committing. Older readings never replace a newer stored value."""
+    newest: Dict[tuple, Dict[str, Any]] = {}
+    for row in rows:
+        key = (row["household_id"], row.get("device_id") or "")
+        current = newest.get(key)
+        if current is None or row["timestamp"] >= current["timestamp"]:
+            newest[key] = row
+    if not newest:
+        return
+    stmt = dialect_insert(db, LatestHouseholdReading)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["household_id", "device_id"],
+        set_={c: stmt.excluded[c] for c in LATEST_COLUMNS},
+        where=stmt.excluded.timestamp >= LatestHouseholdReading.timestamp,
+    )
+    db.execute(stmt, [
+        {"household_id": household_id, "device_id": device_id, **{c: row[c] for c in LATEST_COLUMNS}}
+        for (household_id, device_id), row in newest.items()
+    ])
+
+
+def get_latest_household_readings(db: Session, household_id: int) -> List[LatestHouseholdReading]:
+    stmt = (
+        select(LatestHouseholdReading)
+        .where(LatestHouseholdReading.household_id == household_id)
+        .order_by(desc(LatestHouseholdReading.timestamp))
+    )
+    return list(db.scalars(stmt))
+
+
+def rebuild_latest_readings(db: Session) -> int:
+    """Recompute latest_household_readings from history and commit; returns rows written."""
+    r = HouseholdSensorReading
+    ranked = select(
+        r.household_id,
+        r.device_id,
+        *(getattr(r, c) for c in LATEST_COLUMNS),
+        func.row_number().over(
+            partition_by=(r.household_id, func.coalesce(r.device_id, "")),
+            order_by=(desc(r.timestamp), desc(r.reading_id)),
+        ).label("rn"),
+    ).subquery()
+    rows = db.execute(select(ranked).where(ranked.c.rn == 1)).mappings().all()
+    upsert_latest_readings(db, [dict(row) for row in rows])
+    db.commit()
+    return len(rows)
+
+
+def get_latest_readings_for_zip(
+    db: Session, zipcode: str, limit: int = 20, after: Optional[tuple] = None
+) -> List[HouseholdSensorReading]:
+    """Readings of households in a zipcode, newest first by (timestamp, reading_id)."""
+    key = (HouseholdSensorReading.timestamp, HouseholdSensorReading.reading_id)
     stmt = (
         select(HouseholdSensorReading)
         .join(Household, Household.household_id == HouseholdSensorReading.household_id)
         .where(Household.zipcode == zipcode)
-        .order_by(desc(HouseholdSensorReading.timestamp))
-        .limit(limit)
     )
+    if after:
+        stmt = stmt.where(after_key(key, after, descending=True))
+    stmt = stmt.order_by(*(desc(c) for c in key)).limit(limit)
     return list(db.scalars(stmt))
 
 
+EXPORT_COLUMNS = ("reading_id", "household_id", "device_id", "timestamp", "zipcode", "pm25", "co2", "voc", "humidity", "mold_flag")
+
+
+def readings_export_query(
+    household_id: Optional[int] = None,
+    zipcode: Optional[str] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+):
+    """Column-only SELECT of household readings (EXPORT_COLUMNS) in (timestamp, reading_id) order, for streaming."""
+    r = HouseholdSensorReading
+    stmt = select(
+        r.reading_id, r.household_id, r.device_id, r.timestamp, Household.zipcode,
+        r.pm25, r.co2, r.voc, r.humidity, r.mold_flag,
+    ).join(Household, Household.household_id == r.household_id)
+    if household_id is not None:
+        stmt = stmt.where(r.household_id == household_id)
+    if zipcode:
+        stmt = stmt.where(Household.zipcode == zipcode)
+    if start_time or end_time:
+        stmt = stmt.where(time_window(r.timestamp, start_time, end_time))
+    return stmt.order_by(r.timestamp, r.reading_id)
+
+
 # Alerts
 
 def create_alert(
@@ -94,7 +232,10 @@ def create_alert(
     alert_message: str,
     reading_id: Optional[int] = None,
     timestamp: Optional[datetime] = None,
+    commit: bool = True,
 ) -> HouseholdAlert:
+    """Create a household alert. With ``commit=False`` the row is only flushed so
+    callers can compose several writes into one transaction."""
     alert = HouseholdAlert(
         household_id=household_id,
         reading_id=reading_id,
@@ -103,20 +244,35 @@ def create_alert(
         timestamp=timestamp or datetime.now(timezone.utc),
     )
     db.add(alert)
-    db.commit()
-    db.refresh(alert)
+    if commit:
+        db.commit()
+        db.refresh(alert)
+    else:
+        db.flush()
     return alert
 
 
-def get_alerts_for_household(db: Session, household_id: int, hours_back: int = 24, limit: int = 200) -> List[HouseholdAlert]:
+def insert_alerts(db: Session, rows: List[Dict[str, Any]]) -> int:
+    """Bulk insert household alert rows without committing."""
+    if rows:
+        db.execute(insert(HouseholdAlert), rows)
+    return len(rows)
+
+
+def get_alerts_for_household(
+    db: Session, household_id: int, hours_back: int = 24, limit: int = 200, after: Optional[tuple] = None
+) -> List[HouseholdAlert]:
+    """Alerts of a household, newest first by (timestamp, alert_id)."""
     since = datetime.now(timezone.utc) - timedelta(hours=hours_back)
+    key = (HouseholdAlert.timestamp, HouseholdAlert.alert_id)
     stmt = (
         select(HouseholdAlert)
         .where(HouseholdAlert.household_id == household_id)
-        .where(HouseholdAlert.timestamp >= since)
-        .order_by(desc(HouseholdAlert.timestamp))
-        .limit(limit)
+        .where(time_window(HouseholdAlert.timestamp, since))
     )
+    if after:
+        stmt = stmt.where(after_key(key, after, descending=True))
+    stmt = stmt.order_by(*(desc(c) for c in key)).limit(limit)
     return list(db.scalars(stmt))
 
 
@@ -147,7 +303,26 @@ def upsert_health_context(
     return ctx
 
 
+def upsert_health_contexts(db: Session, rows: List[Dict[str, Any]]) -> int:
+    """Insert or update many health context rows (dicts keyed by column) in one statement."""
+    if not rows:
+        return 0
+    stmt = dialect_insert(db, HealthContext.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["zipcode"],
+        set_={c: stmt.excluded[c] for c in ("asthma_rate", "er_visit_rate", "ej_index")},
+    )
+    db.execute(stmt, rows)
+    db.commit()
+    return len(rows)
+
+
 # Aggregations
+def zip_trends_version(db: Session, *, hours_back: int = 24) -> tuple:
+    """Cheap token that changes whenever `aggregate_zip_trends` would."""
+    return crud_rollups.household_zip_version(db, datetime.now(timezone.utc) - timedelta(hours=hours_back))
+
+
 def aggregate_zip_trends(
     db: Session,
     *,
@@ -155,36 +330,21 @@ def aggregate_zip_trends(
 ) -> List[dict]:
     """Return anonymized zip-level trends over the time window.
     Includes counts and avg metrics for pm25, co2, voc, humidity.
+    Answered from the household rollup tables plus the raw partial hour.
     """
     since = datetime.now(timezone.utc) - timedelta(hours=hours_back)
-    # Join households->readings and compute aggregates by zipcode
-    stmt = (
-        select(
-            Household.zipcode.label("zipcode"),
-            func.count(HouseholdSensorReading.reading_id).label("reading_count"),
-            func.avg(HouseholdSensorReading.pm25).label("avg_pm25"),
-            func.avg(HouseholdSensorReading.co2).label("avg_co2"),
-            func.avg(HouseholdSensorReading.voc).label("avg_voc"),
-            func.avg(HouseholdSensorReading.humidity).label("avg_humidity"),
-            func.max(HouseholdSensorReading.timestamp).label("last_updated"),
-        )
-        .join(Household, Household.household_id == HouseholdSensorReading.household_id)
-        .where(HouseholdSensorReading.timestamp >= since)
-        .group_by(Household.zipcode)
-        .order_by(desc(func.count(HouseholdSensorReading.reading_id)))
-    )
-    rows = db.execute(stmt).all()
+    totals = crud_rollups.household_zip_totals(db, since)
     results = []
-    for zipcode, reading_count, avg_pm25, avg_co2, avg_voc, avg_humidity, last_updated in rows:
+    for zipcode, per_metric in totals.items():
+        readings = per_metric[crud_rollups.READINGS]
         results.append({
             "zipcode": zipcode,
-            "reading_count": int(reading_count or 0),
+            "reading_count": readings.count,
             "averages": {
-                "pm25": float(avg_pm25) if avg_pm25 is not None else None,
-                "co2": float(avg_co2) if avg_co2 is not None else None,
-                "voc": float(avg_voc) if avg_voc is not None else None,
-                "humidity": float(avg_humidity) if avg_humidity is not None else None,
+                metric: per_metric[metric].mean if metric in per_metric else None
+                for metric in ("pm25", "co2", "voc", "humidity")
             },
-            "last_updated": last_updated,
+            "last_updated": readings.last,
         })
+    results.sort(key=lambda r: r["reading_count"], reverse=True)
     return results
@@ -0,0 +1,302 @@
+"""Hourly/daily rollups of sensor and household readings.
+
+Rollups are maintained incrementally: every write path calls
+`add_sensor_readings` / `add_household_readings` inside its own transaction,
+which pre-aggregates the batch per (key, bucket, metric) and merges it into
+the rollup tables with one upsert per table.
+
+Window queries combine daily buckets for whole days, hourly buckets for whole
+hours and raw rows only for the partial hour at the start of the window.
+"""
+from __future__ import annotations
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import dialect_insert
+from ..services.partitions import time_window
+from ..services.timeutil import utc_naive, floor_hour, floor_day, ceil_hour, ceil_day
+
+READING_METRICS = ("pm25", "co2", "tvoc", "temperature", "humidity", "mold_risk")
+HOUSEHOLD_METRICS = ("pm25", "co2", "voc", "humidity")
+READINGS = "readings"  # pseudo metric: every reading, any metrics
+
+
+class Totals:
+    """Mergeable count/sum/sum-of-squares/min/max/last accumulator."""
+
+    __slots__ = ("count", "total", "total_sq", "min", "max", "last")
+
+    def __init__(self, count=0, total=0.0, total_sq=0.0, min=None, max=None, last=None):
+        self.count = count
+        self.total = total
+        self.total_sq = total_sq
+        self.min = min
+        self.max = max
+        self.last = last
+
+    def add(self, value: Optional[float], timestamp: datetime) -> None:
+        self.count += 1
+        if value is not None:
+            self.total += value
+            self.total_sq += value * value
+            self.min = value if self.min is None or value < self.min else self.min
+            self.max = value if self.max is None or value > self.max else self.max
+        if self.last is None or timestamp > self.last:
+            self.last = timestamp
+
+    def merge(self, other: "Totals") -> None:
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        if other.last is not None and (self.last is None or other.last > self.last):
+            self.last = other.last
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    @property
+    def stddev(self) -> Optional[float]:
+        if not self.count:
+            return None
+        variance = self.total_sq / self.count - (self.total / self.count) ** 2
+        return max(variance, 0.0) ** 0.5
+
+
+# Tables per domain: (hourly, daily, key column name)
+_SENSOR = (models.ReadingRollupHourly, models.ReadingRollupDaily, "location_id")
+_HOUSEHOLD = (models.HouseholdRollupHourly, models.HouseholdRollupDaily, "zipcode")
+
+
+def _accumulate(
+    rows: Iterable[Dict[str, Any]], key_field: str, metrics: Tuple[str, ...], floor: Callable[[datetime], datetime]
+) -> Dict[Tuple[Any, datetime, str], Totals]:
+    acc: Dict[Tuple[Any, datetime, str], Totals] = {}
+    for row in rows:
+        ts = utc_naive(row["timestamp"])
+        key, bucket = row[key_field], floor(ts)
+        acc.setdefault((key, bucket, READINGS), Totals()).add(None, ts)
+        for metric in metrics:
+            value = row.get(metric)
+            if value is not None:
+                acc.setdefault((key, bucket, metric), Totals()).add(float(value), ts)
+    return acc
+
+
+def _merge_into(db: Session, model, key_field: str, acc: Dict[Tuple[Any, datetime, str], Totals]) -> None:
+    if not acc:
+        return
+    t = model.__table__.c
+    # A Core insert on the table runs as one executemany; through the ORM
+    # entity, rows with a None min/max are split into separate statements.
+    stmt = dialect_insert(db, model.__table__)
+    ex = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[key_field, "bucket_start", "metric"],
+        set_={
+            "count": t.count + ex.count,
+            "total": t.total + ex.total,
+            "total_sq": t.total_sq + ex.total_sq,
+            "min_value": case((t.min_value.is_(None), ex.min_value), (ex.min_value < t.min_value, ex.min_value), else_=t.min_value),
+            "max_value": case((t.max_value.is_(None), ex.max_value), (ex.max_value > t.max_value, ex.max_value), else_=t.max_value),
+            "last_timestamp": case((t.last_timestamp.is_(None), ex.last_timestamp), (ex.last_timestamp > t.last_timestamp, ex.last_timestamp), else_=t.last_timestamp),
+        },
+    )
+    db.execute(stmt, [
+        {
+            key_field: key,
+            "bucket_start": bucket,
+            "metric": metric,
+            "count": tot.count,
+            "total": tot.total,
+            "total_sq": tot.total_sq,
+            "min_value": tot.min,
+            "max_value": tot.max,
+            "last_timestamp": tot.last,
+        }
+        for (key, bucket, metric), tot in acc.items()
+    ])
+
+
+def _add(db: Session, domain, metrics: Tuple[str, ...], rows: List[Dict[str, Any]]) -> None:
+    hourly, daily, key_field = domain
+    _merge_into(db, hourly, key_field, _accumulate(rows, key_field, metrics, floor_hour))
+    _merge_into(db, daily, key_field, _accumulate(rows, key_field, metrics, floor_day))
+
+
+def add_sensor_readings(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Fold sensor readings (dicts with location_id, timestamp and metrics) into the rollups, without committing."""
+    _add(db, _SENSOR, READING_METRICS, rows)
+
+
+def _accumulate_compacted(rows: Iterable[Dict[str, Any]], floor: Callable[[datetime], datetime]) -> Dict[Tuple[Any, datetime, str], Totals]:
+    acc: Dict[Tuple[Any, datetime, str], Totals] = {}
+    for row in rows:
+        key, bucket, n, last = row["location_id"], floor(row["bucket_start"]), row["samples"], row["last_timestamp"]
+        acc.setdefault((key, bucket, READINGS), Totals()).merge(Totals(count=n, last=last))
+        for metric in READING_METRICS:
+            mean = row.get(metric)
+            if mean is not None:
+                part = Totals(n, mean * n, mean * mean * n, row[f"{metric}_min"], row[f"{metric}_max"], last)
+                acc.setdefault((key, bucket, metric), Totals()).merge(part)
+    return acc
+
+
+def add_compacted_readings(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Fold 5-minute compacted readings into the sensor rollups, without committing.
+
+    Each bucket counts as ``samples`` readings at its mean, so sums and means
+    are exact when every reading carried the metric; the spread within a
+    bucket is lost from the standard deviation.
+    """
+    hourly, daily, key_field = _SENSOR
+    _merge_into(db, hourly, key_field, _accumulate_compacted(rows, floor_hour))
+    _merge_into(db, daily, key_field, _accumulate_compacted(rows, floor_day))
+
+
+def add_household_readings(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Fold household readings (dicts with zipcode, timestamp and metrics) into the rollups, without committing."""
+    _add(db, _HOUSEHOLD, HOUSEHOLD_METRICS, rows)
+
+
+# Window queries
+
+def _rollup_totals(db: Session, domain, since: datetime, keys: Optional[List[Any]]) -> Dict[Any, Dict[str, Totals]]:
+    hourly, daily, key_field = domain
+    h0, d0 = ceil_hour(since), ceil_day(since)
+    result: Dict[Any, Dict[str, Totals]] = {}
+    for model, lower, upper in ((hourly, h0, d0), (daily, d0, None)):
+        key_col = getattr(model, key_field)
+        stmt = select(
+            key_col,
+            model.metric,
+            func.sum(model.count),
+            func.sum(model.total),
+            func.sum(model.total_sq),
+            func.min(model.min_value),
+            func.max(model.max_value),
+            func.max(model.last_timestamp),
+        ).where(model.bucket_start >= lower)
+        if upper is not None:
+            if upper <= lower:
+                continue
+            stmt = stmt.where(model.bucket_start < upper)
+        if keys is not None:
+            stmt = stmt.where(key_col.in_(keys))
+        for key, metric, count, total, total_sq, mn, mx, last in db.execute(stmt.group_by(key_col, model.metric)):
+            result.setdefault(key, {}).setdefault(metric, Totals()).merge(
+                Totals(int(count or 0), total or 0.0, total_sq or 0.0, mn, mx, last)
+            )
+    return result
+
+
+def _raw_totals(db: Session, stmt_base, key_col, ts_col, value_cols: Dict[str, Any], since: datetime) -> Dict[Any, Dict[str, Totals]]:
+    """Aggregate raw rows in [since, next hour) per key, the part no whole bucket covers."""
+    until = ceil_hour(since)
+    if until <= since:
+        return {}
+    columns = [key_col, func.count(), func.max(ts_col)]
+    for col in value_cols.values():
+        columns += [func.count(col), func.sum(col), func.sum(col * col), func.min(col), func.max(col)]
+    stmt = stmt_base.with_only_columns(*columns).where(time_window(ts_col, since, until)).group_by(key_col)
+
+    result: Dict[Any, Dict[str, Totals]] = {}
+    for row in db.execute(stmt):
+        key, count, last = row[0], row[1], row[2]
+        per_metric = result.setdefault(key, {})
+        per_metric[READINGS] = Totals(int(count), last=last)
+        for i, metric in enumerate(value_cols):
+            n, total, total_sq, mn, mx = row[3 + 5 * i: 8 + 5 * i]
+            if n:
+                per_metric[metric] = Totals(int(n), float(total), float(total_sq), float(mn), float(mx), last)
+    return result
+
+
+def _combine(*parts: Dict[Any, Dict[str, Totals]]) -> Dict[Any, Dict[str, Totals]]:
+    combined: Dict[Any, Dict[str, Totals]] = {}
+    for part in parts:
+        for key, per_metric in part.items():
+            target = combined.setdefault(key, {})
+            for metric, tot in per_metric.items():
+                target.setdefault(metric, Totals()).merge(tot)
+    return combined
+
+
+def sensor_totals(db: Session, since: datetime, location_ids: Optional[List[int]] = None) -> Dict[int, Dict[str, Totals]]:
+    """Per-location, per-metric totals for readings with timestamp >= since."""
+    since = utc_naive(since)
+    r = models.SensorReading
+    base = select(r.location_id)
+    if location_ids is not None:
+        base = base.where(r.location_id.in_(location_ids))
+    raw = _raw_totals(db, base, r.location_id, r.timestamp, {m: getattr(r, m) for m in READING_METRICS}, since)
+    return _combine(_rollup_totals(db, _SENSOR, since, location_ids), raw)
+
+
+def household_zip_totals(db: Session, since: datetime) -> Dict[str, Dict[str, Totals]]:
+    """Per-zipcode, per-metric totals for household readings with timestamp >= since."""
+    since = utc_naive(since)
+    r = models.HouseholdSensorReading
+    base = select(models.Household.zipcode).select_from(r).join(
+        models.Household, models.Household.household_id == r.household_id
+    )
+    raw = _raw_totals(db, base, models.Household.zipcode, r.timestamp, {m: getattr(r, m) for m in HOUSEHOLD_METRICS}, since)
+    return _combine(_rollup_totals(db, _HOUSEHOLD, since, None), raw)
+
+
+def household_zip_version(db: Session, since: datetime) -> tuple:
+    """Cheap token that changes whenever `household_zip_totals(db, since)` would.
+
+    The newest reading id catches inserts (ids are assigned as readings are
+    written); the start of the whole-hour buckets and the reading count of
+    the raw partial hour before it catch readings leaving the window. All
+    three are index seeks.
+    """
+    since = utc_naive(since)
+    until = ceil_hour(since)
+    r = models.HouseholdSensorReading
+    raw = select(func.count(), func.max(r.reading_id)).where(time_window(r.timestamp, since, until))
+    newest = select(func.max(r.reading_id)).correlate(None).scalar_subquery()
+    return (until,) + tuple(db.execute(raw.add_columns(newest)).one())
+
+
+# Backfill
+
+def rebuild(db: Session, chunk_size: int = 10000) -> Dict[str, int]:
+    """Recompute all rollups from raw readings in chunks and commit; returns rows scanned per domain."""
+    for model in (models.ReadingRollupHourly, models.ReadingRollupDaily, models.HouseholdRollupHourly, models.HouseholdRollupDaily):
+        db.execute(delete(model))
+
+    r = models.SensorReading
+    stmt = select(r.location_id, r.timestamp, *(getattr(r, m) for m in READING_METRICS))
+    sensor_rows = _stream_into(db, stmt, add_sensor_readings, chunk_size)
+    # History older than the compaction age only survives as 5-minute buckets
+    sensor_rows += _stream_into(db, select(models.CompactedReading.__table__), add_compacted_readings, chunk_size)
+
+    h = models.HouseholdSensorReading
+    stmt = (
+        select(models.Household.zipcode, h.timestamp, *(getattr(h, m) for m in HOUSEHOLD_METRICS))
+        .select_from(h)
+        .join(models.Household, models.Household.household_id == h.household_id)
+    )
+    household_rows = _stream_into(db, stmt, add_household_readings, chunk_size)
+
+    db.commit()
+    return {"sensor_readings": sensor_rows, "household_sensor_readings": household_rows}
+
+
+def _stream_into(db: Session, stmt, add: Callable[[Session, List[Dict[str, Any]]], None], chunk_size: int) -> int:
+    scanned = 0
+    result = db.execute(stmt.execution_options(yield_per=chunk_size))
+    for chunk in result.mappings().partitions():
+        add(db, [dict(row) for row in chunk])
+        scanned += len(chunk)
+    return scanned
@@ -1,42 +1,98 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy.orm import Session, contains_eager, joinedload
+from sqlalchemy import bindparam, delete, func, and_, insert, select, union_all
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 
 from .. import models, schemas
+from . import crud_rollups
+from ..database import dialect_insert
+from ..services.location_cache import location_cache
+from ..services.nyc_geo import borough_for_zip
+from ..services import compaction
+from ..services.pagination import after_key
+from ..services.partitions import time_window
+from ..services.timeutil import utc_naive
 
 from app.schemas.sensor_reading import LocationCreate
 
 def get_location(db: Session, zipcode: str):
     return db.query(models.Location).filter(models.Location.zipcode == zipcode).first()
 
-def create_location(db: Session, location: LocationCreate):
+def create_location(db: Session, location: LocationCreate, commit: bool = True):
+    """Create a location. With ``commit=False`` the row is only flushed (id populated)
+    and the caller owns the transaction."""
     db_location = models.Location(**location.dict())
+    if not db_location.borough:
+        db_location.borough = borough_for_zip(db_location.zipcode)
     db.add(db_location)
-    db.commit()
-    db.refresh(db_location)
+    if commit:
+        db.commit()
+        db.refresh(db_location)
+    else:
+        db.flush()
     return db_location
 
-def get_or_create_location(db: Session, location: LocationCreate):
+def get_or_create_location(db: Session, location: LocationCreate, commit: bool = True):
     db_location = get_location(db, zipcode=location.zipcode)
     if not db_location:
-        db_location = create_location(db, location)
+        db_location = create_location(db, location, commit=commit)
     return db_location
 
-def create_sensor_reading(db: Session, reading: schemas.SensorReadingCreate):
-    # Get or create location
-    location = get_or_create_location(
-        db,
-        LocationCreate(
-            zipcode=reading.location_zipcode,
-            borough=""  # This would be looked up in a real implementation
-        )
+def resolve_location_ids(db: Session, boroughs: Dict[str, Optional[str]]) -> Dict[str, int]:
+    """Map each zipcode in ``boroughs`` to a location id, creating missing locations.
+
+    Cached zipcodes cost no query. The rest are fetched with one SELECT, and any
+    still missing are created with ``INSERT ... ON CONFLICT DO NOTHING`` and
+    re-selected, so concurrent ingest of a new zipcode never hits the unique
+    constraint. A blank borough is filled in from the zipcode. New rows are
+    flushed, not committed, so the caller owns the transaction.
+    """
+    staged = location_cache.staged(db)
+    ids: Dict[str, int] = {}
+    for zipcode in boroughs:
+        location_id = staged.get(zipcode) or location_cache.get(zipcode)
+        if location_id is not None:
+            ids[zipcode] = location_id
+
+    missing = [z for z in boroughs if z not in ids]
+    if missing:
+        found = _select_location_ids(db, missing)
+        new = [
+            {"zipcode": z, "borough": boroughs[z] or borough_for_zip(z)}
+            for z in missing if z not in found
+        ]
+        if new:
+            db.execute(
+                dialect_insert(db, models.Location).on_conflict_do_nothing(index_elements=["zipcode"]),
+                new,
+            )
+            found.update(_select_location_ids(db, [row["zipcode"] for row in new]))
+        location_cache.stage(db, found)
+        ids.update(found)
+    return ids
+
+def _select_location_ids(db: Session, zipcodes: List[str]) -> Dict[str, int]:
+    rows = db.query(models.Location.zipcode, models.Location.id).filter(
+        models.Location.zipcode.in_(zipcodes)
     )
-    
-    # Create the reading
+    return {zipcode: location_id for zipcode, location_id in rows}
+
+def get_location_id(db: Session, zipcode: str, borough: Optional[str] = None) -> int:
+    return resolve_location_ids(db, {zipcode: borough})[zipcode]
+
+def insert_sensor_readings(db: Session, rows: List[Dict[str, Any]]) -> List[int]:
+    """Bulk insert reading rows without committing; returns ids in input order."""
+    if not rows:
+        return []
+    return db.scalars(
+        insert(models.SensorReading).returning(models.SensorReading.id, sort_by_parameter_order=True),
+        rows,
+    ).all()
+
+def create_sensor_reading(db: Session, reading: schemas.SensorReadingCreate):
     db_reading = models.SensorReading(
-        location_id=location.id,
-        timestamp=reading.timestamp or datetime.utcnow(),
+        location_id=get_location_id(db, reading.location_zipcode),
+        timestamp=utc_naive(reading.timestamp) if reading.timestamp else datetime.utcnow(),
         pm25=reading.pm25,
         co2=reading.co2,
         tvoc=reading.tvoc,
@@ -46,25 +102,21 @@ def create_sensor_reading(db: Session, reading: schemas.SensorReadingCreate):
     )
     
     db.add(db_reading)
+    db.flush()
+    upsert_latest_readings(db, [latest_row(db_reading)])
+    crud_rollups.add_sensor_readings(db, [latest_row(db_reading)])
     db.commit()
     db.refresh(db_reading)
     return db_reading
 
 def create_bulk_sensor_readings(db: Session, readings: List[schemas.SensorReadingCreate]):
     """Create multiple sensor readings in a single transaction"""
+    location_ids = resolve_location_ids(db, {r.location_zipcode: None for r in readings})
     db_readings = []
     for reading in readings:
-        location = get_or_create_location(
-            db,
-            schemas.LocationCreate(
-                zipcode=reading.location_zipcode,
-                borough=""  # This would be looked up in a real implementation
-            )
-        )
-        
         db_reading = models.SensorReading(
-            location_id=location.id,
-            timestamp=reading.timestamp or datetime.utcnow(),
+            location_id=location_ids[reading.location_zipcode],
+            timestamp=utc_naive(reading.timestamp) if reading.timestamp else datetime.utcnow(),
             pm25=reading.pm25,
             co2=reading.co2,
             tvoc=reading.tvoc,
@@ -75,6 +127,10 @@ def create_bulk_sensor_readings(db: Session, readings: List[schemas.SensorReadin
         db.add(db_reading)
         db_readings.append(db_reading)
     
+    db.flush()
+    rows = [latest_row(r) for r in db_readings]
+    upsert_latest_readings(db, rows)
+    crud_rollups.add_sensor_readings(db, rows)
     db.commit()
     return db_readings
 
@@ -83,80 +139,167 @@ def get_sensor_readings(
     location_zipcode: Optional[str] = None,
     start_time: Optional[datetime] = None,
     end_time: Optional[datetime] = None,
-    limit: int = 100
+    limit: int = 100,
+    after: Optional[tuple] = None,
 ):
-    query = db.query(models.SensorReading).join(models.Location)
+    """Readings newest first, ordered by (timestamp, id); ``after`` is the
+    (timestamp, id) of the last row of the previous page.
+
+    Compacted 5-minute aggregates stand in for raw readings older than the
+    compaction age; they are only queried when the page reaches that far back.
+    """
+    filters = dict(location_zipcode=location_zipcode, start_time=start_time, end_time=end_time, limit=limit, after=after)
+    readings = _readings_page(db, models.SensorReading, **filters)
+    if len(readings) == limit and readings[-1].timestamp >= compaction.compaction_cutoff():
+        return readings
+    compacted = _readings_page(db, models.CompactedReading, **filters)
+    if not compacted:
+        return readings
+    return sorted(readings + compacted, key=lambda r: (r.timestamp, r.id), reverse=True)[:limit]
+
+def _readings_page(db: Session, model, location_zipcode, start_time, end_time, limit, after):
+    query = db.query(model).join(models.Location).options(contains_eager(model.location))
     
     if location_zipcode:
         query = query.filter(models.Location.zipcode == location_zipcode)
     
-    if start_time:
-        query = query.filter(models.SensorReading.timestamp >= start_time)
+    if start_time or end_time:
+        query = query.filter(time_window(model.timestamp, start_time, end_time, inclusive_until=True))
     
-    if end_time:
-        query = query.filter(models.SensorReading.timestamp <= end_time)
+    key = (model.timestamp, model.id)
+    if after:
+        query = query.filter(after_key(key, after, descending=True))
     
-    return query.order_by(models.SensorReading.timestamp.desc()).limit(limit).all()
+    return query.order_by(*(c.desc() for c in key)).limit(limit).all()
 
-def get_latest_readings_by_location(db: Session, limit: int = 100):
-    # This is a simplified version - in production, you'd want a more efficient query
-    locations = db.query(models.Location).limit(limit).all()
-    results = []
-    
-    for loc in locations:
-        latest = (
-            db.query(models.SensorReading)
-            .filter(models.SensorReading.location_id == loc.id)
-            .order_by(models.SensorReading.timestamp.desc())
-            .first()
+def latest_reading_ids_query(limit: Optional[int] = None, dialect: str = "sqlite"):
+    """SELECT of the newest reading id per location, ordered by location.
+
+    Postgres uses DISTINCT ON, which walks ix_sensor_readings_location_timestamp;
+    other databases rank rows with a ROW_NUMBER() window instead.
+    """
+    reading = models.SensorReading
+    if dialect == "postgresql":
+        stmt = (
+            select(reading.id)
+            .distinct(reading.location_id)
+            .order_by(reading.location_id, reading.timestamp.desc(), reading.id.desc())
         )
-        if latest:
-            results.append(latest)
-    
-    return results
+    else:
+        ranked = select(
+            reading.id,
+            reading.location_id,
+            func.row_number().over(
+                partition_by=reading.location_id,
+                order_by=(reading.timestamp.desc(), reading.id.desc()),
+            ).label("rn"),
+        ).subquery()
+        stmt = select(ranked.c.id).where(ranked.c.rn == 1).order_by(ranked.c.location_id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+def get_latest_readings_by_location(db: Session, limit: int = 100):
+    """Latest reading for up to `limit` locations, read from latest_readings."""
+    return (
+        db.query(models.LatestReading)
+        .options(joinedload(models.LatestReading.location))
+        .order_by(models.LatestReading.location_id)
+        .limit(limit)
+        .all()
+    )
+
+def get_latest_readings_version(db: Session) -> tuple:
+    """(rows, sum of reading ids, newest timestamp) of latest_readings.
+
+    Every upsert swaps in a different reading id, so the sum moves even
+    when readings are committed out of id order.
+    """
+    t = models.LatestReading
+    return tuple(db.execute(select(func.count(), func.sum(t.reading_id), func.max(t.timestamp))).one())
+
+LATEST_COLUMNS = ("reading_id", "timestamp", "pm25", "co2", "tvoc", "temperature", "humidity", "mold_risk")
+
+def latest_row(reading: models.SensorReading) -> Dict[str, Any]:
+    row = {c: getattr(reading, c) for c in LATEST_COLUMNS[1:]}
+    row.update(location_id=reading.location_id, reading_id=reading.id)
+    return row
+
+def upsert_latest_readings(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Record readings (dicts with location_id and LATEST_COLUMNS) as the last known
+    value for their location, without committing.
+
+    Only the newest row per location is written, and a stored value is never
+    replaced by an older one, so late or replayed readings cannot roll it back.
+    """
+    newest: Dict[int, Dict[str, Any]] = {}
+    for row in rows:
+        current = newest.get(row["location_id"])
+        if current is None or row["timestamp"] >= current["timestamp"]:
+            newest[row["location_id"]] = row
+    if not newest:
+        return
+    stmt = dialect_insert(db, models.LatestReading)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["location_id"],
+        set_={c: stmt.excluded[c] for c in LATEST_COLUMNS},
+        where=stmt.excluded.timestamp >= models.LatestReading.timestamp,
+    )
+    db.execute(stmt, [
+        {"location_id": row["location_id"], **{c: row[c] for c in LATEST_COLUMNS}}
+        for row in newest.values()
+    ])
+
+def rebuild_latest_readings(db: Session) -> int:
+    """Recompute latest_readings from sensor_readings and commit; returns rows written."""
+    reading = models.SensorReading
+    latest_ids = latest_reading_ids_query(dialect=db.get_bind().dialect.name)
+    rows = db.execute(
+        select(reading.location_id, reading.id.label("reading_id"), *(getattr(reading, c) for c in LATEST_COLUMNS[1:]))
+        .where(reading.id.in_(latest_ids))
+    ).mappings().all()
+    upsert_latest_readings(db, [dict(r) for r in rows])
+    db.commit()
+    return len(rows)
 
 def get_sensor_stats(
     db: Session,
     location_zipcode: Optional[str] = None,
     time_window_hours: int = 24
-):
+) -> List[Dict[str, Any]]:
+    """Per-location metric totals over the window, answered from the rollup tables.
+
+    Returns dicts with the Location, a {metric: Totals} map and last_updated.
+    """
     time_threshold = datetime.utcnow() - timedelta(hours=time_window_hours)
-    
-    query = db.query(
-        models.Location,
-        func.min(models.SensorReading.pm25).label("min_pm25"),
-        func.max(models.SensorReading.pm25).label("max_pm25"),
-        func.avg(models.SensorReading.pm25).label("avg_pm25"),
-        func.min(models.SensorReading.co2).label("min_co2"),
-        func.max(models.SensorReading.co2).label("max_co2"),
-        func.avg(models.SensorReading.co2).label("avg_co2"),
-        func.max(models.SensorReading.timestamp).label("last_updated")
-    ).join(
-        models.SensorReading,
-        models.SensorReading.location_id == models.Location.id
-    ).filter(
-        models.SensorReading.timestamp >= time_threshold
-    )
-    
+
+    location_ids = None
     if location_zipcode:
-        query = query.filter(models.Location.zipcode == location_zipcode)
-    
-    query = query.group_by(models.Location.id)
-    return query.all()
+        location = get_location(db, zipcode=location_zipcode)
+        if not location:
+            return []
+        location_ids = [location.id]
+
+    totals = crud_rollups.sensor_totals(db, time_threshold, location_ids)
+    locations = {
+        loc.id: loc
+        for loc in db.query(models.Location).filter(models.Location.id.in_(list(totals)))
+    }
+    return [
+        {
+            "location": locations[location_id],
+            "stats": per_metric,
+            "last_updated": per_metric[crud_rollups.READINGS].last,
+        }
+        for location_id, per_metric in sorted(totals.items())
+        if location_id in locations
+    ]
 
 def add_public_health_data(db: Session, health_data: schemas.PublicHealthDataCreate):
-    location = get_location(db, zipcode=health_data.location_zipcode)
-    if not location:
-        location = create_location(
-            db,
-            schemas.LocationCreate(
-                zipcode=health_data.location_zipcode,
-                borough=""  # Would be looked up in a real implementation
-            )
-        )
-    
+    location_id = get_location_id(db, health_data.location_zipcode)
+
     db_health_data = models.PublicHealthData(
-        location_id=location.id,
+        location_id=location_id,
         year=health_data.year,
         asthma_rate=health_data.asthma_rate,
         emergency_visits=health_data.emergency_visits
@@ -164,5 +307,59 @@ def add_public_health_data(db: Session, health_data: schemas.PublicHealthDataCre
     
     db.add(db_health_data)
     db.commit()
-    db.refresh(db_health_data)
+    db.refresh(db_health_data, ["id", "year", "asthma_rate", "emergency_visits", "location"])
     return db_health_data
+
+def get_public_health_data(db: Session, location_id: int, year: Optional[int] = None):
+    query = db.query(models.PublicHealthData).options(joinedload(models.PublicHealthData.location)).filter(
+        models.PublicHealthData.location_id == location_id
+    )
+    if year is not None:
+        query = query.filter(models.PublicHealthData.year == year)
+    return query.all()
+
+def replace_public_health_data(db: Session, rows: List[Dict[str, Any]]) -> int:
+    """Bulk write public health rows, replacing any stored for the same (location_id, year).
+
+    Does not commit.
+    """
+    if not rows:
+        return 0
+    table = models.PublicHealthData.__table__
+    db.execute(
+        delete(table).where(table.c.location_id == bindparam("lid"), table.c.year == bindparam("yr")),
+        [{"lid": row["location_id"], "yr": row["year"]} for row in rows],
+    )
+    db.execute(insert(models.PublicHealthData), rows)
+    return len(rows)
+
+EXPORT_COLUMNS = ("id", "timestamp", "zipcode", "borough", "pm25", "co2", "tvoc", "temperature", "humidity", "mold_risk")
+
+def readings_export_query(
+    location_zipcode: Optional[str] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+):
+    """Column-only SELECT of readings (EXPORT_COLUMNS) in (timestamp, id) order, for streaming.
+
+    Compacted 5-minute aggregates (bucket start, mean values) are included
+    unless the range starts after the compaction age.
+    """
+    r, c, loc = models.SensorReading, models.CompactedReading, models.Location
+    stmt = select(
+        r.id, r.timestamp, loc.zipcode, loc.borough,
+        r.pm25, r.co2, r.tvoc, r.temperature, r.humidity, r.mold_risk,
+    ).join(loc, loc.id == r.location_id)
+    compacted = select(
+        c.last_reading_id.label("id"), c.bucket_start.label("timestamp"), loc.zipcode, loc.borough,
+        c.pm25, c.co2, c.tvoc, c.temperature, c.humidity, c.mold_risk,
+    ).join(loc, loc.id == c.location_id)
+    if location_zipcode:
+        stmt = stmt.where(loc.zipcode == location_zipcode)
+        compacted = compacted.where(loc.zipcode == location_zipcode)
+    if start_time or end_time:
+        stmt = stmt.where(time_window(r.timestamp, start_time, end_time))
+        compacted = compacted.where(time_window(c.bucket_start, start_time, end_time))
+    if start_time and utc_naive(start_time) >= compaction.compaction_cutoff():
+        return stmt.order_by(r.timestamp, r.id)
+    return union_all(stmt, compacted).order_by("timestamp", "id")
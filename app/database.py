@@ -1,17 +1,44 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 import os
 
+from .services import metrics, query_audit
+
 load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./air_quality.db")
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in SQLALCHEMY_DATABASE_URL else {}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False} if "sqlite" in SQLALCHEMY_DATABASE_URL else {},
+    poolclass=metrics.timed_pool_class(SQLALCHEMY_DATABASE_URL, "sync"),
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+metrics.instrument_engine(engine)
+query_audit.instrument_engine(engine)
+
+
+def async_database_url(url: str) -> str:
+    """Map a sync database URL onto its async driver (asyncpg / aiosqlite)."""
+    for prefix, async_prefix in (
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("sqlite:///", "sqlite+aiosqlite:///"),
+    ):
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(SQLALCHEMY_DATABASE_URL)
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=metrics.timed_pool_class(ASYNC_DATABASE_URL, "async"))
+metrics.instrument_engine(async_engine.sync_engine)
+query_audit.instrument_engine(async_engine.sync_engine)
+# Objects stay loaded after commit: lazy loads are not possible outside the session's greenlet
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
 
 Base = declarative_base()
 
@@ -22,3 +49,22 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """Dependency to get an AsyncSession"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def dialect_insert(db, table):
+    """Return the Postgres/SQLite INSERT construct for the session's dialect, which
+    supports ``on_conflict_do_nothing`` and ``on_conflict_do_update``."""
+    name = db.get_bind().dialect.name
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(table)
+    if name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(table)
+    raise NotImplementedError(f"Upserts are not supported on {name}")
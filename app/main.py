@@ -1,5 +1,8 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
 import uvicorn
@@ -10,8 +13,18 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Import database and models
-from .database import engine, Base
+from .database import engine, async_engine, Base, SessionLocal
 from . import models
+from .services.location_cache import location_cache
+from .services.ingest_queue import ingest_queue
+from .services.indicator_store import indicator_store
+from .services.spatial_index import outdoor_index
+from .services.alert_hub import alert_hub
+from .services.metrics import MetricsMiddleware, registry
+from .services.query_audit import QueryAuditMiddleware
+from .services.response_cache import response_cache
+from .services import partitions
+from .crud import crud_sensor_reading, crud_households
 
 # Import API routers
 from .api.endpoints import sensor_readings
@@ -21,13 +34,40 @@ from .api.endpoints import households as households_endpoints
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm in-process caches so the first requests skip lookups
+    with SessionLocal() as db:
+        location_cache.warm(db)
+        # Backfill the last-known-value tables on first start after they were added
+        if db.query(models.LatestReading.location_id).first() is None:
+            crud_sensor_reading.rebuild_latest_readings(db)
+        if db.query(models.LatestHouseholdReading.household_id).first() is None:
+            crud_households.rebuild_latest_readings(db)
+        # Monthly partitions for the coming months (no-op unless the tables are partitioned)
+        partitions.ensure_partitions(db)
+    # Open-data indicators for /context: memory-mapped cache, or parse the CSV once
+    indicator_store.load()
+    # Neighborhood centroids for outdoor PM2.5/NO2/O3 by coordinate
+    outdoor_index.load()
+    if ingest_queue.enabled:
+        await ingest_queue.start()
+    yield
+    # Stop accepting queued readings and write out what is left before exiting
+    await ingest_queue.stop(timeout=float(os.getenv("INGEST_DRAIN_TIMEOUT_SECONDS", "30")))
+    indicator_store.close()
+    outdoor_index.close()
+    await async_engine.dispose()
+
+
 app = FastAPI(
     title="NYC Indoor Air Quality API",
     description="API for collecting and querying indoor air quality data across NYC",
     version="1.0.0",
     docs_url="/api/docs",
     redoc_url="/api/redoc",
-    openapi_url="/api/openapi.json"
+    openapi_url="/api/openapi.json",
+    lifespan=lifespan,
 )
 
 # CORS middleware configuration
@@ -39,6 +79,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request counts and latency per route; SQL timings are hooked up in app/database.py
+if os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes"):
+    app.add_middleware(MetricsMiddleware)
+# Warn about requests over QUERY_BUDGET statements or repeating one (N+1)
+if os.getenv("QUERY_AUDIT_ENABLED", "true").lower() in ("1", "true", "yes"):
+    app.add_middleware(QueryAuditMiddleware)
+
+# Service statistics read at scrape time
+registry.callback(
+    "response_cache_requests_total", "Response cache lookups by route and result.",
+    lambda: [
+        ((route, result), counts[key])
+        for route, counts in response_cache.stats()["routes"].items()
+        for result, key in (("hit", "hits"), ("miss", "misses"))
+    ],
+    ("route", "result"), type="counter",
+)
+registry.callback(
+    "response_cache_hit_ratio", "Response cache hits / lookups since start.",
+    lambda: [((), response_cache.stats()["hit_ratio"])],
+)
+registry.callback(
+    "location_cache_hit_ratio", "Zipcode -> location id cache hits / lookups since start.",
+    lambda: [((), location_cache.hits / (location_cache.hits + location_cache.misses) if location_cache.hits + location_cache.misses else None)],
+)
+registry.callback("ingest_queue_depth", "Readings waiting in the write-behind ingest queue.", lambda: [((), ingest_queue.stats()["depth"])])
+registry.callback("alert_stream_subscribers", "Connected alert stream subscribers.", lambda: [((), alert_hub.stats()["subscribers"])])
+
 # Include API routers
 app.include_router(
     sensor_readings.router,
@@ -68,6 +136,11 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of request, database, ingest and cache metrics."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Create uploads directory if it doesn't exist
 os.makedirs("uploads", exist_ok=True)
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
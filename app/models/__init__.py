@@ -1,3 +1,4 @@
-from .sensor_reading import Location, SensorReading, PublicHealthData
-from .alert_overlay import Alert, Overlay
-from .household import Household, HouseholdSensorReading, HouseholdAlert, HealthContext
+from .sensor_reading import Location, SensorReading, LatestReading, CompactedReading, PublicHealthData
+from .alert_overlay import Alert, AlertState, Overlay
+from .household import Household, HouseholdSensorReading, HouseholdAlert, LatestHouseholdReading, HealthContext
+from .rollup import ReadingRollupHourly, ReadingRollupDaily, HouseholdRollupHourly, HouseholdRollupDaily
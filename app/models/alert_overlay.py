@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, DateTime, String, ForeignKey, JSON
+from sqlalchemy import Column, BigInteger, Integer, Float, DateTime, String, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..database import Base
@@ -9,7 +9,7 @@ class Alert(Base):
     id = Column(Integer, primary_key=True, index=True)
     location_id = Column(Integer, ForeignKey("locations.id"), nullable=False)
     reading_id = Column(Integer, ForeignKey("sensor_readings.id"), nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
 
     metric = Column(String(50), nullable=False)       # e.g., pm25, co2, tvoc, humidity, mold_risk
     threshold = Column(Float, nullable=False)
@@ -19,6 +19,30 @@ class Alert(Base):
 
     location = relationship("Location")
 
+    __table_args__ = (
+        # Keyset pagination over (created_at, id), per location and overall
+        Index("ix_alerts_location_created_id", "location_id", "created_at", "id"),
+        Index("ix_alerts_created_id", "created_at", "id"),
+        # Compaction clears reading_id on alerts whose readings it replaces
+        Index("ix_alerts_reading_id", "reading_id"),
+    )
+
+class AlertState(Base):
+    """Hysteresis state of one alert rule for one location or household.
+
+    Held in memory by services.alert_state and written only on transitions.
+    """
+    __tablename__ = "alert_states"
+
+    scope = Column(String(20), primary_key=True)      # location | household
+    subject_id = Column(BigInteger, primary_key=True)  # locations.id or households.household_id
+    rule = Column(String(50), primary_key=True)       # THRESHOLDS key, e.g. humidity_low
+    status = Column(String(10), nullable=False)       # clear | pending | active
+    since = Column(DateTime, nullable=True)           # reading time the current status began
+    last_notified_at = Column(DateTime, nullable=True)
+    value = Column(Float, nullable=True)              # reading value at the last transition
+    updated_at = Column(DateTime, nullable=False)     # reading time of the last transition
+
 class Overlay(Base):
     __tablename__ = "overlays"
 
@@ -28,5 +52,11 @@ class Overlay(Base):
     year = Column(Integer, nullable=True)
     value = Column(Float, nullable=True)
     meta = Column(JSON, nullable=True)
+    source = Column(String(50), nullable=True)        # dataset a bulk load came from, e.g. nyc_air_quality
 
     location = relationship("Location")
+
+    __table_args__ = (
+        Index("ix_overlays_location_type_year", "location_id", "type", "year"),
+        Index("ix_overlays_source", "source"),
+    )
@@ -1,12 +1,15 @@
-from sqlalchemy import Column, BigInteger, Integer, String, Numeric, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, BigInteger, Integer, String, Numeric, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from ..database import Base
 
+# SQLite only autoincrements INTEGER PRIMARY KEY columns
+BigIntPK = BigInteger().with_variant(Integer, "sqlite")
+
 class Household(Base):
     __tablename__ = "households"
 
-    household_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    household_id = Column(BigIntPK, primary_key=True, autoincrement=True)
     address = Column(String(255), nullable=True)
     zipcode = Column(String(10), nullable=False, index=True)
     housing_type = Column(String(50), nullable=False)
@@ -17,11 +20,15 @@ class Household(Base):
     readings = relationship("HouseholdSensorReading", back_populates="household", cascade="all, delete-orphan")
     alerts = relationship("HouseholdAlert", back_populates="household", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_households_zipcode_id", "zipcode", "household_id"),
+    )
+
 
 class HouseholdSensorReading(Base):
     __tablename__ = "household_sensor_readings"
 
-    reading_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    reading_id = Column(BigIntPK, primary_key=True, autoincrement=True)
     household_id = Column(BigInteger, ForeignKey("households.household_id", ondelete="CASCADE"), nullable=False, index=True)
     device_id = Column(String(100), nullable=True, index=True)
     timestamp = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -34,11 +41,16 @@ class HouseholdSensorReading(Base):
     household = relationship("Household", back_populates="readings")
     alerts = relationship("HouseholdAlert", back_populates="reading")
 
+    __table_args__ = (
+        Index("ix_household_sensor_readings_household_time_id", "household_id", "timestamp", "reading_id"),
+        Index("ix_household_sensor_readings_time", "timestamp"),
+    )
+
 
 class HouseholdAlert(Base):
     __tablename__ = "household_alerts"
 
-    alert_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    alert_id = Column(BigIntPK, primary_key=True, autoincrement=True)
     reading_id = Column(BigInteger, ForeignKey("household_sensor_readings.reading_id", ondelete="SET NULL"), nullable=True)
     household_id = Column(BigInteger, ForeignKey("households.household_id", ondelete="CASCADE"), nullable=False, index=True)
     event_type = Column(String(50), nullable=False)
@@ -48,6 +60,25 @@ class HouseholdAlert(Base):
     household = relationship("Household", back_populates="alerts")
     reading = relationship("HouseholdSensorReading", back_populates="alerts")
 
+    __table_args__ = (
+        Index("ix_household_alerts_household_time_id", "household_id", "timestamp", "alert_id"),
+    )
+
+
+class LatestHouseholdReading(Base):
+    """Last known reading per household device; device_id is "" for readings without one."""
+    __tablename__ = "latest_household_readings"
+
+    household_id = Column(BigInteger, ForeignKey("households.household_id", ondelete="CASCADE"), primary_key=True)
+    device_id = Column(String(100), primary_key=True, default="")
+    reading_id = Column(BigInteger, nullable=False)
+    timestamp = Column(DateTime(timezone=True), nullable=False)
+    pm25 = Column(Numeric(6, 2), nullable=True)
+    co2 = Column(Integer, nullable=True)
+    voc = Column(Numeric(8, 2), nullable=True)
+    humidity = Column(Numeric(5, 2), nullable=True)
+    mold_flag = Column(Boolean, nullable=False, default=False)
+
 
 class HealthContext(Base):
     __tablename__ = "health_context"
@@ -0,0 +1,49 @@
+from sqlalchemy import Column, Integer, Float, DateTime, String, ForeignKey, PrimaryKeyConstraint
+from ..database import Base
+
+# Rollups are stored long-format: one row per (key, bucket, metric). The pseudo
+# metric "readings" counts every reading in the bucket regardless of which
+# metrics it carried, and tracks the bucket's latest timestamp.
+
+
+class RollupColumns:
+    bucket_start = Column(DateTime, nullable=False)
+    metric = Column(String(20), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    total = Column(Float, nullable=False, default=0.0)
+    total_sq = Column(Float, nullable=False, default=0.0)   # sum of squares, for variance
+    min_value = Column(Float, nullable=True)
+    max_value = Column(Float, nullable=True)
+    last_timestamp = Column(DateTime, nullable=True)
+
+
+class ReadingRollupHourly(RollupColumns, Base):
+    __tablename__ = "reading_rollups_hourly"
+
+    location_id = Column(Integer, ForeignKey("locations.id"), nullable=False)
+
+    __table_args__ = (PrimaryKeyConstraint("location_id", "bucket_start", "metric"),)
+
+
+class ReadingRollupDaily(RollupColumns, Base):
+    __tablename__ = "reading_rollups_daily"
+
+    location_id = Column(Integer, ForeignKey("locations.id"), nullable=False)
+
+    __table_args__ = (PrimaryKeyConstraint("location_id", "bucket_start", "metric"),)
+
+
+class HouseholdRollupHourly(RollupColumns, Base):
+    __tablename__ = "household_rollups_hourly"
+
+    zipcode = Column(String(10), nullable=False)
+
+    __table_args__ = (PrimaryKeyConstraint("zipcode", "bucket_start", "metric"),)
+
+
+class HouseholdRollupDaily(RollupColumns, Base):
+    __tablename__ = "household_rollups_daily"
+
+    zipcode = Column(String(10), nullable=False)
+
+    __table_args__ = (PrimaryKeyConstraint("zipcode", "bucket_start", "metric"),)
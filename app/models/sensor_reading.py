@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, Float, DateTime, String, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, Float, DateTime, String, ForeignKey, Index
+from sqlalchemy.orm import relationship, synonym
 from datetime import datetime
 from ..database import Base
 
@@ -20,7 +20,7 @@ class SensorReading(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     location_id = Column(Integer, ForeignKey("locations.id"))
-    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     
     # Air quality metrics
     pm25 = Column(Float, nullable=True)  # PM2.5 in μg/m³
@@ -33,6 +33,84 @@ class SensorReading(Base):
     # Relationship
     location = relationship("Location", back_populates="sensor_readings")
 
+    __table_args__ = (
+        # Serves latest-per-location and per-location time range queries
+        Index("ix_sensor_readings_location_timestamp", "location_id", "timestamp"),
+        # Keyset pagination over (timestamp, id)
+        Index("ix_sensor_readings_timestamp_id", "timestamp", "id"),
+    )
+
+class LatestReading(Base):
+    """Last known reading per location, upserted in the same transaction as ingest."""
+    __tablename__ = "latest_readings"
+
+    location_id = Column(Integer, ForeignKey("locations.id"), primary_key=True)
+    reading_id = Column(Integer, nullable=False)
+    timestamp = Column(DateTime, nullable=False)
+
+    pm25 = Column(Float, nullable=True)
+    co2 = Column(Float, nullable=True)
+    tvoc = Column(Float, nullable=True)
+    temperature = Column(Float, nullable=True)
+    humidity = Column(Float, nullable=True)
+    mold_risk = Column(Float, nullable=True)
+
+    # Lets a LatestReading serialize like the SensorReading it mirrors
+    id = synonym("reading_id")
+
+    location = relationship("Location")
+
+class CompactedReading(Base):
+    """Five-minute aggregate of one location's raw readings, written by services.compaction.
+
+    The plain metric columns hold the bucket mean, so a compacted row
+    serializes like the SensorReading rows it replaced.
+    """
+    __tablename__ = "sensor_readings_compacted"
+
+    # id of the bucket's newest raw reading; unique, and orders buckets like the readings they replace
+    last_reading_id = Column(Integer, primary_key=True, autoincrement=False)
+    location_id = Column(Integer, ForeignKey("locations.id"), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    last_timestamp = Column(DateTime, nullable=False)
+    samples = Column(Integer, nullable=False)   # raw readings folded into the bucket
+
+    pm25 = Column(Float, nullable=True)
+    pm25_min = Column(Float, nullable=True)
+    pm25_max = Column(Float, nullable=True)
+    pm25_last = Column(Float, nullable=True)
+    co2 = Column(Float, nullable=True)
+    co2_min = Column(Float, nullable=True)
+    co2_max = Column(Float, nullable=True)
+    co2_last = Column(Float, nullable=True)
+    tvoc = Column(Float, nullable=True)
+    tvoc_min = Column(Float, nullable=True)
+    tvoc_max = Column(Float, nullable=True)
+    tvoc_last = Column(Float, nullable=True)
+    temperature = Column(Float, nullable=True)
+    temperature_min = Column(Float, nullable=True)
+    temperature_max = Column(Float, nullable=True)
+    temperature_last = Column(Float, nullable=True)
+    humidity = Column(Float, nullable=True)
+    humidity_min = Column(Float, nullable=True)
+    humidity_max = Column(Float, nullable=True)
+    humidity_last = Column(Float, nullable=True)
+    mold_risk = Column(Float, nullable=True)
+    mold_risk_min = Column(Float, nullable=True)
+    mold_risk_max = Column(Float, nullable=True)
+    mold_risk_last = Column(Float, nullable=True)
+
+    id = synonym("last_reading_id")
+    timestamp = synonym("bucket_start")
+
+    location = relationship("Location")
+
+    __table_args__ = (
+        # Same access paths as the raw readings: per location and overall, keyset over (time, id)
+        Index("ix_sensor_readings_compacted_location_bucket", "location_id", "bucket_start", "last_reading_id"),
+        Index("ix_sensor_readings_compacted_bucket", "bucket_start", "last_reading_id"),
+    )
+
 class PublicHealthData(Base):
     __tablename__ = "public_health_data"
     
@@ -44,3 +122,7 @@ class PublicHealthData(Base):
     
     # Relationship
     location = relationship("Location")
+
+    @property
+    def location_zipcode(self):
+        return self.location.zipcode if self.location is not None else None
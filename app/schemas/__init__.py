@@ -35,6 +35,9 @@ from .household import (
 
 from .alerts import (
     IngestPayload,
+    IngestBatch,
+    IngestResult,
+    IngestBatchResponse,
     AlertOut,
     AlertsResponse,
     OverlayOut,
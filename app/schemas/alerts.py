@@ -14,6 +14,21 @@ class IngestPayload(BaseModel):
     temperature: Optional[float] = Field(None, ge=-20, le=60)
     mold_risk: Optional[float] = Field(None, ge=0, le=1)
 
+class IngestBatch(BaseModel):
+    readings: List[IngestPayload] = Field(..., min_length=1, max_length=10000)
+
+class IngestResult(BaseModel):
+    index: int
+    reading_id: int
+    alerts_created: int
+    household_reading_id: Optional[int] = None
+
+class IngestBatchResponse(BaseModel):
+    status: str
+    count: int
+    alerts_created: int
+    results: List[IngestResult]
+
 class AlertOut(BaseModel):
     metric: str
     threshold: float
@@ -27,6 +42,7 @@ class AlertOut(BaseModel):
 class AlertsResponse(BaseModel):
     count: int
     alerts: List[AlertOut]
+    next_cursor: Optional[str] = None
 
 class OverlayOut(BaseModel):
     type: str
@@ -35,8 +51,34 @@ class OverlayOut(BaseModel):
     value: Optional[float] = None
     meta: Optional[Dict[str, Any]] = None
 
+class OutdoorNeighborhood(BaseModel):
+    geo_join_id: str
+    name: str
+    latitude: float
+    longitude: float
+    distance_km: float
+    pm25: Optional[float] = None
+    no2: Optional[float] = None
+    o3: Optional[float] = None
+    periods: Dict[str, Optional[str]] = {}
+
+class OutdoorPoint(BaseModel):
+    lat: float = Field(..., ge=-90, le=90)
+    lon: float = Field(..., ge=-180, le=180)
+
+class OutdoorBatchRequest(BaseModel):
+    points: List[OutdoorPoint] = Field(..., min_length=1, max_length=10000)
+    k: int = Field(3, ge=1, le=20)
+
+class OutdoorResponse(BaseModel):
+    neighborhoods: List[OutdoorNeighborhood]
+
+class OutdoorBatchResponse(BaseModel):
+    results: List[List[OutdoorNeighborhood]]
+
 class RecommendationsResponse(BaseModel):
     status: str
     zipcode: Optional[str] = None
     actions: Optional[List[str]] = None
     reasons: Optional[List[str]] = None
+    outdoor: Optional[OutdoorNeighborhood] = None
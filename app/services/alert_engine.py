@@ -1,88 +1,186 @@
+import operator
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Mapping, NamedTuple, Sequence, Callable
 
-# Thresholds for alerts
+import numpy as np
+
+# Thresholds for alerts. Each entry is one rule: `metric` is the reading field it
+# checks and `op` the comparison that triggers it (reading value `op` limit).
+# `exit` is the hysteresis bound: an active alert clears once the value no
+# longer satisfies `op` against it (see services.alert_state).
 THRESHOLDS = {
-    "pm25": {"limit": 35.0, "severity": "warning", "unit": "μg/m³", "message": "PM2.5 above healthy levels"},
-    "co2": {"limit": 1200.0, "severity": "warning", "unit": "ppm", "message": "CO2 too high; ventilation recommended"},
-    "tvoc": {"limit": 200.0, "severity": "warning", "unit": "ppb", "message": "VOC levels elevated"},
-    "humidity_low": {"limit": 30.0, "severity": "info", "unit": "%", "message": "Humidity too low"},
-    "humidity_high": {"limit": 60.0, "severity": "info", "unit": "%", "message": "Humidity too high"},
-    "mold_risk": {"limit": 0.6, "severity": "warning", "unit": "index", "message": "Mold risk elevated"},
+    "pm25": {"metric": "pm25", "op": ">", "limit": 35.0, "exit": 30.0, "severity": "warning", "unit": "μg/m³", "message": "PM2.5 above healthy levels"},
+    "co2": {"metric": "co2", "op": ">", "limit": 1200.0, "exit": 1000.0, "severity": "warning", "unit": "ppm", "message": "CO2 too high; ventilation recommended"},
+    "tvoc": {"metric": "tvoc", "op": ">", "limit": 200.0, "exit": 150.0, "severity": "warning", "unit": "ppb", "message": "VOC levels elevated"},
+    "humidity_low": {"metric": "humidity", "op": "<", "limit": 30.0, "exit": 35.0, "severity": "info", "unit": "%", "message": "Humidity too low"},
+    "humidity_high": {"metric": "humidity", "op": ">", "limit": 60.0, "exit": 55.0, "severity": "info", "unit": "%", "message": "Humidity too high"},
+    "mold_risk": {"metric": "mold_risk", "op": ">=", "limit": 0.6, "exit": 0.5, "severity": "warning", "unit": "index", "message": "Mold risk elevated"},
 }
 
 METRIC_KEYS = ["pm25", "co2", "tvoc", "humidity", "temperature", "mold_risk"]
 
+_OPS: Dict[str, Callable[[Any, Any], Any]] = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+_VECTOR_OPS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+}
+
+
+class Rule(NamedTuple):
+    key: str
+    metric: str
+    op: str
+    limit: float
+    severity: str
+    message: str
+    unit: str = ""
+    exit: Optional[float] = None  # defaults to limit, i.e. no hysteresis
+
+    @property
+    def exit_limit(self) -> float:
+        return self.limit if self.exit is None else self.exit
+
+
+class RuleEngine:
+    """Evaluates a fixed set of threshold rules against readings.
+
+    Rules are compiled once; `evaluate` checks a single reading dict and
+    `evaluate_batch` checks whole columns of readings with one NumPy comparison
+    per rule.
+    """
+
+    def __init__(self, rules: Iterable[Rule]):
+        self.rules = tuple(rules)
+        for rule in self.rules:
+            if rule.op not in _OPS:
+                raise ValueError(f"Unsupported operator {rule.op!r} in rule {rule.key!r}")
+        self.metrics = tuple(dict.fromkeys(r.metric for r in self.rules))
+        # (metric, compare, limit, template) per rule; the template is copied per alert
+        self._compiled = tuple(
+            (r.metric, _OPS[r.op], r.limit, {"metric": r.metric, "threshold": r.limit, "severity": r.severity, "message": r.message})
+            for r in self.rules
+        )
+        self._metric_names = np.array([r.metric for r in self.rules], dtype=object)
+        self._thresholds = np.array([r.limit for r in self.rules], dtype=np.float64)
+        self._severities = np.array([r.severity for r in self.rules], dtype=object)
+        self._messages = np.array([r.message for r in self.rules], dtype=object)
+
+    @classmethod
+    def from_thresholds(cls, thresholds: Mapping[str, Mapping[str, Any]], extra_rules: Iterable[Rule] = ()) -> "RuleEngine":
+        rules = [
+            Rule(
+                key=key,
+                metric=spec.get("metric", key),
+                op=spec.get("op", ">"),
+                limit=float(spec["limit"]),
+                severity=spec["severity"],
+                message=spec["message"],
+                unit=spec.get("unit", ""),
+                exit=float(spec["exit"]) if spec.get("exit") is not None else None,
+            )
+            for key, spec in thresholds.items()
+        ]
+        return cls([*rules, *extra_rules])
+
+    def evaluate(self, payload: Mapping[str, Any]) -> List[Dict[str, Any]]:
+        alerts: List[Dict[str, Any]] = []
+        get = payload.get
+        for metric, compare, limit, template in self._compiled:
+            value = get(metric)
+            if value is not None and compare(value, limit):
+                alert = template.copy()
+                alert["value"] = float(value)
+                alerts.append(alert)
+        return alerts
 
-def evaluate_reading(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def evaluate_batch(self, columns: Any) -> Dict[str, np.ndarray]:
+        """Evaluate many readings at once.
+
+        `columns` is a NumPy structured array or a mapping of metric name to a
+        1-D array, all of equal length; missing values are NaN. Returns alert
+        rows as parallel arrays ordered by (row, rule):
+        `row` (index into the input), `rule` (index into `self.rules`),
+        `metric`, `threshold`, `value`, `severity` and `message`.
+        """
+        names = columns.dtype.names if isinstance(columns, np.ndarray) else tuple(columns)
+        rows: List[np.ndarray] = []
+        rule_idx: List[np.ndarray] = []
+        values: List[np.ndarray] = []
+        for i, rule in enumerate(self.rules):
+            if rule.metric not in names:
+                continue
+            col = np.asarray(columns[rule.metric], dtype=np.float64)
+            hit = np.flatnonzero(_VECTOR_OPS[rule.op](col, rule.limit))
+            rows.append(hit)
+            rule_idx.append(np.full(hit.shape, i, dtype=np.intp))
+            values.append(col[hit])
+
+        if rows:
+            row = np.concatenate(rows)
+            rule = np.concatenate(rule_idx)
+            value = np.concatenate(values)
+            order = np.lexsort((rule, row))
+            row, rule, value = row[order], rule[order], value[order]
+        else:
+            row = rule = np.empty(0, dtype=np.intp)
+            value = np.empty(0, dtype=np.float64)
+
+        return {
+            "row": row,
+            "rule": rule,
+            "metric": self._metric_names[rule],
+            "threshold": self._thresholds[rule],
+            "value": value,
+            "severity": self._severities[rule],
+            "message": self._messages[rule],
+        }
+
+    def evaluate_many(self, payloads: Sequence[Mapping[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Vectorized equivalent of ``[self.evaluate(p) for p in payloads]``."""
+        result = self.evaluate_batch(columns_from_payloads(payloads, self.metrics))
+        alerts: List[List[Dict[str, Any]]] = [[] for _ in payloads]
+        for row, metric, threshold, value, severity, message in zip(
+            result["row"].tolist(),
+            result["metric"].tolist(),
+            result["threshold"].tolist(),
+            result["value"].tolist(),
+            result["severity"].tolist(),
+            result["message"].tolist(),
+        ):
+            alerts[row].append({
+                "metric": metric,
+                "threshold": threshold,
+                "value": value,
+                "severity": severity,
+                "message": message,
+            })
+        return alerts
+
+
+def columns_from_payloads(payloads: Sequence[Mapping[str, Any]], metrics: Iterable[str] = METRIC_KEYS) -> Dict[str, np.ndarray]:
+    """Build float64 metric columns from reading dicts; None becomes NaN."""
+    return {m: np.array([p.get(m) for p in payloads], dtype=np.float64) for m in metrics}
+
+
+DEFAULT_ENGINE = RuleEngine.from_thresholds(THRESHOLDS)
+
+
+def evaluate_reading(payload: Dict[str, Any], engine: Optional[RuleEngine] = None) -> List[Dict[str, Any]]:
     """
     Given a sensor reading payload (already validated), return a list of alert dicts
     describing any triggered conditions. The dict structure matches DB fields except IDs.
     """
-    alerts: List[Dict[str, Any]] = []
-
-    # PM2.5
-    pm25 = payload.get("pm25")
-    if pm25 is not None and pm25 > THRESHOLDS["pm25"]["limit"]:
-        alerts.append({
-            "metric": "pm25",
-            "threshold": THRESHOLDS["pm25"]["limit"],
-            "value": float(pm25),
-            "severity": THRESHOLDS["pm25"]["severity"],
-            "message": THRESHOLDS["pm25"]["message"],
-        })
-
-    # CO2
-    co2 = payload.get("co2")
-    if co2 is not None and co2 > THRESHOLDS["co2"]["limit"]:
-        alerts.append({
-            "metric": "co2",
-            "threshold": THRESHOLDS["co2"]["limit"],
-            "value": float(co2),
-            "severity": THRESHOLDS["co2"]["severity"],
-            "message": THRESHOLDS["co2"]["message"],
-        })
-
-    # TVOC
-    tvoc = payload.get("tvoc")
-    if tvoc is not None and tvoc > THRESHOLDS["tvoc"]["limit"]:
-        alerts.append({
-            "metric": "tvoc",
-            "threshold": THRESHOLDS["tvoc"]["limit"],
-            "value": float(tvoc),
-            "severity": THRESHOLDS["tvoc"]["severity"],
-            "message": THRESHOLDS["tvoc"]["message"],
-        })
-
-    # Humidity (both low and high)
-    humidity = payload.get("humidity")
-    if humidity is not None:
-        if humidity < THRESHOLDS["humidity_low"]["limit"]:
-            alerts.append({
-                "metric": "humidity",
-                "threshold": THRESHOLDS["humidity_low"]["limit"],
-                "value": float(humidity),
-                "severity": THRESHOLDS["humidity_low"]["severity"],
-                "message": THRESHOLDS["humidity_low"]["message"],
-            })
-        if humidity > THRESHOLDS["humidity_high"]["limit"]:
-            alerts.append({
-                "metric": "humidity",
-                "threshold": THRESHOLDS["humidity_high"]["limit"],
-                "value": float(humidity),
-                "severity": THRESHOLDS["humidity_high"]["severity"],
-                "message": THRESHOLDS["humidity_high"]["message"],
-            })
+    return (engine or DEFAULT_ENGINE).evaluate(payload)
+
 
-    # Mold risk
-    mold_risk = payload.get("mold_risk")
-    if mold_risk is not None and mold_risk >= THRESHOLDS["mold_risk"]["limit"]:
-        alerts.append({
-            "metric": "mold_risk",
-            "threshold": THRESHOLDS["mold_risk"]["limit"],
-            "value": float(mold_risk),
-            "severity": THRESHOLDS["mold_risk"]["severity"],
-            "message": THRESHOLDS["mold_risk"]["message"],
-        })
-
-    return alerts
+def evaluate_batch(columns: Any, engine: Optional[RuleEngine] = None) -> Dict[str, np.ndarray]:
+    """Vectorized evaluate_reading over column arrays; see RuleEngine.evaluate_batch."""
+    return (engine or DEFAULT_ENGINE).evaluate_batch(columns)
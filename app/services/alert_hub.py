@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+class HubFull(Exception):
+    """Too many subscribers; the client should retry later (503)."""
+
+
+class Subscriber:
+    """One push connection: its filters and a bounded buffer of pending events.
+
+    The buffer belongs to the event loop serving the connection; events from
+    other threads or loops are handed over with `call_soon_threadsafe`.
+    """
+
+    def __init__(
+        self,
+        hub: "AlertHub",
+        loop: asyncio.AbstractEventLoop,
+        zipcodes: Set[str],
+        boroughs: Set[str],
+        household_ids: Set[int],
+        buffer: int,
+    ):
+        self.hub = hub
+        self.loop = loop
+        self.zipcodes = zipcodes
+        self.boroughs = boroughs
+        self.household_ids = household_ids
+        self.queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue(maxsize=buffer + 1)  # +1: close marker
+        self.buffer = buffer
+        self.dropped = False
+        self.delivered = 0
+
+    @property
+    def wildcard(self) -> bool:
+        return not (self.zipcodes or self.boroughs or self.household_ids)
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        """Buffer an event; a full buffer drops this subscriber (runs on `loop`)."""
+        if self.dropped:
+            return
+        if self.queue.qsize() >= self.buffer:
+            self.dropped = True
+            self.hub._dropped(self)
+            self.queue.put_nowait(None)
+            return
+        self.queue.put_nowait(event)
+        self.delivered += 1
+
+    async def next(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Next event; None once dropped. Raises asyncio.TimeoutError after `timeout` seconds."""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class AlertHub:
+    """In-process pub/sub fan-out of newly written alerts to push subscribers.
+
+    Subscribers filter by zipcode, borough and/or household id (no filter
+    means every location alert). Household alerts only go to subscribers of
+    that household. Publishing never blocks: each subscriber has a bounded
+    buffer and a subscriber that falls `buffer` events behind is dropped, so
+    one slow dashboard cannot hold back ingest or other clients.
+    """
+
+    def __init__(self, buffer: int = 100, max_subscribers: int = 1000):
+        self.buffer = buffer
+        self.max_subscribers = max_subscribers
+        self._subscribers: Set[Subscriber] = set()
+        self._wildcard: Set[Subscriber] = set()
+        self._by_zipcode: Dict[str, Set[Subscriber]] = {}
+        self._by_borough: Dict[str, Set[Subscriber]] = {}
+        self._by_household: Dict[int, Set[Subscriber]] = {}
+        self.published = 0
+        self.dropped_subscribers = 0
+        self._lock = threading.Lock()  # publishers may run on other threads
+
+    def subscribe(
+        self,
+        zipcodes: Iterable[str] = (),
+        boroughs: Iterable[str] = (),
+        household_ids: Iterable[int] = (),
+    ) -> Subscriber:
+        """Register a subscriber on the running event loop."""
+        sub = Subscriber(
+            self,
+            asyncio.get_running_loop(),
+            set(zipcodes),
+            {b.lower() for b in boroughs},
+            set(household_ids),
+            self.buffer,
+        )
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise HubFull("too many alert stream subscribers")
+            self._subscribers.add(sub)
+            if sub.wildcard:
+                self._wildcard.add(sub)
+            for values, index in self._indexes(sub):
+                for value in values:
+                    index.setdefault(value, set()).add(sub)
+        return sub
+
+    def _indexes(self, sub: Subscriber):
+        return ((sub.zipcodes, self._by_zipcode), (sub.boroughs, self._by_borough), (sub.household_ids, self._by_household))
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(sub)
+            self._wildcard.discard(sub)
+            for values, index in self._indexes(sub):
+                for value in values:
+                    subs = index.get(value)
+                    if subs is not None:
+                        subs.discard(sub)
+                        if not subs:
+                            del index[value]
+
+    def _dropped(self, sub: Subscriber) -> None:
+        self.dropped_subscribers += 1
+        logger.warning("Dropping slow alert stream subscriber (%d events buffered)", sub.queue.qsize())
+
+    def _targets(self, event: Dict[str, Any]) -> Set[Subscriber]:
+        if event.get("household_id") is not None:
+            return set(self._by_household.get(event["household_id"], ()))
+        targets = set(self._wildcard)
+        targets.update(self._by_zipcode.get(event.get("zipcode"), ()))
+        targets.update(self._by_borough.get((event.get("borough") or "").lower(), ()))
+        return targets
+
+    def publish(self, events: Iterable[Dict[str, Any]]) -> None:
+        """Fan events out to matching subscribers; safe to call from any thread."""
+        if not self._subscribers:
+            return
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        for event in events:
+            self.published += 1
+            with self._lock:
+                targets = self._targets(event)
+            for sub in targets:
+                if sub.loop is current:
+                    sub.offer(event)
+                else:
+                    sub.loop.call_soon_threadsafe(sub.offer, event)
+
+    def stage(self, db: Session, events: List[Dict[str, Any]]) -> None:
+        """Queue events for publishing once `db`'s transaction commits."""
+        if events and self._subscribers:
+            db.info.setdefault("staged_alert_events", []).extend(events)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self._subscribers),
+            "max_subscribers": self.max_subscribers,
+            "buffer": self.buffer,
+            "published": self.published,
+            "dropped_subscribers": self.dropped_subscribers,
+        }
+
+
+alert_hub = AlertHub(
+    buffer=int(os.getenv("ALERT_STREAM_BUFFER", "100")),
+    max_subscribers=int(os.getenv("ALERT_STREAM_MAX_SUBSCRIBERS", "1000")),
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_staged_alert_events(session: Session) -> None:
+    events = session.info.pop("staged_alert_events", None)
+    if events:
+        alert_hub.publish(events)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_staged_alert_events(session: Session) -> None:
+    session.info.pop("staged_alert_events", None)
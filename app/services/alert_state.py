@@ -0,0 +1,200 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..crud import crud_alerts
+from .alert_engine import DEFAULT_ENGINE, RuleEngine, _OPS
+
+CLEAR = "clear"
+PENDING = "pending"
+ACTIVE = "active"
+
+StateKey = Tuple[str, int, str]  # (scope, subject_id, rule key)
+
+
+class State(NamedTuple):
+    status: str
+    since: Optional[datetime]
+    last_notified_at: Optional[datetime]
+    value: Optional[float]
+    updated_at: Optional[datetime]
+
+
+_CLEAR = State(CLEAR, None, None, None, None)
+
+
+class AlertStateMachine:
+    """Hysteresis and deduplication for threshold alerts.
+
+    Each (scope, subject, rule) - e.g. ("location", 12, "co2") - is `clear`,
+    `pending` or `active`. A reading past the rule's limit starts `pending`;
+    once the condition has held for `min_dwell` the state turns `active` and
+    one alert is emitted. While active, readings emit nothing until
+    `renotify` has passed since the last alert, and the state only clears
+    when the value falls back past the rule's `exit` bound, so a level
+    hovering around the limit does not flap.
+
+    States live in memory; subjects not seen yet are loaded from
+    `alert_states` on first use. Changes made while processing a batch are
+    staged on the session, written to `alert_states` (transitions only) in
+    the same transaction, and published to memory after it commits.
+    """
+
+    def __init__(
+        self,
+        engine: RuleEngine = DEFAULT_ENGINE,
+        min_dwell: float = 0.0,
+        renotify: Optional[float] = 3600.0,
+        enabled: bool = True,
+    ):
+        self.engine = engine
+        self.min_dwell = timedelta(seconds=min_dwell)
+        self.renotify = timedelta(seconds=renotify) if renotify else None
+        self.enabled = enabled
+        self._rules = tuple(
+            (rule, _OPS[rule.op], {"metric": rule.metric, "threshold": rule.limit, "severity": rule.severity, "message": rule.message})
+            for rule in engine.rules
+        )
+        self._states: Dict[StateKey, State] = {}
+        self._loaded: set = set()  # (scope, subject_id) read from the table
+        self._lock = threading.Lock()
+        self.notified = 0
+        self.suppressed = 0
+        self.transitions = 0
+
+    def reset(self) -> None:
+        """Forget in-memory states; they are reloaded from the table on demand."""
+        with self._lock:
+            self._states.clear()
+            self._loaded.clear()
+
+    def _load(self, db: Session, scope: str, subject_ids: Iterable[int]) -> None:
+        # The query runs without the lock: on an AsyncSession it yields to the
+        # event loop, and another ingest waiting on the lock would block the
+        # loop's thread for good.
+        with self._lock:
+            missing = {s for s in subject_ids if (scope, s) not in self._loaded}
+        if not missing:
+            return
+        rows = crud_alerts.get_alert_states(db, scope, missing)
+        with self._lock:
+            # A concurrent load may have got there first, and its states may
+            # since have moved on; memory wins over the table
+            fresh = {s for s in missing if (scope, s) not in self._loaded}
+            for row in rows:
+                if row.subject_id in fresh:
+                    self._states[(scope, row.subject_id, row.rule)] = State(
+                        row.status, row.since, row.last_notified_at, row.value, row.updated_at
+                    )
+            self._loaded.update((scope, s) for s in fresh)
+
+    def _step(self, state: State, rule, compare, value: float, ts: datetime) -> Tuple[State, bool]:
+        """Next state for one reading and whether it emits an alert."""
+        if state.status == ACTIVE:
+            if not compare(value, rule.exit_limit):
+                return State(CLEAR, ts, state.last_notified_at, value, ts), False
+            if self.renotify is not None and ts - state.last_notified_at >= self.renotify:
+                return State(ACTIVE, state.since, ts, value, ts), True
+            return state, False
+        if not compare(value, rule.limit):
+            if state.status == PENDING:
+                return State(CLEAR, ts, state.last_notified_at, value, ts), False
+            return state, False
+        since = state.since if state.status == PENDING else ts
+        if ts - since >= self.min_dwell:
+            return State(ACTIVE, since, ts, value, ts), True
+        if state.status == PENDING:
+            return state, False
+        return State(PENDING, ts, state.last_notified_at, value, ts), False
+
+    def process(
+        self,
+        db: Session,
+        scope: str,
+        subject_ids: Sequence[int],
+        timestamps: Sequence[datetime],
+        payloads: Sequence[Mapping[str, Any]],
+    ) -> List[List[Dict[str, Any]]]:
+        """Alerts to persist for each reading, in input order; stages state changes on `db`.
+
+        Readings are applied per subject in timestamp order. A reading older
+        than a subject's last transition for a rule does not change that rule.
+        """
+        if not self.enabled:
+            return self.engine.evaluate_many(payloads)
+        alerts: List[List[Dict[str, Any]]] = [[] for _ in payloads]
+        if not payloads:
+            return alerts
+
+        self._load(db, scope, set(subject_ids))
+        with self._lock:
+            staged: Dict[StateKey, State] = db.info.setdefault("staged_alert_states", {}).setdefault(self, {})
+            changed: Dict[StateKey, State] = {}
+            for i in sorted(range(len(payloads)), key=lambda i: timestamps[i]):
+                payload, ts, subject = payloads[i], timestamps[i], subject_ids[i]
+                for rule, compare, template in self._rules:
+                    value = payload.get(rule.metric)
+                    if value is None:
+                        continue
+                    key = (scope, subject, rule.key)
+                    state = staged.get(key) or self._states.get(key) or _CLEAR
+                    if state.updated_at is not None and ts < state.updated_at:
+                        continue
+                    new, notify = self._step(state, rule, compare, float(value), ts)
+                    if notify:
+                        alert = template.copy()
+                        alert["value"] = float(value)
+                        alerts[i].append(alert)
+                        self.notified += 1
+                    elif compare(value, rule.limit):
+                        self.suppressed += 1
+                    if new is not state:
+                        staged[key] = changed[key] = new
+            self.transitions += len(changed)
+
+        crud_alerts.upsert_alert_states(db, [
+            {"scope": s, "subject_id": subject, "rule": rule, **state._asdict()}
+            for (s, subject, rule), state in changed.items()
+        ])
+        return alerts
+
+    def _publish(self, staged: Dict[StateKey, State]) -> None:
+        with self._lock:
+            self._states.update(staged)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = {CLEAR: 0, PENDING: 0, ACTIVE: 0}
+            for state in self._states.values():
+                counts[state.status] += 1
+            return {
+                "enabled": self.enabled,
+                "min_dwell_seconds": self.min_dwell.total_seconds(),
+                "renotify_seconds": self.renotify.total_seconds() if self.renotify else None,
+                "states": counts,
+                "notified": self.notified,
+                "suppressed": self.suppressed,
+                "transitions": self.transitions,
+            }
+
+
+alert_states = AlertStateMachine(
+    min_dwell=float(os.getenv("ALERT_MIN_DWELL_SECONDS", "0")),
+    renotify=float(os.getenv("ALERT_RENOTIFY_SECONDS", "3600")),
+    enabled=os.getenv("ALERT_STATE_ENABLED", "true").lower() in ("1", "true", "yes"),
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_staged_alert_states(session: Session) -> None:
+    for machine, staged in session.info.pop("staged_alert_states", {}).items():
+        machine._publish(staged)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_staged_alert_states(session: Session) -> None:
+    session.info.pop("staged_alert_states", None)
@@ -0,0 +1,217 @@
+"""Columnar (Arrow / Parquet) exports of readings and alerts for offline analytics.
+
+Rows are read in `yield_per` partitions straight from column-only SELECTs and
+turned into Arrow record batches, never ORM objects or pydantic models.
+`write_parquet` lays each dataset out as a hive-partitioned Parquet dataset
+(``<dataset>/date=YYYY-MM-DD/borough=<name>/part-N.parquet``), and
+`arrow_response` streams a time range as an Arrow IPC stream that clients can
+read or memory-map without parsing.
+
+pyarrow is imported lazily; without it these helpers raise
+`ColumnarUnavailable`.
+"""
+import io
+import os
+from decimal import Decimal
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from ..crud import crud_alerts, crud_households, crud_sensor_reading
+from ..database import async_engine
+from .nyc_geo import borough_for_zip
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+BATCH_ROWS = int(os.getenv("COLUMNAR_BATCH_ROWS", "65536"))
+UNKNOWN_BOROUGH = "Unknown"
+
+
+class ColumnarUnavailable(RuntimeError):
+    """pyarrow is not installed."""
+
+
+class Dataset(NamedTuple):
+    query: Callable[..., Any]          # (zipcode, start_time, end_time) -> SELECT
+    fields: Tuple[Tuple[str, str], ...]  # (column, arrow type) in SELECT order
+    time_column: str
+    derive_borough: bool = False       # append borough from the zipcode column
+
+
+_READING_METRICS = (("pm25", "float64"), ("co2", "float64"), ("tvoc", "float64"),
+                    ("temperature", "float64"), ("humidity", "float64"), ("mold_risk", "float64"))
+
+DATASETS: Dict[str, Dataset] = {
+    "sensor_readings": Dataset(
+        query=lambda zipcode, start_time, end_time: crud_sensor_reading.readings_export_query(
+            location_zipcode=zipcode, start_time=start_time, end_time=end_time),
+        fields=(("id", "int64"), ("timestamp", "timestamp"), ("zipcode", "string"), ("borough", "string"), *_READING_METRICS),
+        time_column="timestamp",
+    ),
+    "household_sensor_readings": Dataset(
+        query=lambda zipcode, start_time, end_time: crud_households.readings_export_query(
+            zipcode=zipcode, start_time=start_time, end_time=end_time),
+        fields=(("reading_id", "int64"), ("household_id", "int64"), ("device_id", "string"), ("timestamp", "timestamp"),
+                ("zipcode", "string"), ("pm25", "float64"), ("co2", "int64"), ("voc", "float64"),
+                ("humidity", "float64"), ("mold_flag", "bool_")),
+        time_column="timestamp",
+        derive_borough=True,
+    ),
+    "alerts": Dataset(
+        query=lambda zipcode, start_time, end_time: crud_alerts.alerts_export_query(
+            zipcode=zipcode, start_time=start_time, end_time=end_time),
+        fields=(("id", "int64"), ("created_at", "timestamp"), ("zipcode", "string"), ("borough", "string"),
+                ("reading_id", "int64"), ("metric", "string"), ("threshold", "float64"), ("value", "float64"),
+                ("severity", "string"), ("message", "string")),
+        time_column="created_at",
+    ),
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError as exc:  # pragma: no cover - depends on the environment
+        raise ColumnarUnavailable("pyarrow is required for Arrow/Parquet exports") from exc
+    return pyarrow
+
+
+def _arrow_type(pa, name: str):
+    # Timestamps are stored as naive UTC throughout the app
+    return pa.timestamp("us") if name == "timestamp" else getattr(pa, name)()
+
+
+def arrow_schema(dataset: str):
+    pa = _pyarrow()
+    spec = DATASETS[dataset]
+    fields = [pa.field(name, _arrow_type(pa, type_name)) for name, type_name in spec.fields]
+    if spec.derive_borough:
+        fields.append(pa.field("borough", pa.string()))
+    return pa.schema(fields)
+
+
+def to_record_batch(dataset: str, rows: Sequence[Sequence[Any]]):
+    """Build a record batch from result tuples in the dataset's column order."""
+    pa = _pyarrow()
+    spec = DATASETS[dataset]
+    schema = arrow_schema(dataset)
+    columns: List[Sequence[Any]] = list(zip(*rows)) if rows else [()] * len(spec.fields)
+    arrays = []
+    for (name, type_name), values in zip(spec.fields, columns):
+        if type_name == "float64" and any(isinstance(v, Decimal) for v in values):
+            values = [None if v is None else float(v) for v in values]  # Numeric columns
+        arrays.append(pa.array(values, type=_arrow_type(pa, type_name)))
+    if spec.derive_borough:
+        zipcodes = columns[[name for name, _ in spec.fields].index("zipcode")]
+        arrays.append(pa.array([borough_for_zip(z) if z else None for z in zipcodes], type=pa.string()))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def iter_batches(
+    db: Session,
+    dataset: str,
+    *,
+    zipcode: Optional[str] = None,
+    start_time=None,
+    end_time=None,
+    batch_rows: int = BATCH_ROWS,
+) -> Iterator[Any]:
+    """Record batches of `dataset` read with a sync session, `batch_rows` rows at a time."""
+    stmt = DATASETS[dataset].query(zipcode, start_time, end_time)
+    result = db.execute(stmt.execution_options(yield_per=batch_rows))
+    for rows in result.partitions():
+        yield to_record_batch(dataset, rows)
+
+
+def write_parquet(
+    db: Session,
+    out_dir: str,
+    datasets: Sequence[str] = tuple(DATASETS),
+    *,
+    start_time=None,
+    end_time=None,
+    batch_rows: int = BATCH_ROWS,
+) -> Dict[str, int]:
+    """Write each dataset under ``out_dir/<dataset>`` partitioned by date and borough.
+
+    Partitions touched by this run are replaced, so re-exporting a range is
+    idempotent. Returns rows written per dataset.
+    """
+    pa = _pyarrow()
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    partitioning = ds.partitioning(pa.schema([("date", pa.string()), ("borough", pa.string())]), flavor="hive")
+    written: Dict[str, int] = {}
+    for name in datasets:
+        spec = DATASETS[name]
+        base = arrow_schema(name)
+        borough_idx = base.get_field_index("borough")
+        schema = base.append(pa.field("date", pa.string()))
+        count = 0
+
+        def partitioned():
+            nonlocal count
+            for batch in iter_batches(db, name, start_time=start_time, end_time=end_time, batch_rows=batch_rows):
+                count += batch.num_rows
+                borough = pc.fill_null(batch.column(borough_idx), UNKNOWN_BOROUGH)
+                borough = pc.if_else(pc.equal(borough, ""), UNKNOWN_BOROUGH, borough)
+                date = pc.strftime(batch.column(spec.time_column), format="%Y-%m-%d")
+                arrays = list(batch.columns)
+                arrays[borough_idx] = borough
+                yield pa.RecordBatch.from_arrays([*arrays, date], schema=schema)
+
+        ds.write_dataset(
+            partitioned(),
+            base_dir=os.path.join(out_dir, name),
+            schema=schema,
+            format="parquet",
+            partitioning=partitioning,
+            basename_template="part-{i}.parquet",
+            existing_data_behavior="delete_matching",
+        )
+        written[name] = count
+    return written
+
+
+async def arrow_stream(
+    dataset: str,
+    *,
+    zipcode: Optional[str] = None,
+    start_time=None,
+    end_time=None,
+    batch_rows: int = BATCH_ROWS,
+) -> AsyncIterator[bytes]:
+    """Encode `dataset` as an Arrow IPC stream, one message per `batch_rows` rows."""
+    pa = _pyarrow()
+    stmt = DATASETS[dataset].query(zipcode, start_time, end_time)
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, arrow_schema(dataset))
+
+    def drain() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    yield drain()  # schema message
+    async with async_engine.connect() as conn:
+        result = await conn.stream(stmt.execution_options(yield_per=batch_rows))
+        async for rows in result.partitions():
+            writer.write_batch(to_record_batch(dataset, rows))
+            yield drain()
+    writer.close()
+    yield drain()
+
+
+def arrow_response(dataset: str, *, zipcode: Optional[str] = None, start_time=None, end_time=None) -> StreamingResponse:
+    try:
+        _pyarrow()
+    except ColumnarUnavailable as exc:
+        raise HTTPException(status_code=501, detail=str(exc))
+    return StreamingResponse(
+        arrow_stream(dataset, zipcode=zipcode, start_time=start_time, end_time=end_time),
+        media_type=ARROW_STREAM_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{dataset}.arrows"'},
+    )
@@ -0,0 +1,121 @@
+"""Downsampling of cold sensor readings into 5-minute aggregates.
+
+Raw readings older than ``COMPACT_AFTER_DAYS`` are replaced by one
+CompactedReading per location per 5-minute bucket. The row holds the mean,
+min, max and last value of each metric and the number of readings folded in.
+At 5-second reporting that is one row for every sixty.
+
+`compact_readings` works oldest first in batches of about
+``COMPACTION_BATCH_ROWS`` readings. Each batch covers whole buckets and is
+committed on its own, so ingest only ever waits on one short transaction.
+Readings that arrive later for an already compacted bucket become a second
+row for that bucket on the next run.
+
+Readers do not need to know: crud_sensor_reading merges compacted rows into
+``/readings/`` pages and exports. Rollups are untouched, since they already
+hold the totals of the raw readings.
+"""
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..crud.crud_rollups import READING_METRICS, Totals
+from .timeutil import utc_naive
+
+logger = logging.getLogger(__name__)
+
+COMPACT_AFTER_DAYS = int(os.getenv("COMPACT_AFTER_DAYS", "30"))
+COMPACTION_BATCH_ROWS = int(os.getenv("COMPACTION_BATCH_ROWS", "5000"))
+BUCKET = timedelta(minutes=5)
+
+
+def floor_bucket(ts: datetime) -> datetime:
+    return ts.replace(minute=ts.minute - ts.minute % 5, second=0, microsecond=0)
+
+
+def compaction_cutoff(now: Optional[datetime] = None, after_days: int = COMPACT_AFTER_DAYS) -> datetime:
+    """Readings before this instant (a bucket boundary) are compacted."""
+    return floor_bucket((now or datetime.utcnow()) - timedelta(days=after_days))
+
+
+def aggregate(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One compacted row per (location, bucket) from raw readings ordered by (timestamp, id)."""
+    buckets: Dict[Tuple[int, datetime], Dict[str, Any]] = {}
+    totals: Dict[Tuple[int, datetime, str], Totals] = {}
+    for row in rows:
+        ts = utc_naive(row["timestamp"])
+        key = (row["location_id"], floor_bucket(ts))
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = {"location_id": key[0], "bucket_start": key[1], "samples": 0}
+            for metric in READING_METRICS:
+                bucket.update({metric: None, f"{metric}_min": None, f"{metric}_max": None, f"{metric}_last": None})
+        bucket["samples"] += 1
+        bucket["last_reading_id"], bucket["last_timestamp"] = row["id"], ts
+        for metric in READING_METRICS:
+            value = row[metric]
+            if value is not None:
+                totals.setdefault(key + (metric,), Totals()).add(float(value), ts)
+                bucket[f"{metric}_last"] = float(value)
+    for (location_id, bucket_start, metric), tot in totals.items():
+        bucket = buckets[(location_id, bucket_start)]
+        bucket[metric], bucket[f"{metric}_min"], bucket[f"{metric}_max"] = tot.mean, tot.min, tot.max
+    return list(buckets.values())
+
+
+def _next_batch(db: Session, cutoff: datetime, batch_rows: int) -> List[Dict[str, Any]]:
+    """The oldest raw readings before ``cutoff``, about ``batch_rows`` of them, ending on a bucket boundary."""
+    r = models.SensorReading
+    stmt = select(r.id, r.location_id, r.timestamp, *(getattr(r, m) for m in READING_METRICS)).order_by(r.timestamp, r.id)
+    rows = db.execute(stmt.where(r.timestamp < cutoff).limit(batch_rows)).mappings().all()
+    if len(rows) < batch_rows:
+        return rows
+    edge = floor_bucket(rows[-1]["timestamp"])
+    if edge > floor_bucket(rows[0]["timestamp"]):
+        # Drop the last, possibly partial, bucket; the next batch starts with it
+        return [row for row in rows if row["timestamp"] < edge]
+    # A single bucket holds more than batch_rows readings: take all of it
+    return db.execute(stmt.where(r.timestamp >= edge, r.timestamp < min(edge + BUCKET, cutoff))).mappings().all()
+
+
+def compact_readings(
+    db: Session,
+    *,
+    now: Optional[datetime] = None,
+    after_days: int = COMPACT_AFTER_DAYS,
+    batch_rows: int = COMPACTION_BATCH_ROWS,
+    max_batches: Optional[int] = None,
+    pause: float = 0.0,
+) -> Dict[str, int]:
+    """Replace raw readings older than ``after_days`` with 5-minute aggregates, one committed batch at a time.
+
+    Alerts that pointed at a replaced reading keep their values but lose
+    ``reading_id``. ``pause`` sleeps between batches to leave the database to
+    ingest. Returns the readings replaced, compacted rows written and batches run.
+    """
+    cutoff = compaction_cutoff(now, after_days)
+    stats = {"readings": 0, "buckets": 0, "batches": 0}
+    r, a = models.SensorReading, models.Alert
+    while max_batches is None or stats["batches"] < max_batches:
+        rows = _next_batch(db, cutoff, batch_rows)
+        if not rows:
+            break
+        ids = [row["id"] for row in rows]
+        buckets = aggregate(rows)
+        db.execute(insert(models.CompactedReading.__table__), buckets)
+        db.execute(update(a).where(a.reading_id.in_(ids)).values(reading_id=None).execution_options(synchronize_session=False))
+        db.execute(delete(r).where(r.id.in_(ids)).execution_options(synchronize_session=False))
+        db.commit()
+        stats["readings"] += len(rows)
+        stats["buckets"] += len(buckets)
+        stats["batches"] += 1
+        logger.debug("Compacted %d readings into %d buckets (through %s)", len(rows), len(buckets), rows[-1]["timestamp"])
+        if pause:
+            time.sleep(pause)
+    return stats
@@ -0,0 +1,76 @@
+"""Conditional GETs (ETag / If-None-Match, Last-Modified / If-Modified-Since).
+
+Polling endpoints compute a small version token from indexed aggregates
+(max id, counts, newest timestamp) before building their response. The
+ETag is a hash of that token and the request parameters, so an unchanged
+poll is answered ``304 Not Modified`` without loading or serializing rows.
+"""
+import hashlib
+import json
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Optional
+
+from fastapi import Request, Response
+
+CACHE_CONTROL = "no-cache"  # clients may store responses but must revalidate
+
+
+def make_etag(*parts: Any) -> str:
+    """Weak ETag for a version token and the parameters that shape the response."""
+    raw = json.dumps(parts, default=str, separators=(",", ":")).encode("utf-8")
+    return 'W/"%s"' % hashlib.blake2b(raw, digest_size=12).hexdigest()
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since is None:
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+
+def check_not_modified(
+    request: Request,
+    response: Response,
+    etag: str,
+    last_modified: Optional[datetime] = None,
+) -> Optional[Response]:
+    """Set the validators on ``response``; return a 304 response if the client's copy is current.
+
+    ``last_modified`` is a naive UTC (or aware) datetime. As in RFC 9110,
+    If-Modified-Since is only consulted when the request has no If-None-Match.
+    """
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified is not None:
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        current = _etag_matches(if_none_match, etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        current = bool(if_modified_since and last_modified and _not_modified_since(if_modified_since, last_modified))
+    if current:
+        return Response(status_code=304, headers=headers)
+    return None
@@ -0,0 +1,85 @@
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Callable, Dict, Sequence
+
+from fastapi.responses import StreamingResponse
+
+from ..database import async_engine
+
+MEDIA_TYPES: Dict[str, str] = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def encode_ndjson(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> str:
+    dumps = json.dumps
+    return "".join(
+        dumps(dict(zip(columns, map(_plain, row))), separators=(",", ":")) + "\n"
+        for row in rows
+    )
+
+
+def encode_csv(columns: Sequence[str], rows: Sequence[Sequence[Any]]) -> str:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerows([_plain(v) for v in row] for row in rows)
+    return buf.getvalue()
+
+
+ENCODERS: Dict[str, Callable[[Sequence[str], Sequence[Sequence[Any]]], str]] = {
+    "ndjson": encode_ndjson,
+    "csv": encode_csv,
+}
+
+
+async def stream_rows(
+    stmt,
+    columns: Sequence[str],
+    fmt: str = "ndjson",
+    gzip: bool = False,
+    chunk_rows: int = EXPORT_CHUNK_ROWS,
+) -> AsyncIterator[bytes]:
+    """Run `stmt` on its own connection and yield it encoded, one chunk per `chunk_rows` rows.
+
+    Rows are fetched with ``yield_per`` (a server-side cursor on Postgres) and
+    encoded straight from result tuples, so memory stays flat whatever the size
+    of the result. With ``gzip`` the chunks form a single gzip stream.
+    """
+    encode = ENCODERS[fmt]
+    compressor = zlib.compressobj(wbits=31) if gzip else None  # wbits=31: gzip container
+
+    def out(text: str) -> bytes:
+        data = text.encode("utf-8")
+        return compressor.compress(data) if compressor else data
+
+    if fmt == "csv":
+        yield out(encode_csv((), [columns]))
+    # The request's session may be closed before the body is sent; own the connection
+    async with async_engine.connect() as conn:
+        result = await conn.stream(stmt.execution_options(yield_per=chunk_rows))
+        async for rows in result.partitions():
+            data = out(encode(columns, rows))
+            if data:
+                yield data
+    if compressor:
+        yield compressor.flush()
+
+
+def export_response(stmt, columns: Sequence[str], fmt: str, gzip: bool, name: str) -> StreamingResponse:
+    filename = f"{name}.{fmt}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        stream_rows(stmt, columns, fmt, gzip),
+        media_type="application/gzip" if gzip else MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,249 @@
+"""Read-only, memory-resident index of the NYC air quality indicators.
+
+The UHF42 rows of `Air_Quality_20250927.csv` are held as one NumPy structured
+array sorted by a packed ``(geo, indicator, year)`` key, with the indicator,
+neighborhood and time period strings dictionary-encoded into small integer
+codes. A zipcode maps to its UHF42 neighborhood and every lookup is a
+`searchsorted` range over the key column, so `/context` never touches the
+database or scans rows.
+
+After the first parse the array is saved as ``.npy`` (plus a small JSON file
+holding the dictionaries) next to the CSV. Later startups memory-map it instead
+of re-parsing, as long as the CSV's size and mtime still match.
+"""
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .nyc_geo import UHF42_ZIPCODES
+from .open_data import COLUMNS, INDICATOR_TYPES, period_years
+
+logger = logging.getLogger(__name__)
+
+CSV_PATH = os.getenv("INDICATOR_CSV_PATH", "Air_Quality_20250927.csv")
+CACHE_VERSION = 1
+
+ROW_DTYPE = np.dtype([
+    ("key", "<i8"),        # geo << 32 | indicator << 16 | year
+    ("unique_id", "<i8"),
+    ("value", "<f8"),
+    ("geo", "<i2"),
+    ("indicator", "<i2"),
+    ("period", "<i2"),
+    ("year", "<i2"),
+])
+
+
+def _pack(geo, indicator=0, year=0):
+    return (geo << 32) | (indicator << 16) | year
+
+
+def default_cache_path(csv_path: str) -> str:
+    root, _ = os.path.splitext(csv_path)
+    return root + ".indicators.npy"
+
+
+def _csv_stamp(csv_path: str) -> Optional[Dict[str, int]]:
+    try:
+        st = os.stat(csv_path)
+    except OSError:
+        return None
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def build(csv_path: str) -> Tuple[np.ndarray, Dict[str, List[Any]]]:
+    """Parse the CSV into the sorted row array and its string dictionaries."""
+    import pandas as pd
+
+    df = pd.read_csv(csv_path, usecols=lambda c: c in COLUMNS, dtype={"Geo Join ID": str, "Start_Date": str})
+    df = df.rename(columns=COLUMNS)
+    df = df[(df["geo_type"] == "UHF42") & df["value"].notna()].drop_duplicates("unique_id")
+    df["geo_join_id"] = df["geo_join_id"].str.strip()
+    df = df[df["geo_join_id"].isin(UHF42_ZIPCODES)]
+
+    # Sorted dictionaries; codes are positions in them
+    geo_ids, geo_codes = np.unique(df["geo_join_id"].to_numpy(dtype=str), return_inverse=True)
+    indicator_ids, indicator_codes = np.unique(df["indicator_id"].to_numpy(dtype=np.int64), return_inverse=True)
+    periods, period_codes = np.unique(df["time_period"].to_numpy(dtype=str), return_inverse=True)
+    years = period_years(df).to_numpy()
+
+    rows = np.empty(len(df), dtype=ROW_DTYPE)
+    rows["geo"] = geo_codes
+    rows["indicator"] = indicator_codes
+    rows["period"] = period_codes
+    rows["year"] = years
+    rows["key"] = _pack(*(rows[c].astype(np.int64) for c in ("geo", "indicator", "year")))
+    rows["unique_id"] = df["unique_id"].to_numpy()
+    rows["value"] = df["value"].to_numpy(dtype=np.float64)
+    rows.sort(order=["key", "period", "unique_id"])
+
+    firsts = df.groupby("indicator_id").first()
+    place_names = df.groupby("geo_join_id")["geo_place_name"].first()
+    dictionaries = {
+        "geo_ids": geo_ids.tolist(),
+        "geo_names": [place_names[g] for g in geo_ids],
+        "indicator_ids": indicator_ids.tolist(),
+        "types": [INDICATOR_TYPES.get(int(i), f"indicator_{i}") for i in indicator_ids],
+        "names": [firsts.at[i, "indicator"] for i in indicator_ids],
+        "measures": [firsts.at[i, "measure"] for i in indicator_ids],
+        "units": [firsts.at[i, "unit"] for i in indicator_ids],
+        "periods": periods.tolist(),
+    }
+    return rows, dictionaries
+
+
+class IndicatorStore:
+    """Indicator values by zipcode, type and year, answered from memory."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.close()
+
+    @property
+    def loaded(self) -> bool:
+        return self._rows is not None
+
+    def close(self) -> None:
+        """Drop the arrays (and the memory map, if any)."""
+        self._rows: Optional[np.ndarray] = None
+        self._keys: Optional[np.ndarray] = None
+        self._ranges: Dict[int, Tuple[int, int]] = {}
+        self._dicts: Dict[str, List[Any]] = {}
+        self._geo_by_zip: Dict[str, int] = {}
+        self._type_codes: Dict[str, int] = {}
+        self.source: Optional[str] = None  # "cache" or "csv"
+
+    def load(self, csv_path: str = CSV_PATH, cache_path: Optional[str] = None) -> bool:
+        """Memory-map a fresh cache or parse the CSV (and write the cache); False if neither exists."""
+        cache_path = cache_path or default_cache_path(csv_path)
+        meta_path = cache_path + ".json"
+        stamp = _csv_stamp(csv_path)
+        with self._lock:
+            rows = dicts = None
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                if meta.get("version") == CACHE_VERSION and (stamp is None or meta.get("csv") == stamp):
+                    rows, dicts, source = np.load(cache_path, mmap_mode="r"), meta["dictionaries"], "cache"
+            except (OSError, ValueError, KeyError):
+                rows = None
+            if rows is None:
+                if stamp is None:
+                    logger.warning("Indicator CSV %s not found; /context falls back to the database", csv_path)
+                    return False
+                rows, dicts = build(csv_path)
+                source = "csv"
+                self._write_cache(rows, dicts, stamp, cache_path, meta_path)
+            self._install(rows, dicts, source)
+        return True
+
+    @staticmethod
+    def _write_cache(rows, dicts, stamp, cache_path: str, meta_path: str) -> None:
+        try:
+            tmp = cache_path + ".tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, rows)
+            os.replace(tmp, cache_path)
+            with open(meta_path + ".tmp", "w") as f:
+                json.dump({"version": CACHE_VERSION, "csv": stamp, "dictionaries": dicts}, f)
+            os.replace(meta_path + ".tmp", meta_path)
+        except OSError:
+            logger.warning("Could not write indicator cache %s", cache_path, exc_info=True)
+
+    def _install(self, rows: np.ndarray, dicts: Dict[str, List[Any]], source: str) -> None:
+        geo_codes = {g: i for i, g in enumerate(dicts["geo_ids"])}
+        self._rows = rows
+        self._keys = np.ascontiguousarray(rows["key"])
+        # Exact (geo, indicator, year) -> row range, the common /context lookup
+        keys, starts = np.unique(self._keys, return_index=True)
+        stops = np.append(starts[1:], len(self._keys))
+        self._ranges = dict(zip(keys.tolist(), zip(starts.tolist(), stops.tolist())))
+        self._dicts = dicts
+        self._geo_by_zip = {z: geo_codes[g] for g, zips in UHF42_ZIPCODES.items() if g in geo_codes for z in zips}
+        self._type_codes = {t: i for i, t in enumerate(dicts["types"])}
+        self.source = source
+
+    def _ranges_for(self, geo: int, indicator: Optional[int], year: Optional[int]) -> List[Tuple[int, int]]:
+        if indicator is not None and year is not None:
+            found = self._ranges.get(_pack(geo, indicator, year))
+            return [found] if found else []
+        if indicator is not None:
+            lo, hi = _pack(geo, indicator), _pack(geo, indicator, 0xFFFF)
+        else:
+            lo, hi = _pack(geo), _pack(geo, 0xFFFF, 0xFFFF)
+        return [(int(np.searchsorted(self._keys, lo, side="left")), int(np.searchsorted(self._keys, hi, side="right")))]
+
+    def query(
+        self,
+        *,
+        zipcode: Optional[str] = None,
+        year: Optional[int] = None,
+        type: Optional[str] = None,
+        limit: int = 200,
+    ) -> List[Dict[str, Any]]:
+        """Overlay dicts (type, zipcode, year, value, meta), newest year first."""
+        if not self.loaded:
+            raise RuntimeError("indicator store is not loaded")
+        d = self._dicts
+        indicator = None
+        if type is not None:
+            indicator = self._type_codes.get(type)
+            if indicator is None:
+                return []
+        if zipcode is not None:
+            geo = self._geo_by_zip.get(zipcode)
+            geos = [] if geo is None else [geo]
+        else:
+            geos = range(len(d["geo_ids"]))
+
+        # Tuples of (key, unique_id, value, geo, indicator, period, year)
+        rows = [
+            row
+            for geo in geos
+            for start, stop in self._ranges_for(geo, indicator, year)
+            for row in self._rows[start:stop].tolist()
+            if year is None or row[6] == year
+        ]
+        types = d["types"]
+        rows.sort(key=lambda r: (-r[6], types[r[4]], r[3], r[5]))
+
+        out: List[Dict[str, Any]] = []
+        for _, unique_id, value, geo, i, period, row_year in rows:
+            geo_id = d["geo_ids"][geo]
+            for zc in ([zipcode] if zipcode is not None else UHF42_ZIPCODES[geo_id]):
+                if len(out) >= limit:
+                    return out
+                out.append({
+                    "type": types[i],
+                    "zipcode": zc,
+                    "year": row_year,
+                    "value": value,
+                    "meta": {
+                        "unique_id": unique_id,
+                        "indicator": d["names"][i],
+                        "measure": d["measures"][i],
+                        "unit": d["units"][i],
+                        "time_period": d["periods"][period],
+                        "geo_type": "UHF42",
+                        "geo_join_id": geo_id,
+                        "geo_place_name": d["geo_names"][geo],
+                    },
+                })
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.loaded,
+            "source": self.source,
+            "rows": 0 if self._rows is None else int(len(self._rows)),
+            "bytes": 0 if self._rows is None else int(self._rows.nbytes),
+            "indicators": len(self._dicts.get("types", [])),
+            "neighborhoods": len(self._dicts.get("geo_ids", [])),
+        }
+
+
+indicator_store = IndicatorStore()
@@ -0,0 +1,199 @@
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Sequence
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..crud import crud_sensor_reading as readings_crud
+from ..crud import crud_alerts as alerts_crud
+from ..crud import crud_households as hh_crud
+from ..crud import crud_rollups
+from ..schemas.alerts import IngestPayload
+from .alert_engine import DEFAULT_ENGINE, THRESHOLDS
+from .alert_hub import alert_hub
+from .alert_state import alert_states
+from .metrics import ALERTS_CREATED, INGEST_READINGS, inc_on_commit
+from .nyc_geo import borough_for_zip
+from .response_cache import response_cache
+from .timeutil import utc_naive
+
+
+def household_event_type(alert: Dict[str, Any]) -> str:
+    """Derive the household_alerts.event_type for an alert from evaluate_reading."""
+    metric = alert["metric"]
+    if metric == "humidity":
+        suffix = "low" if alert["value"] < alert["threshold"] else "high"
+        return f"humidity_{suffix}"
+    if metric in ("pm25", "co2", "tvoc", "mold_risk"):
+        return f"{metric}_high"
+    return metric
+
+
+def location_alert_event(row: Dict[str, Any], zipcode: str, borough: Optional[str]) -> Dict[str, Any]:
+    """Alert stream event for an alerts row."""
+    return {
+        "scope": "location",
+        "zipcode": zipcode,
+        "borough": borough,
+        "reading_id": row["reading_id"],
+        "metric": row["metric"],
+        "threshold": row["threshold"],
+        "value": row["value"],
+        "severity": row["severity"],
+        "message": row["message"],
+        "created_at": row["created_at"].isoformat(),
+    }
+
+
+def household_alert_event(row: Dict[str, Any], zipcode: Optional[str]) -> Dict[str, Any]:
+    """Alert stream event for a household_alerts row."""
+    return {
+        "scope": "household",
+        "household_id": row["household_id"],
+        "zipcode": zipcode,
+        "reading_id": row["reading_id"],
+        "event_type": row["event_type"],
+        "message": row["alert_message"],
+        "created_at": row["timestamp"].isoformat(),
+    }
+
+
+def household_reading_fields(payload: IngestPayload, timestamp: datetime) -> Dict[str, Any]:
+    """Map an ingest payload onto household_sensor_readings columns (tvoc -> voc, mold_risk -> mold_flag)."""
+    mold_flag = False
+    if payload.mold_risk is not None:
+        mold_flag = bool(payload.mold_risk >= THRESHOLDS["mold_risk"]["limit"])
+    return {
+        "household_id": payload.household_id,
+        "device_id": None,
+        "timestamp": timestamp,
+        "pm25": payload.pm25,
+        "co2": int(payload.co2) if payload.co2 is not None else None,
+        "voc": payload.tvoc,
+        "humidity": payload.humidity,
+        "mold_flag": mold_flag,
+    }
+
+
+def ingest_batch(db: Session, payloads: Sequence[IngestPayload], commit: bool = True) -> List[Dict[str, Any]]:
+    """Persist a batch of readings and their alerts in a single transaction.
+
+    Locations are resolved once per distinct zipcode, and readings, alerts and
+    the mirrored household rows are written with one bulk INSERT per table.
+    Ids come back via INSERT ... RETURNING, so nothing is refreshed afterwards.
+    Alert rows are only written for alerts the state machine
+    (services.alert_state) emits; ``alerts`` in each result holds those and
+    ``triggered`` every condition the reading meets.
+    With ``commit=False`` the writes are only flushed and the caller commits.
+    Returns one result dict per payload, in input order.
+    """
+    now = datetime.utcnow()
+    location_ids = readings_crud.resolve_location_ids(db, {p.zipcode: p.borough for p in payloads})
+
+    timestamps = [utc_naive(p.timestamp) if p.timestamp else now for p in payloads]
+    reading_rows = [
+        {
+            "location_id": location_ids[p.zipcode],
+            "timestamp": ts,
+            "pm25": p.pm25,
+            "co2": p.co2,
+            "tvoc": p.tvoc,
+            "temperature": p.temperature,
+            "humidity": p.humidity,
+            "mold_risk": p.mold_risk,
+        }
+        for p, ts in zip(payloads, timestamps)
+    ]
+    reading_ids = readings_crud.insert_sensor_readings(db, reading_rows)
+    readings_crud.upsert_latest_readings(db, [
+        {**row, "reading_id": reading_id} for row, reading_id in zip(reading_rows, reading_ids)
+    ])
+    crud_rollups.add_sensor_readings(db, reading_rows)
+
+    # Conditions each reading meets (for advice), and the alerts the state
+    # machine lets through (new or re-notified conditions only)
+    payload_dicts = [p.dict() for p in payloads]
+    triggered = DEFAULT_ENGINE.evaluate_many(payload_dicts)
+    notified = alert_states.process(db, "location", [row["location_id"] for row in reading_rows], timestamps, payload_dicts)
+    alert_rows = [
+        {"location_id": location_ids[p.zipcode], "reading_id": reading_id, "created_at": now, **a}
+        for p, reading_id, alerts in zip(payloads, reading_ids, notified)
+        for a in alerts
+    ]
+    alerts_crud.insert_alerts(db, alert_rows)
+
+    # Mirror readings that name a household into the Step 3 tables
+    mirrored = [i for i, p in enumerate(payloads) if p.household_id is not None]
+    hh_reading_ids: List[Optional[int]] = [None] * len(payloads)
+    hh_rows = [household_reading_fields(payloads[i], timestamps[i]) for i in mirrored]
+    new_ids = hh_crud.insert_sensor_readings(db, hh_rows)
+    for i, hh_reading_id in zip(mirrored, new_ids):
+        hh_reading_ids[i] = hh_reading_id
+    hh_crud.upsert_latest_readings(db, [
+        {**row, "reading_id": hh_reading_id} for row, hh_reading_id in zip(hh_rows, new_ids)
+    ])
+    zipcodes = hh_crud.get_household_zipcodes(db, {row["household_id"] for row in hh_rows})
+    crud_rollups.add_household_readings(db, [
+        {**row, "zipcode": zipcodes[row["household_id"]]} for row in hh_rows if row["household_id"] in zipcodes
+    ])
+
+    hh_notified = alert_states.process(
+        db,
+        "household",
+        [payloads[i].household_id for i in mirrored],
+        [timestamps[i] for i in mirrored],
+        [payload_dicts[i] for i in mirrored],
+    )
+    hh_alert_rows = [
+        {
+            "household_id": payloads[i].household_id,
+            "reading_id": hh_reading_ids[i],
+            "event_type": household_event_type(a),
+            "alert_message": a["message"],
+            "timestamp": now,
+        }
+        for i, alerts in zip(mirrored, hh_notified)
+        for a in alerts
+    ]
+    hh_crud.insert_alerts(db, hh_alert_rows)
+
+    # Pushed to /alerts/stream subscribers once the transaction commits
+    boroughs = {p.zipcode: p.borough or borough_for_zip(p.zipcode) for p in payloads}
+    zipcode_of = {location_ids[z]: z for z in boroughs}
+    alert_hub.stage(db, [
+        location_alert_event(row, zipcode_of[row["location_id"]], boroughs[zipcode_of[row["location_id"]]])
+        for row in alert_rows
+    ] + [
+        household_alert_event(row, zipcodes.get(row["household_id"]))
+        for row in hh_alert_rows
+    ])
+
+    # Cached /alerts, /readings/stats/ and /recommendations answers for these zipcodes
+    response_cache.stage(db, boroughs)
+
+    inc_on_commit(db, INGEST_READINGS, amount=len(payloads))
+    for scope, rows in (("location", alert_rows), ("household", hh_alert_rows)):
+        counts: Dict[str, int] = {}
+        for row in rows:
+            metric = row["metric"] if scope == "location" else row["event_type"]
+            counts[metric] = counts.get(metric, 0) + 1
+        for metric, n in counts.items():
+            inc_on_commit(db, ALERTS_CREATED, metric, scope, amount=n)
+
+    if commit:
+        db.commit()
+
+    return [
+        {
+            "reading_id": reading_id,
+            "alerts": alerts,
+            "triggered": conditions,
+            "household_reading_id": hh_reading_id,
+        }
+        for reading_id, alerts, conditions, hh_reading_id in zip(reading_ids, notified, triggered, hh_reading_ids)
+    ]
+
+
+async def ingest_batch_async(db: AsyncSession, payloads: Sequence[IngestPayload], commit: bool = True) -> List[Dict[str, Any]]:
+    """`ingest_batch` on an AsyncSession."""
+    return await db.run_sync(ingest_batch, payloads, commit)
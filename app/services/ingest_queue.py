@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+from ..crud import crud_households as hh_crud
+from ..database import AsyncSessionLocal
+from ..schemas.alerts import IngestPayload
+from .ingest import ingest_batch
+from .metrics import INGEST_DROPPED
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """The queue is at capacity; the client should retry later (429)."""
+
+
+class QueueClosed(Exception):
+    """The writer is not running or is draining for shutdown (503)."""
+
+
+class IngestQueue:
+    """Bounded write-behind queue for `/sensor-ingest`.
+
+    Requests only validate and `submit`; a single background writer drains the
+    queue in micro-batches, flushing when `batch_size` readings are waiting or
+    `max_wait` seconds after the first one arrived, and writes each batch with
+    `ingest_batch` (readings, rollups and alerts in one transaction) on an
+    AsyncSession. A batch the database rejects as bad data is split in halves
+    and retried, so only readings that fail on their own are dropped (and
+    counted); any other failure, such as a lost connection, retries the whole
+    batch with exponential backoff up to `max_retry_delay` seconds. `stop`
+    stops accepting readings and drains what is queued.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 10000,
+        batch_size: int = 500,
+        max_wait: float = 0.2,
+        enabled: bool = False,
+        retry_delay: float = 0.5,
+        max_retry_delay: float = 30.0,
+    ):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.enabled = enabled
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._queue: Optional["asyncio.Queue[Tuple[float, IngestPayload]]"] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._accepting = False
+        self.accepted = 0
+        self.rejected_full = 0
+        self.written = 0
+        self.failed = 0
+        self.dropped_unknown_household = 0
+        self.batches = 0
+        self.split_batches = 0
+        self.retries = 0
+        self.last_batch_size = 0
+        self.last_batch_seconds = 0.0
+        self.last_write_lag_seconds = 0.0
+        self.max_write_lag_seconds = 0.0
+        self._oldest_enqueued: Optional[float] = None
+        # Enqueue times of the readings still in the queue, oldest first
+        self._pending_since: Deque[float] = deque()
+
+    @property
+    def running(self) -> bool:
+        return self._accepting
+
+    async def start(self) -> None:
+        if self._writer is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._pending_since.clear()
+        self._accepting = True
+        self._writer = asyncio.create_task(self._run(), name="ingest-writer")
+
+    async def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop accepting readings and wait for everything queued to be written."""
+        if self._writer is None:
+            return
+        self._accepting = False
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.error("Ingest queue drain timed out with %d readings unwritten", self._queue.qsize())
+        self._writer.cancel()
+        try:
+            await self._writer
+        except asyncio.CancelledError:
+            pass
+        self._writer = None
+
+    def submit(self, payload: IngestPayload) -> int:
+        """Enqueue a validated reading; returns the queue depth after enqueueing.
+
+        Must be called from the event loop thread.
+        """
+        if not self._accepting:
+            raise QueueClosed("ingest queue is not accepting readings")
+        enqueued_at = time.monotonic()
+        try:
+            self._queue.put_nowait((enqueued_at, payload))
+        except asyncio.QueueFull:
+            self.rejected_full += 1
+            raise QueueFull("ingest queue is full") from None
+        self._pending_since.append(enqueued_at)
+        self.accepted += 1
+        return self._queue.qsize()
+
+    async def _next_batch(self) -> List[Tuple[float, IngestPayload]]:
+        first = await self._queue.get()
+        self._pending_since.popleft()
+        self._oldest_enqueued = first[0]
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+            self._pending_since.popleft()
+        # Top up from anything already waiting without extending the deadline
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+            self._pending_since.popleft()
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            started = time.monotonic()
+            try:
+                await self._write_batch([p for _, p in batch])
+            finally:
+                done = time.monotonic()
+                lag = done - batch[0][0]
+                self.batches += 1
+                self.last_batch_size = len(batch)
+                self.last_batch_seconds = done - started
+                self.last_write_lag_seconds = lag
+                self.max_write_lag_seconds = max(self.max_write_lag_seconds, lag)
+                self._oldest_enqueued = None
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write_batch(self, payloads: List[IngestPayload]) -> None:
+        """Write ``payloads`` in one transaction, retrying until they are stored or rejected.
+
+        Clients already got 202 for these readings. If the database rejects
+        the data, each half is retried on its own so one bad row does not take
+        the rest of the batch down with it. Anything else (the database is
+        down, the connection was invalidated) says nothing about the rows, so
+        the whole batch waits and is retried; meanwhile the queue fills up and
+        `/sensor-ingest` answers 429.
+        """
+        attempt = 0
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    written, unknown = await db.run_sync(self._write, payloads)
+                break
+            except (IntegrityError, DataError):
+                if len(payloads) == 1:
+                    logger.exception("Dropped queued reading that could not be written: %r", payloads[0])
+                    self.failed += 1
+                    INGEST_DROPPED.inc("write_error")
+                    return
+                logger.warning("Ingest batch of %d readings was rejected; retrying it in halves", len(payloads), exc_info=True)
+                self.split_batches += 1
+                middle = len(payloads) // 2
+                await self._write_batch(payloads[:middle])
+                await self._write_batch(payloads[middle:])
+                return
+            except Exception:
+                delay = min(self.retry_delay * 2 ** attempt, self.max_retry_delay)
+                attempt += 1
+                self.retries += 1
+                logger.warning(
+                    "Ingest batch of %d readings failed (attempt %d); retrying in %.1fs", len(payloads), attempt, delay,
+                    exc_info=True,
+                )
+                await asyncio.sleep(delay)
+        self.written += written
+        if unknown:
+            self.dropped_unknown_household += unknown
+            INGEST_DROPPED.inc("unknown_household", amount=unknown)
+
+    @staticmethod
+    def _write(db: Session, payloads: List[IngestPayload]) -> Tuple[int, int]:
+        # Readings for households that do not exist would fail the whole
+        # batch on the foreign key; the synchronous endpoints 404 them instead.
+        household_ids = {p.household_id for p in payloads if p.household_id is not None}
+        if household_ids:
+            known = hh_crud.get_existing_household_ids(db, household_ids)
+            kept = [p for p in payloads if p.household_id is None or p.household_id in known]
+        else:
+            kept = payloads
+        if kept:
+            ingest_batch(db, kept)
+        return len(kept), len(payloads) - len(kept)
+
+    def stats(self) -> Dict[str, Any]:
+        depth = self._queue.qsize() if self._queue is not None else 0
+        pending = self._pending_since
+        oldest = self._oldest_enqueued if self._oldest_enqueued is not None else (pending[0] if pending else None)
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "depth": depth,
+            "maxsize": self.maxsize,
+            "batch_size": self.batch_size,
+            "max_wait_seconds": self.max_wait,
+            "accepted": self.accepted,
+            "rejected_full": self.rejected_full,
+            "written": self.written,
+            "failed": self.failed,
+            "dropped_unknown_household": self.dropped_unknown_household,
+            "batches": self.batches,
+            "split_batches": self.split_batches,
+            "retries": self.retries,
+            "last_batch_size": self.last_batch_size,
+            "last_batch_seconds": round(self.last_batch_seconds, 6),
+            "oldest_pending_seconds": round(time.monotonic() - oldest, 6) if oldest is not None else 0.0,
+            "last_write_lag_seconds": round(self.last_write_lag_seconds, 6),
+            "max_write_lag_seconds": round(self.max_write_lag_seconds, 6),
+        }
+
+
+ingest_queue = IngestQueue(
+    maxsize=int(os.getenv("INGEST_QUEUE_MAXSIZE", "10000")),
+    batch_size=int(os.getenv("INGEST_BATCH_SIZE", "500")),
+    max_wait=int(os.getenv("INGEST_BATCH_MAX_WAIT_MS", "200")) / 1000.0,
+    enabled=os.getenv("INGEST_MODE", "sync").lower() == "queue",
+)
@@ -0,0 +1,92 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .. import models
+
+
+class LocationCache:
+    """Bounded, thread-safe LRU map of zipcode -> locations.id.
+
+    Only committed locations are cached: ids created inside a transaction are
+    parked on the session (see `stage`) and published after that session commits.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, zipcode: str) -> Optional[int]:
+        with self._lock:
+            location_id = self._entries.get(zipcode)
+            if location_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(zipcode)
+            self.hits += 1
+            return location_id
+
+    def put(self, zipcode: str, location_id: int) -> None:
+        with self._lock:
+            self._entries[zipcode] = location_id
+            self._entries.move_to_end(zipcode)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, zipcode: Optional[str] = None) -> None:
+        """Drop one zipcode, or everything when no zipcode is given."""
+        with self._lock:
+            if zipcode is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(zipcode, None)
+
+    def stage(self, db: Session, ids: Dict[str, int]) -> None:
+        """Remember ids resolved in `db`'s transaction; published on commit."""
+        db.info.setdefault("staged_location_ids", {}).update(ids)
+
+    def staged(self, db: Session) -> Dict[str, int]:
+        return db.info.get("staged_location_ids", {})
+
+    def warm(self, db: Session) -> int:
+        """Preload up to `maxsize` locations; returns the number cached."""
+        rows = db.query(models.Location.zipcode, models.Location.id).limit(self.maxsize).all()
+        for zipcode, location_id in rows:
+            self.put(zipcode, location_id)
+        return len(rows)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+location_cache = LocationCache(maxsize=int(os.getenv("LOCATION_CACHE_SIZE", "4096")))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_staged_locations(session: Session) -> None:
+    staged = session.info.pop("staged_location_ids", None)
+    if staged:
+        for zipcode, location_id in staged.items():
+            location_cache.put(zipcode, location_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_staged_locations(session: Session) -> None:
+    session.info.pop("staged_location_ids", None)
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_changed_locations(session: Session, flush_context) -> None:
+    # dirty/deleted still hold the pre-flush state here
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.Location):
+            location_cache.invalidate()
+            return
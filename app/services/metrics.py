@@ -0,0 +1,289 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+A small registry of counters and histograms with labels, plus callback
+metrics read at scrape time (cache and queue statistics that the services
+already keep). Recording is a dict update under a lock, so the request
+middleware and the SQLAlchemy event hooks stay cheap; `/metrics` renders
+everything on demand and needs no client library or external service.
+
+Per-route database timings work through a context variable: the middleware
+stores the request's ASGI scope in it, and the cursor hooks read the route
+FastAPI matched from that scope. AsyncSession greenlets and the threadpool
+inherit the context; work outside a request is labelled ``background``.
+"""
+import bisect
+import contextvars
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Type
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import Pool
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Labels, float] = {} if self.labelnames else {(): 0.0}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}" for labels, v in items
+        ]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Labels, List[float]] = {}  # per-bucket counts..., +Inf count, sum
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return int(sum(series[:-1])) if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        lines = self._header()
+        for labels, series in items:
+            cumulative = 0.0
+            for bound, n in zip((*self.buckets, math.inf), series[:-1]):
+                cumulative += n
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {_format_value(cumulative)}")
+        return lines
+
+
+class Callback(_Metric):
+    """Values read from a function at scrape time: ``fn() -> [(label values, value), ...]``."""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        fn: Callable[[], Iterable[Tuple[Labels, Optional[float]]]],
+        labelnames: Sequence[str] = (),
+        type: str = "gauge",
+    ):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+        self.type = type
+
+    def render(self) -> List[str]:
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}"
+            for labels, v in self.fn()
+            if v is not None
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name: str, help: str, fn, labelnames: Sequence[str] = (), type: str = "gauge") -> Callback:
+        return self.register(Callback(name, help, fn, labelnames, type))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.counter("http_requests_total", "HTTP requests by route, method and status.", ("method", "route", "status"))
+HTTP_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route, method and status.", ("method", "route", "status")
+)
+DB_QUERIES = registry.counter("db_queries_total", "SQL statements executed, by route.", ("route",))
+DB_QUERY_LATENCY = registry.histogram("db_query_duration_seconds", "SQL statement duration by route.", ("route",), DB_BUCKETS)
+DB_POOL_WAIT = registry.histogram(
+    "db_pool_checkout_seconds", "Time to check a connection out of the pool (includes opening new ones).", ("engine",), DB_BUCKETS
+)
+INGEST_READINGS = registry.counter("ingest_readings_total", "Sensor readings committed by ingest.")
+INGEST_DROPPED = registry.counter(
+    "ingest_readings_dropped_total", "Queued readings the ingest writer did not store, by reason.", ("reason",)
+)
+ALERTS_CREATED = registry.counter("alerts_created_total", "Alerts written, by metric and scope (location or household).", ("metric", "scope"))
+
+# Scope of the request being served, for the cursor hooks
+_current_scope: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("metrics_scope", default=None)
+
+UNMATCHED = "unmatched"
+BACKGROUND = "background"
+
+
+def route_label(scope: Optional[dict]) -> str:
+    """Route template FastAPI matched (e.g. /api/v1/households/{household_id}); bounded cardinality."""
+    if scope is None:
+        return BACKGROUND
+    route = scope.get("route")
+    return getattr(route, "path_format", None) or UNMATCHED
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts and latency per route and status."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        token = _current_scope.set(scope)
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current_scope.reset(token)
+            labels = (scope["method"], route_label(scope), str(status))
+            HTTP_REQUESTS.inc(*labels)
+            HTTP_LATENCY.observe(elapsed, *labels)
+
+
+def timed_pool_class(url: str, name: str) -> Type[Pool]:
+    """The pool class ``url``'s dialect would use, with checkouts timed into ``db_pool_checkout_seconds``.
+
+    Pass it as ``poolclass`` when creating the engine. Pool events only fire
+    once a connection is out, so the public `Pool.connect` is timed instead;
+    `Engine.dispose` recreates the pool from the same class.
+    """
+    url = make_url(url)
+    base = url.get_dialect().get_pool_class(url)
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return base.connect(self)
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start, name)
+
+    return type("Timed" + base.__name__, (base,), {"connect": connect})
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Time the statements of a sync Engine (or an AsyncEngine's sync_engine) per route."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_query_start"].pop()
+        route = route_label(_current_scope.get())
+        DB_QUERIES.inc(route)
+        DB_QUERY_LATENCY.observe(elapsed, route)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("metrics_query_start"):
+            conn.info["metrics_query_start"].pop()
+
+
+def inc_on_commit(db: Session, counter: Counter, *labels: str, amount: float = 1.0) -> None:
+    """Increment ``counter`` once `db`'s transaction commits (dropped on rollback)."""
+    if amount:
+        db.info.setdefault("staged_metrics", []).append((counter, labels, amount))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_staged_metrics(session: Session) -> None:
+    for counter, labels, amount in session.info.pop("staged_metrics", ()):
+        counter.inc(*labels, amount=amount)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_staged_metrics(session: Session) -> None:
+    session.info.pop("staged_metrics", None)
@@ -0,0 +1,79 @@
+from typing import Optional
+
+# NYC zipcodes by their three-digit USPS prefix. Prefix 110 is shared with Nassau
+# County, so only its two Queens zipcodes are listed explicitly.
+ZIP_PREFIX_BOROUGH = {
+    "100": "Manhattan",
+    "101": "Manhattan",
+    "102": "Manhattan",
+    "103": "Staten Island",
+    "104": "Bronx",
+    "111": "Queens",
+    "112": "Brooklyn",
+    "113": "Queens",
+    "114": "Queens",
+    "116": "Queens",
+}
+
+ZIP_BOROUGH_OVERRIDES = {
+    "11004": "Queens",
+    "11005": "Queens",
+}
+
+BOROUGHS = ("Manhattan", "Bronx", "Brooklyn", "Queens", "Staten Island")
+
+
+def borough_for_zip(zipcode: Optional[str]) -> str:
+    """Return the NYC borough for a zipcode, or "" if it is not a NYC zipcode."""
+    if not zipcode:
+        return ""
+    zipcode = zipcode.strip()[:5]
+    return ZIP_BOROUGH_OVERRIDES.get(zipcode) or ZIP_PREFIX_BOROUGH.get(zipcode[:3], "")
+
+
+# NYC DOHMH United Hospital Fund neighborhoods (UHF42) and their zipcodes, the
+# finest geography the NYC open-data health and air quality indicators use.
+UHF42_ZIPCODES = {
+    "101": ("10463", "10471"),
+    "102": ("10466", "10469", "10470", "10475"),
+    "103": ("10458", "10467", "10468"),
+    "104": ("10461", "10462", "10464", "10465", "10472", "10473"),
+    "105": ("10453", "10457", "10460"),
+    "106": ("10451", "10452", "10456"),
+    "107": ("10454", "10455", "10459", "10474"),
+    "201": ("11211", "11222"),
+    "202": ("11201", "11205", "11215", "11217", "11231"),
+    "203": ("11212", "11213", "11216", "11233", "11238"),
+    "204": ("11207", "11208"),
+    "205": ("11220", "11232"),
+    "206": ("11204", "11218", "11219", "11230"),
+    "207": ("11203", "11210", "11225", "11226"),
+    "208": ("11234", "11236", "11239"),
+    "209": ("11209", "11214", "11228"),
+    "210": ("11223", "11224", "11229", "11235"),
+    "211": ("11206", "11221", "11237"),
+    "301": ("10031", "10032", "10033", "10034", "10040"),
+    "302": ("10026", "10027", "10030", "10037", "10039"),
+    "303": ("10029", "10035"),
+    "304": ("10023", "10024", "10025"),
+    "305": ("10021", "10028", "10044", "10065", "10075", "10128", "10162"),
+    "306": ("10001", "10011", "10018", "10019", "10020", "10036"),
+    "307": ("10010", "10016", "10017", "10022"),
+    "308": ("10012", "10013", "10014"),
+    "309": ("10002", "10003", "10009"),
+    "310": ("10004", "10005", "10006", "10007", "10038", "10280"),
+    "401": ("11101", "11102", "11103", "11104", "11105", "11106"),
+    "402": ("11368", "11369", "11370", "11372", "11373", "11377", "11378"),
+    "403": ("11354", "11355", "11356", "11357", "11358", "11359", "11360"),
+    "404": ("11361", "11362", "11363", "11364"),
+    "405": ("11374", "11375", "11379", "11385"),
+    "406": ("11365", "11366", "11367"),
+    "407": ("11414", "11415", "11416", "11417", "11418", "11419", "11420", "11421"),
+    "408": ("11412", "11423", "11432", "11433", "11434", "11435", "11436"),
+    "409": ("11004", "11005", "11411", "11413", "11422", "11426", "11427", "11428", "11429"),
+    "410": ("11691", "11692", "11693", "11694", "11695", "11697"),
+    "501": ("10302", "10303", "10310"),
+    "502": ("10301", "10304", "10305"),
+    "503": ("10314",),
+    "504": ("10306", "10307", "10308", "10309", "10312"),
+}
@@ -0,0 +1,179 @@
+"""Bulk loader for the NYC Environment & Health Data Portal air quality extract.
+
+`Air_Quality_20250927.csv` (and its geocoded copy `air_quality_with_latlon.csv`)
+has one row per indicator, geography and time period. Rows for UHF42
+neighborhoods are expanded onto each neighborhood's zipcodes and written as
+`Overlay` rows; the adult asthma ED visit rate also fills `PublicHealthData`.
+Coarser geographies (UHF34, community district, borough, citywide) are counted
+and skipped: every indicator in the extract is also published at UHF42.
+
+The CSV is parsed in pandas chunks and each chunk is written with one
+executemany INSERT. Overlays from an earlier load of the same source are
+deleted first and the whole load commits once, so re-running it replaces the
+previous load atomically.
+"""
+import math
+import os
+from typing import Any, Dict, Iterable, List, Sequence, Tuple, Union
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from ..crud import crud_alerts, crud_sensor_reading
+from .nyc_geo import UHF42_ZIPCODES, borough_for_zip
+
+SOURCE = "nyc_air_quality"
+CHUNK_ROWS = int(os.getenv("OPEN_DATA_CHUNK_ROWS", "5000"))
+
+# Indicator ID -> overlay type
+INDICATOR_TYPES = {
+    365: "pm25",
+    375: "no2",
+    386: "o3",
+    639: "pm25_deaths",
+    640: "boiler_so2_emissions",
+    641: "boiler_pm25_emissions",
+    642: "boiler_nox_emissions",
+    643: "vmt",
+    644: "vmt_cars",
+    645: "vmt_trucks",
+    646: "benzene",
+    647: "formaldehyde",
+    648: "asthma_ed_pm25_children",
+    650: "respiratory_hosp_pm25",
+    651: "cardiovascular_hosp_pm25",
+    652: "cardiorespiratory_deaths_o3",
+    653: "asthma_ed_o3_children",
+    655: "asthma_hosp_o3_children",
+    657: "asthma_ed_pm25_adults",
+    659: "asthma_ed_o3_adults",
+    661: "asthma_hosp_o3_adults",
+}
+
+# PublicHealthData.asthma_rate is per 10,000 people; the portal publishes per 100,000
+ASTHMA_RATE_INDICATOR = 657
+ASTHMA_RATE_SCALE = 0.1
+
+COLUMNS = {
+    "Unique ID": "unique_id",
+    "Indicator ID": "indicator_id",
+    "Name": "indicator",
+    "Measure": "measure",
+    "Measure Info": "unit",
+    "Geo Type Name": "geo_type",
+    "Geo Join ID": "geo_join_id",
+    "Geo Place Name": "geo_place_name",
+    "Time Period": "time_period",
+    "Start_Date": "start_date",
+    "Data Value": "value",
+    "lat": "lat",
+    "lon": "lon",
+}
+META_COLUMNS = ("unique_id", "indicator", "measure", "unit", "time_period", "geo_type", "geo_join_id", "geo_place_name")
+
+
+def period_years(df: pd.DataFrame) -> pd.Series:
+    """First year of each row's time period ("Winter 2014-15" -> 2014, "2017-2019" -> 2017).
+
+    Start_Date is not used directly: annual averages start on Dec 31 of the
+    previous year. It is the fallback for periods without a four-digit year.
+    """
+    years = pd.to_numeric(df["time_period"].str.extract(r"(\d{4})", expand=False), errors="coerce")
+    # Start_Date is MM/DD/YYYY in the portal extract and M/D/YY in the geocoded copy
+    start = df["start_date"].str.rsplit("/", n=1).str[-1].astype(int)
+    start = start.where(start >= 100, start + 2000)
+    return years.fillna(start).astype(int)
+
+
+def _clean(value: Any) -> Any:
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+def _prepare(chunk: pd.DataFrame, seen: set, stats: Dict[str, int]) -> pd.DataFrame:
+    """UHF42 rows of a chunk not seen before, one row per zipcode."""
+    df = chunk.rename(columns=COLUMNS)
+    stats["rows_read"] += len(df)
+
+    uhf42 = df["geo_type"] == "UHF42"
+    stats["skipped_geography"] += int((~uhf42).sum())
+    df = df[uhf42 & df["value"].notna()]
+
+    fresh = ~df["unique_id"].isin(seen) & ~df["unique_id"].duplicated()
+    stats["duplicates"] += int((~fresh).sum())
+    df = df[fresh].copy()
+    seen.update(df["unique_id"].tolist())
+
+    df["geo_join_id"] = df["geo_join_id"].str.strip()
+    df["zipcode"] = df["geo_join_id"].map(UHF42_ZIPCODES)
+    stats["unmapped"] += int(df["zipcode"].isna().sum())
+    df = df.dropna(subset=["zipcode"]).explode("zipcode")
+    df["year"] = period_years(df)
+    return df
+
+
+def _overlay_rows(df: pd.DataFrame, location_ids: Dict[str, int]) -> List[Dict[str, Any]]:
+    meta_columns = [c for c in (*META_COLUMNS, "lat", "lon") if c in df.columns]
+    metas = df[meta_columns].to_dict("records")
+    types = df["indicator_id"].map(lambda i: INDICATOR_TYPES.get(i, f"indicator_{i}"))
+    return [
+        {
+            "location_id": location_ids[zipcode],
+            "type": type_,
+            "year": int(year),
+            "value": float(value),
+            "meta": {k: _clean(v) for k, v in meta.items()},
+            "source": SOURCE,
+        }
+        for zipcode, type_, year, value, meta in zip(df["zipcode"], types, df["year"], df["value"], metas)
+    ]
+
+
+def load_air_quality(
+    db: Session,
+    paths: Union[str, Sequence[str]],
+    *,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Dict[str, int]:
+    """Replace the overlays and asthma rates loaded from the air quality CSV(s) and commit.
+
+    When several files are given (e.g. the extract and its geocoded copy), a
+    Unique ID already loaded from an earlier file is skipped. Returns counts of
+    rows read, written and skipped.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    stats = {"rows_read": 0, "overlays": 0, "public_health": 0, "skipped_geography": 0, "duplicates": 0, "unmapped": 0}
+    seen: set = set()
+    asthma: Dict[Tuple[int, int], float] = {}
+    try:
+        crud_alerts.delete_overlays_from_source(db, SOURCE)
+        for path in paths:
+            chunks: Iterable[pd.DataFrame] = pd.read_csv(
+                path,
+                chunksize=chunk_rows,
+                usecols=lambda c: c in COLUMNS,
+                dtype={"Geo Join ID": str, "Start_Date": str},
+            )
+            for chunk in chunks:
+                df = _prepare(chunk, seen, stats)
+                if df.empty:
+                    continue
+                zipcodes = df["zipcode"].unique().tolist()
+                location_ids = crud_sensor_reading.resolve_location_ids(db, {z: borough_for_zip(z) for z in zipcodes})
+                stats["overlays"] += crud_alerts.insert_overlays(db, _overlay_rows(df, location_ids))
+
+                rates = df[df["indicator_id"] == ASTHMA_RATE_INDICATOR]
+                for zipcode, year, value in zip(rates["zipcode"], rates["year"], rates["value"]):
+                    asthma[(location_ids[zipcode], int(year))] = float(value) * ASTHMA_RATE_SCALE
+
+        stats["public_health"] = crud_sensor_reading.replace_public_health_data(db, [
+            {"location_id": location_id, "year": year, "asthma_rate": round(rate, 2)}
+            for (location_id, year), rate in asthma.items()
+        ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return stats
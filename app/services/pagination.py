@@ -0,0 +1,79 @@
+"""Opaque keyset cursors for list endpoints.
+
+A cursor encodes the sort key of the last row on a page, e.g.
+``(timestamp, id)``; the next page is the rows strictly after that key in the
+listing's order, so every page costs one index range scan however deep the
+client has paged. Cursors are URL-safe base64 of a JSON array and carry no
+meaning for clients.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Sequence, Tuple, TypeVar
+
+from fastapi import HTTPException, Query, Request, Response
+from sqlalchemy import and_, or_
+
+T = TypeVar("T")
+
+
+def encode_cursor(key: Sequence[Any]) -> str:
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in key]
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str, types: Sequence[Callable[[Any], Any]]) -> Tuple[Any, ...]:
+    """Decode a cursor into a key, converting each value with ``types``; ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError("wrong key length")
+        return tuple(convert(v) for convert, v in zip(types, values))
+    except (ValueError, TypeError) as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+
+
+def cursor_param(*types: Callable[[Any], Any]):
+    """FastAPI dependency decoding the ``cursor`` query parameter (400 if malformed)."""
+
+    def dependency(cursor: Optional[str] = Query(None, description="Opaque cursor from the previous page")):
+        if cursor is None:
+            return None
+        try:
+            return decode_cursor(cursor, types)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return dependency
+
+
+def after_key(columns: Sequence[Any], key: Sequence[Any], descending: bool = False):
+    """WHERE clause selecting rows strictly after ``key`` in ``ORDER BY columns``.
+
+    Written as ``a > x OR (a = x AND b > y)`` rather than a row-value
+    comparison so every backend can use the matching composite index.
+    """
+    clauses = []
+    for i, (col, value) in enumerate(zip(columns, key)):
+        step = col < value if descending else col > value
+        clauses.append(and_(*(c == v for c, v in zip(columns[:i], key[:i])), step))
+    return or_(*clauses)
+
+
+def split_page(rows: List[T], limit: int, key: Callable[[T], Sequence[Any]]) -> Tuple[List[T], Optional[str]]:
+    """Trim rows fetched with ``limit + 1`` to a page and the cursor for the next one."""
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(key(page[-1]))
+
+
+def set_next_page(request: Request, response: Response, next_cursor: Optional[str]) -> None:
+    """Advertise the next page via ``X-Next-Cursor`` and an RFC 8288 ``Link`` header."""
+    if next_cursor is None:
+        return
+    response.headers["X-Next-Cursor"] = next_cursor
+    url = request.url.include_query_params(cursor=next_cursor)
+    response.headers["Link"] = f'<{url}>; rel="next"'
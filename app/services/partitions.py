@@ -0,0 +1,258 @@
+"""Monthly time partitions of the raw readings and alerts tables, and retention.
+
+On Postgres, revision 20261018_01 turns sensor_readings,
+household_sensor_readings, alerts and household_alerts into tables
+range-partitioned by month on their time column. Partitions are named
+``<table>_pYYYY_MM``, and ``<table>_default`` holds rows outside every month.
+`ensure_partitions` creates the coming months ahead of time; it runs at
+startup and in the retention job. `apply_retention` detaches expired months,
+then drops them or keeps them as standalone tables. That is a catalog
+change, however many rows the month holds.
+
+SQLite has no partitioning and none is emulated: the tables stay whole, so
+retention there costs a range DELETE per expired month (plus a copy into a
+``<table>_pYYYY_MM`` archive table in ``detach`` mode), not O(1).
+
+Postgres prunes partitions from range predicates on the partition key.
+`time_window` builds that predicate, and the windowed reading and alert
+queries in app/crud use it.
+"""
+import logging
+import os
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, bindparam, delete, func, select, text, true, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from .. import models  # noqa: F401  (registers the tables on Base.metadata)
+from ..database import Base
+
+logger = logging.getLogger(__name__)
+
+# Table -> time column retention retires it by, in retention order: alerts
+# point at readings, so they are retired first
+RETENTION_TABLES: Dict[str, str] = {
+    "alerts": "created_at",
+    "household_alerts": "timestamp",
+    "sensor_readings": "timestamp",
+    "sensor_readings_compacted": "bucket_start",
+    "household_sensor_readings": "timestamp",
+}
+# Tables revision 20261018_01 partitions by month on their retention column;
+# sensor_readings_compacted is small enough to stay whole
+PARTITIONED_TABLES = frozenset({"sensor_readings", "household_sensor_readings", "alerts", "household_alerts"})
+# Readings table -> (alerts table, column pointing at it, key it points at).
+# A back-dated reading can be older than the alerts that reference it.
+READING_REFERENCES = {
+    "sensor_readings": ("alerts", "reading_id", "id"),
+    "household_sensor_readings": ("household_alerts", "reading_id", "reading_id"),
+}
+
+RETENTION_MONTHS = int(os.getenv("RETENTION_MONTHS", "13"))
+PARTITION_PREMAKE_MONTHS = int(os.getenv("PARTITION_PREMAKE_MONTHS", "3"))
+RETENTION_MODES = ("drop", "detach")
+
+
+def month_start(ts: datetime) -> datetime:
+    return ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, n: int) -> datetime:
+    years, month_index = divmod(month.month - 1 + n, 12)
+    return month.replace(year=month.year + years, month=month_index + 1)
+
+
+def months_between(since: datetime, until: datetime) -> List[datetime]:
+    """Starts of the months overlapping [since, until)."""
+    months, month = [], month_start(since)
+    while month < until:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def partition_month(table: str, name: str) -> Optional[datetime]:
+    match = re.fullmatch(re.escape(table) + r"_p(\d{4})_(\d{2})", name)
+    return datetime(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def time_window(column, since: Optional[datetime] = None, until: Optional[datetime] = None, *, inclusive_until: bool = False):
+    """``since <= column < until`` (either bound optional), the form Postgres prunes partitions on.
+
+    Every windowed query on the partitioned tables builds its range with this,
+    so each reads only the months the window covers.
+    """
+    conditions = []
+    if since is not None:
+        conditions.append(column >= since)
+    if until is not None:
+        conditions.append(column <= until if inclusive_until else column < until)
+    return and_(*conditions) if conditions else true()
+
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def is_partitioned(db: Session, table: str) -> bool:
+    if not _is_postgres(db):
+        return False
+    return bool(db.scalar(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table AND pg_table_is_visible(c.oid))"
+    ), {"table": table}))
+
+
+def list_partitions(db: Session, table: str) -> Dict[datetime, str]:
+    """Month -> partition (Postgres) or per-month archive table (SQLite) of ``table``."""
+    if _is_postgres(db):
+        names = db.scalars(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :table AND pg_table_is_visible(p.oid)"
+        ), {"table": table}).all()
+    else:
+        names = db.scalars(text("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE :pattern"),
+                           {"pattern": f"{table}_p%"}).all()
+    months = {partition_month(table, name): name for name in names}
+    months.pop(None, None)
+    return dict(sorted(months.items()))
+
+
+def _bound(month: datetime) -> str:
+    # Explicit UTC offset so timestamptz bounds do not depend on the session time zone
+    return f"'{month:%Y-%m-%d} 00:00:00+00'"
+
+
+def create_partition_sql(table: str, month: datetime) -> str:
+    return (f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+            f"FOR VALUES FROM ({_bound(month)}) TO ({_bound(add_months(month, 1))})")
+
+
+def ensure_partitions(db: Session, now: Optional[datetime] = None, ahead: int = PARTITION_PREMAKE_MONTHS) -> List[str]:
+    """Create this month's and the next ``ahead`` months' partitions of every partitioned table; returns those created.
+
+    Creating partitions ahead keeps new rows out of the default partition, which
+    would otherwise block creating their month's partition later.
+    """
+    if not _is_postgres(db):
+        return []
+    this_month = month_start(now or datetime.utcnow())
+    created = []
+    for table in sorted(PARTITIONED_TABLES):
+        if not is_partitioned(db, table):
+            continue
+        existing = list_partitions(db, table)
+        for month in (add_months(this_month, i) for i in range(ahead + 1)):
+            if month in existing:
+                continue
+            try:
+                with db.begin_nested():
+                    db.execute(text(create_partition_sql(table, month)))
+                created.append(partition_name(table, month))
+            except SQLAlchemyError:
+                logger.warning("Could not create partition %s (rows for that month in %s_default?)",
+                               partition_name(table, month), table, exc_info=True)
+    db.commit()
+    return created
+
+
+def _expired_months(db: Session, table: str, cutoff: datetime, partitioned: bool) -> List[datetime]:
+    if partitioned:
+        return [month for month in list_partitions(db, table) if add_months(month, 1) <= cutoff]
+    column = Base.metadata.tables[table].c[RETENTION_TABLES[table]]
+    oldest = db.scalar(select(func.min(column)).where(column < cutoff))
+    return months_between(oldest, cutoff) if oldest is not None else []
+
+
+def apply_retention(
+    db: Session,
+    keep_months: int = RETENTION_MONTHS,
+    *,
+    now: Optional[datetime] = None,
+    mode: str = "drop",
+    archive_dir: Optional[str] = None,
+    dry_run: bool = False,
+) -> List[Dict[str, Any]]:
+    """Retire the months of readings and alerts older than the last ``keep_months`` full months.
+
+    ``mode`` is ``drop`` (discard the month) or ``detach`` (keep it as a
+    standalone ``<table>_pYYYY_MM`` table outside the live table). With
+    ``archive_dir`` each month is first written there as Parquet, for the
+    tables that have a columnar export. Alerts that outlive a retired reading
+    keep their values but lose ``reading_id``, as in compaction. Each month is
+    committed on its own. Returns one action per month.
+    """
+    if mode not in RETENTION_MODES:
+        raise ValueError(f"mode must be one of {RETENTION_MODES}")
+    cutoff = add_months(month_start(now or datetime.utcnow()), -keep_months)
+    actions: List[Dict[str, Any]] = []
+    for table in RETENTION_TABLES:
+        if not db.get_bind().dialect.has_table(db.connection(), table):
+            continue
+        partitioned = table in PARTITIONED_TABLES and is_partitioned(db, table)
+        column = Base.metadata.tables[table].c[RETENTION_TABLES[table]]
+        for month in _expired_months(db, table, cutoff, partitioned):
+            name, end = partition_name(table, month), add_months(month, 1)
+            action: Dict[str, Any] = {"table": table, "partition": name, "month": f"{month:%Y-%m}", "action": mode}
+            if not partitioned:
+                action["rows"] = db.scalar(select(func.count()).where(time_window(column, month, end)))
+                if not action["rows"]:
+                    continue
+            actions.append(action)
+            if dry_run:
+                continue
+            if archive_dir:
+                action["archived_rows"] = _archive(db, table, archive_dir, month, end)
+            _unlink_alerts(db, table, month, end)
+            if partitioned:
+                db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                if mode == "drop":
+                    db.execute(text(f"DROP TABLE {name}"))
+            else:
+                if mode == "detach":
+                    _copy_month(db, table, name, month, end)
+                db.execute(delete(column.table).where(time_window(column, month, end)))
+            db.commit()
+            logger.info("Retention: %s %s (%s)", mode, name, table)
+        if partitioned and not dry_run:
+            # Stray old rows that landed in the default partition
+            stmt = text(f'DELETE FROM {table}_default WHERE "{column.name}" < :cutoff')
+            default = db.execute(stmt.bindparams(bindparam("cutoff", cutoff, type_=column.type)))
+            if default.rowcount:
+                actions.append({"table": table, "partition": f"{table}_default", "action": "delete", "rows": default.rowcount})
+            db.commit()
+    return actions
+
+
+def _unlink_alerts(db: Session, table: str, month: datetime, end: datetime) -> None:
+    """Clear the reading id of alerts that point at ``table``'s rows in [month, end)."""
+    if table not in READING_REFERENCES:
+        return
+    alerts_table, column, key = READING_REFERENCES[table]
+    readings, alerts = Base.metadata.tables[table], Base.metadata.tables[alerts_table]
+    ids = select(readings.c[key]).where(time_window(readings.c[RETENTION_TABLES[table]], month, end))
+    db.execute(update(alerts).where(alerts.c[column].in_(ids)).values({column: None}))
+
+
+def _copy_month(db: Session, table: str, name: str, month: datetime, end: datetime) -> None:
+    column = Base.metadata.tables[table].c[RETENTION_TABLES[table]]
+    where = f'WHERE "{column.name}" >= :lo AND "{column.name}" < :hi'
+    verb = f"INSERT INTO {name}" if db.get_bind().dialect.has_table(db.connection(), name) else f"CREATE TABLE {name} AS"
+    stmt = text(f"{verb} SELECT * FROM {table} {where}").bindparams(
+        bindparam("lo", month, type_=column.type), bindparam("hi", end, type_=column.type))
+    db.execute(stmt)
+
+
+def _archive(db: Session, table: str, archive_dir: str, month: datetime, end: datetime) -> Optional[int]:
+    from .columnar import DATASETS, write_parquet
+
+    if table not in DATASETS:
+        return None
+    return write_parquet(db, archive_dir, [table], start_time=month, end_time=end)[table]
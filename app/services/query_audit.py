@@ -0,0 +1,136 @@
+"""Per-request SQL statement counting and N+1 detection.
+
+A `before_cursor_execute` hook counts every statement under the shape it
+was compiled to (the SQL text with placeholders, so a lazy load repeated
+for each row always has the same shape). The batches SQLAlchemy splits one
+``insertmanyvalues`` INSERT into count as a single statement. `QueryAuditMiddleware` gives each
+request its own log and, when the request is done, logs a warning and
+counts ``db_query_budget_exceeded_total`` if it ran more than
+`QUERY_BUDGET` statements or one shape more than `QUERY_REPEAT_LIMIT`
+times.
+
+`capture_queries()` collects statements from every thread while it is
+open; tests use it (through the ``assert_max_queries`` fixture) to pin
+statement budgets for endpoints served by the TestClient's portal thread.
+"""
+import contextvars
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.interfaces import ExecuteStyle
+
+from .metrics import registry, route_label
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "25"))
+QUERY_REPEAT_LIMIT = int(os.getenv("QUERY_REPEAT_LIMIT", "5"))
+
+QUERIES_PER_REQUEST = registry.histogram(
+    "db_queries_per_request", "SQL statements per request, by route.", ("route",), (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+)
+BUDGET_EXCEEDED = registry.counter(
+    "db_query_budget_exceeded_total", "Requests over the statement budget or repeating a statement (reason: budget|repeat).",
+    ("route", "reason"),
+)
+
+
+class QueryLog:
+    """Statements executed, counted per shape."""
+
+    def __init__(self, keep_statements: bool = False):
+        self.count = 0
+        self.shapes: Dict[str, int] = {}
+        self.statements: Optional[List[str]] = [] if keep_statements else None
+        self._lock = threading.Lock()
+
+    def add(self, statement: str) -> None:
+        with self._lock:
+            self.count += 1
+            self.shapes[statement] = self.shapes.get(statement, 0) + 1
+            if self.statements is not None:
+                self.statements.append(statement)
+
+    def repeated(self, limit: int = QUERY_REPEAT_LIMIT) -> List[Tuple[str, int]]:
+        """Shapes executed more than ``limit`` times, most repeated first."""
+        return sorted(((s, n) for s, n in self.shapes.items() if n > limit), key=lambda item: -item[1])
+
+
+_request_log: contextvars.ContextVar[Optional[QueryLog]] = contextvars.ContextVar("query_log", default=None)
+_captures: List[QueryLog] = []
+_captures_lock = threading.Lock()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Count statements of a sync Engine (or an AsyncEngine's sync_engine)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and context.execute_style is ExecuteStyle.INSERTMANYVALUES:
+            if getattr(context, "_query_audit_counted", False):
+                return
+            context._query_audit_counted = True
+        log = _request_log.get()
+        if log is not None:
+            log.add(statement)
+        if _captures:
+            for capture in tuple(_captures):
+                capture.add(statement)
+
+
+@contextmanager
+def capture_queries() -> Iterator[QueryLog]:
+    """Collect the statements executed on any thread until the block exits."""
+    log = QueryLog(keep_statements=True)
+    with _captures_lock:
+        _captures.append(log)
+    try:
+        yield log
+    finally:
+        with _captures_lock:
+            _captures.remove(log)
+
+
+def describe(log: QueryLog, limit: int = 10) -> str:
+    """The most executed statement shapes, one line each."""
+    lines = []
+    for statement, n in sorted(log.shapes.items(), key=lambda item: -item[1])[:limit]:
+        lines.append(f"  {n} x {' '.join(statement.split())[:200]}")
+    return "\n".join(lines)
+
+
+class QueryAuditMiddleware:
+    """ASGI middleware flagging requests over the statement budget or repeating a statement shape."""
+
+    def __init__(self, app, budget: int = QUERY_BUDGET, repeat_limit: int = QUERY_REPEAT_LIMIT):
+        self.app = app
+        self.budget = budget
+        self.repeat_limit = repeat_limit
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        log = QueryLog()
+        token = _request_log.set(log)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_log.reset(token)
+            route = route_label(scope)
+            QUERIES_PER_REQUEST.observe(log.count, route)
+            repeated = log.repeated(self.repeat_limit)
+            if log.count > self.budget:
+                BUDGET_EXCEEDED.inc(route, "budget")
+            if repeated:
+                BUDGET_EXCEEDED.inc(route, "repeat")
+            if log.count > self.budget or repeated:
+                logger.warning(
+                    "%s %s ran %d statements (budget %d, repeat limit %d); possible N+1:\n%s",
+                    scope["method"], route, log.count, self.budget, self.repeat_limit, describe(log),
+                )
@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, NamedTuple, Optional, Tuple, Union
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+# Seconds a cached answer may be served, per route; RESPONSE_CACHE_TTL_<ROUTE> overrides
+ROUTE_TTLS = {
+    "alerts": 5.0,
+    "readings_stats": 30.0,
+    "zip_trends": 60.0,
+    "recommendations": 30.0,
+    "health_context": 300.0,
+}
+
+CacheKey = Tuple[str, Optional[str], Tuple[Tuple[str, Hashable], ...]]
+
+
+class _Entry(NamedTuple):
+    value: Any
+    expires: float
+
+
+def _normalize(value: Any) -> Hashable:
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(sorted(_normalize(v) for v in value))
+    return value
+
+
+class ResponseCache:
+    """Bounded, thread-safe LRU cache of read-endpoint results with per-route TTLs.
+
+    Entries are keyed on the route, the zipcode the answer is about and the
+    remaining query parameters (normalized, so parameter order and
+    whitespace do not matter). Writes for a zipcode invalidate that
+    zipcode's entries only; answers spanning every zipcode (no zipcode
+    filter) are not invalidated and rely on their TTL.
+
+    Each invalidation bumps an epoch, and a result computed while its
+    zipcode was invalidated is not stored, so a slow read cannot put a
+    pre-write answer back into the cache.
+    """
+
+    def __init__(self, maxsize: int = 2048, ttls: Optional[Dict[str, float]] = None, enabled: bool = True):
+        self.maxsize = maxsize
+        self.ttls = dict(ROUTE_TTLS if ttls is None else ttls)
+        self.enabled = enabled
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        self._by_zipcode: Dict[str, set] = {}
+        self._epoch = 0
+        self._invalidated_at: Dict[str, int] = {}  # zipcode -> epoch of its last invalidation
+        self._cleared_at = 0
+        self._lock = threading.Lock()
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(route: str, zipcode: Optional[str] = None, **params: Any) -> CacheKey:
+        zipcode = zipcode.strip() if zipcode else None
+        return route, zipcode, tuple(sorted((k, _normalize(v)) for k, v in params.items()))
+
+    def get(self, key: CacheKey) -> Tuple[bool, Any]:
+        """(True, value) for a fresh entry, else (False, None)."""
+        route = key[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits[route] = self.hits.get(route, 0) + 1
+                return True, entry.value
+            if entry is not None:
+                self._remove(key)
+            self.misses[route] = self.misses.get(route, 0) + 1
+            return False, None
+
+    def put(self, key: CacheKey, value: Any, epoch: Optional[int] = None) -> None:
+        """Store `value`, unless its zipcode was invalidated after `epoch`."""
+        route, zipcode, _ = key
+        ttl = self.ttls.get(route, 0.0)
+        if ttl <= 0:
+            return
+        with self._lock:
+            if epoch is not None and (
+                self._cleared_at > epoch or (zipcode is not None and self._invalidated_at.get(zipcode, -1) > epoch)
+            ):
+                return
+            self._remove(key)
+            self._entries[key] = _Entry(value, time.monotonic() + ttl)
+            if zipcode is not None:
+                self._by_zipcode.setdefault(zipcode, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: CacheKey) -> None:
+        if self._entries.pop(key, None) is None:
+            return
+        zipcode = key[1]
+        if zipcode is not None:
+            keys = self._by_zipcode.get(zipcode)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_zipcode[zipcode]
+
+    async def get_or_compute(
+        self,
+        route: str,
+        compute: Callable[[], Awaitable[Any]],
+        *,
+        zipcode: Optional[str] = None,
+        **params: Any,
+    ) -> Any:
+        """Cached result for (route, zipcode, params), awaiting `compute()` on a miss."""
+        if not self.enabled:
+            return await compute()
+        key = self.key(route, zipcode, **params)
+        found, value = self.get(key)
+        if found:
+            return value
+        epoch = self._epoch
+        value = await compute()
+        self.put(key, value, epoch)
+        return value
+
+    def invalidate(self, zipcodes: Optional[Iterable[str]] = None) -> None:
+        """Drop the entries for these zipcodes, or everything when none are given."""
+        with self._lock:
+            self._epoch += 1
+            self.invalidations += 1
+            if zipcodes is None:
+                self._entries.clear()
+                self._by_zipcode.clear()
+                self._invalidated_at = {}
+                self._cleared_at = self._epoch
+                return
+            for zipcode in zipcodes:
+                self._invalidated_at[zipcode] = self._epoch
+                for key in list(self._by_zipcode.get(zipcode, ())):
+                    self._remove(key)
+
+    def stage(self, db: Union[Session, AsyncSession], zipcodes: Iterable[str]) -> None:
+        """Invalidate these zipcodes once `db`'s transaction commits (nothing on rollback).
+
+        Call it before the write's commit; an AsyncSession shares ``info``
+        with the Session it wraps.
+        """
+        db.info.setdefault("staged_cache_invalidations", set()).update(zipcodes)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses = sum(self.hits.values()), sum(self.misses.values())
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "routes": {
+                    route: {"ttl_seconds": ttl, "hits": self.hits.get(route, 0), "misses": self.misses.get(route, 0)}
+                    for route, ttl in self.ttls.items()
+                },
+            }
+
+
+response_cache = ResponseCache(
+    maxsize=int(os.getenv("RESPONSE_CACHE_MAXSIZE", "2048")),
+    ttls={route: float(os.getenv(f"RESPONSE_CACHE_TTL_{route.upper()}", ttl)) for route, ttl in ROUTE_TTLS.items()},
+    enabled=os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes"),
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_staged_zipcodes(session: Session) -> None:
+    zipcodes = session.info.pop("staged_cache_invalidations", None)
+    if zipcodes:
+        response_cache.invalidate(zipcodes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_staged_invalidations(session: Session) -> None:
+    session.info.pop("staged_cache_invalidations", None)
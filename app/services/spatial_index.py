@@ -0,0 +1,145 @@
+"""Nearest-neighborhood lookup of outdoor PM2.5/NO2/O3 for coordinates.
+
+`air_quality_with_latlon.csv` geocodes each row of the open-data extract. The
+community districts (59, one centroid each) are the only neighborhood level
+with coordinates for every pollutant row, so they form the index. Each holds
+its latest value per pollutant, preferring annual averages over seasonal
+periods (ozone is only published for summers).
+
+Centroids are projected once to kilometres on a local equirectangular plane,
+which is accurate to well under 1% across the city. A query for any number of
+points is one vectorized distance computation (chunked to bound memory)
+followed by `argpartition`; with a few dozen centroids this beats a tree.
+"""
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CSV_PATH = os.getenv("OUTDOOR_CSV_PATH", "air_quality_with_latlon.csv")
+GEO_TYPE = "CD"
+POLLUTANTS = {365: "pm25", 375: "no2", 386: "o3"}
+QUERY_CHUNK = 4096  # points per distance matrix
+
+# Local equirectangular projection around NYC
+_LAT0 = 40.7
+_KM_PER_DEG_LAT = 110.574
+_KM_PER_DEG_LON = 111.320 * np.cos(np.radians(_LAT0))
+
+
+def project(lat, lon) -> np.ndarray:
+    """(lat, lon) in degrees -> (..., 2) array of km on the local plane."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    return np.stack([lon * _KM_PER_DEG_LON, lat * _KM_PER_DEG_LAT], axis=-1)
+
+
+class OutdoorIndex:
+    """Read-only index of neighborhood centroids and their latest outdoor levels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.close()
+
+    @property
+    def loaded(self) -> bool:
+        return self._xy is not None
+
+    def close(self) -> None:
+        self._xy: Optional[np.ndarray] = None
+        self.geo_ids: List[str] = []
+        self.names: List[str] = []
+        self.lat: Optional[np.ndarray] = None
+        self.lon: Optional[np.ndarray] = None
+        self.values: Optional[np.ndarray] = None       # (n, len(POLLUTANTS)), NaN when missing
+        self.periods: List[List[Optional[str]]] = []
+
+    def load(self, csv_path: str = CSV_PATH) -> bool:
+        """Build the index from the geocoded CSV; False if the file is missing."""
+        if not os.path.exists(csv_path):
+            logger.warning("Geocoded air quality CSV %s not found; outdoor lookups are disabled", csv_path)
+            return False
+        import pandas as pd
+
+        df = pd.read_csv(
+            csv_path,
+            usecols=["Indicator ID", "Geo Type Name", "Geo Join ID", "geo_norm", "Time Period", "Data Value", "lat", "lon"],
+            dtype={"Geo Join ID": str},
+        )
+        df = df[(df["Geo Type Name"] == GEO_TYPE) & df["lat"].notna() & df["lon"].notna()]
+        df = df.assign(geo=df["Geo Join ID"].str.strip())
+
+        # Centroid per neighborhood; the geocoder is not always consistent across rows
+        centroids = df.groupby("geo").agg(name=("geo_norm", "first"), lat=("lat", "median"), lon=("lon", "median"))
+
+        readings = df[df["Indicator ID"].isin(POLLUTANTS) & df["Data Value"].notna()].copy()
+        readings["annual"] = readings["Time Period"].str.startswith("Annual")
+        readings["year"] = pd.to_numeric(readings["Time Period"].str.extract(r"(\d{4})", expand=False), errors="coerce")
+        latest = readings.sort_values(["annual", "year"]).groupby(["geo", "Indicator ID"]).last()
+
+        values = np.full((len(centroids), len(POLLUTANTS)), np.nan)
+        periods: List[List[Optional[str]]] = [[None] * len(POLLUTANTS) for _ in range(len(centroids))]
+        row_of = {geo: i for i, geo in enumerate(centroids.index)}
+        col_of = {indicator: j for j, indicator in enumerate(POLLUTANTS)}
+        for (geo, indicator), rec in latest.iterrows():
+            i, j = row_of[geo], col_of[indicator]
+            values[i, j] = rec["Data Value"]
+            periods[i][j] = rec["Time Period"]
+
+        with self._lock:
+            self.geo_ids = centroids.index.tolist()
+            self.names = centroids["name"].tolist()
+            self.lat = centroids["lat"].to_numpy()
+            self.lon = centroids["lon"].to_numpy()
+            self.values = values
+            self.periods = periods
+            self._xy = project(self.lat, self.lon)
+        return True
+
+    def nearest(self, lats: Sequence[float], lons: Sequence[float], k: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices and distances (km) of the ``k`` nearest neighborhoods to each point, nearest first.
+
+        Both results have shape ``(len(lats), k)``.
+        """
+        if not self.loaded:
+            raise RuntimeError("outdoor index is not loaded")
+        k = max(1, min(k, len(self.geo_ids)))
+        points = project(lats, lons).reshape(-1, 2)
+        indices = np.empty((len(points), k), dtype=np.intp)
+        distances = np.empty((len(points), k))
+        for start in range(0, len(points), QUERY_CHUNK):
+            chunk = points[start:start + QUERY_CHUNK]
+            d2 = ((chunk[:, None, :] - self._xy[None, :, :]) ** 2).sum(axis=-1)
+            part = np.argpartition(d2, k - 1, axis=1)[:, :k]
+            part_d2 = np.take_along_axis(d2, part, axis=1)
+            order = np.argsort(part_d2, axis=1)
+            indices[start:start + len(chunk)] = np.take_along_axis(part, order, axis=1)
+            distances[start:start + len(chunk)] = np.sqrt(np.take_along_axis(part_d2, order, axis=1))
+        return indices, distances
+
+    def describe(self, index: int, distance_km: float) -> Dict[str, Any]:
+        values = self.values[index]
+        return {
+            "geo_join_id": self.geo_ids[index],
+            "name": self.names[index],
+            "latitude": float(self.lat[index]),
+            "longitude": float(self.lon[index]),
+            "distance_km": round(float(distance_km), 3),
+            **{name: None if np.isnan(v) else float(v) for name, v in zip(POLLUTANTS.values(), values)},
+            "periods": {name: p for name, p in zip(POLLUTANTS.values(), self.periods[index])},
+        }
+
+    def query(self, lats: Sequence[float], lons: Sequence[float], k: int = 3) -> List[List[Dict[str, Any]]]:
+        """Nearest neighborhoods with their outdoor levels, one list per point."""
+        indices, distances = self.nearest(lats, lons, k)
+        return [
+            [self.describe(i, d) for i, d in zip(row_i.tolist(), row_d.tolist())]
+            for row_i, row_d in zip(indices, distances)
+        ]
+
+
+outdoor_index = OutdoorIndex()
@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta, timezone
+
+
+def utc_naive(ts: datetime) -> datetime:
+    """Normalize aware timestamps to naive UTC, matching how readings are stored."""
+    if ts.tzinfo is not None:
+        return ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def floor_hour(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(ts: datetime) -> datetime:
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def ceil_hour(ts: datetime) -> datetime:
+    floored = floor_hour(ts)
+    return floored if floored == ts else floored + timedelta(hours=1)
+
+
+def ceil_day(ts: datetime) -> datetime:
+    floored = floor_day(ts)
+    return floored if floored == ts else floored + timedelta(days=1)
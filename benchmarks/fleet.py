@@ -0,0 +1,319 @@
+"""Synthetic sensor fleet for benchmarks.
+
+Builds locations for every UHF42 zipcode, households and millions of sensor
+and household readings with their alerts, and bulk-loads them into the
+configured database (SQLite or Postgres) with Core executemany inserts.
+
+- Zipcodes are weighted by borough population, spread over the borough's
+  zipcodes with some per-zipcode skew, so Brooklyn and Queens dominate and
+  Staten Island is sparse, as in the real fleet.
+- Readings are spread uniformly over the last ``days`` days, and their values
+  follow the hour of day: PM2.5 peaks with the morning and evening rush,
+  indoor CO2 builds up overnight, temperature peaks mid-afternoon and
+  humidity is highest before dawn.
+- Alerts come from the real rule engine (`evaluate_batch`), thinned to
+  ``alert_keep`` of the rule hits the way alert deduplication thins them in
+  production.
+- Rollups and the latest-reading tables are kept consistent with the raw
+  rows, so the read endpoints answer as they would after live ingest.
+
+Everything derives from ``seed``, so two runs with the same spec load the
+same data.
+"""
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.orm import Session
+
+from app import models
+from app.crud import crud_rollups
+from app.database import dialect_insert
+from app.services.alert_engine import THRESHOLDS, evaluate_batch
+from app.services.ingest import household_event_type
+from app.services.nyc_geo import UHF42_ZIPCODES, borough_for_zip
+
+# 2020 census population by borough, in thousands
+BOROUGH_POPULATION = {
+    "Brooklyn": 2736,
+    "Queens": 2405,
+    "Manhattan": 1694,
+    "Bronx": 1472,
+    "Staten Island": 496,
+}
+
+HOUSING_TYPES = ("apartment", "house", "public_housing", "rowhouse")
+HOUSING_WEIGHTS = (0.62, 0.18, 0.08, 0.12)
+
+
+@dataclass
+class FleetSpec:
+    readings: int = 100_000
+    household_readings: int = 25_000
+    households: int = 2_000
+    days: int = 30
+    alert_keep: float = 0.1
+    chunk_size: int = 50_000
+    seed: int = 42
+    end: Optional[datetime] = None  # naive UTC; default now
+
+    def as_dict(self) -> Dict[str, Any]:
+        spec = asdict(self)
+        spec["end"] = self.end.isoformat() if self.end else None
+        return spec
+
+
+def zipcode_weights(rng: np.random.Generator) -> Tuple[List[str], np.ndarray]:
+    """NYC zipcodes and their share of sensors."""
+    zipcodes = sorted({z for zips in UHF42_ZIPCODES.values() for z in zips})
+    boroughs = [borough_for_zip(z) for z in zipcodes]
+    per_borough = {b: boroughs.count(b) for b in BOROUGH_POPULATION}
+    weights = np.array([BOROUGH_POPULATION[b] / per_borough[b] for b in boroughs])
+    weights *= rng.lognormal(0.0, 0.4, len(weights))
+    return zipcodes, weights / weights.sum()
+
+
+def _rush(hour: np.ndarray) -> np.ndarray:
+    return np.exp(-((hour - 8.0) ** 2) / 4.0) + 0.8 * np.exp(-((hour - 18.0) ** 2) / 6.0)
+
+
+def _night(hour: np.ndarray) -> np.ndarray:
+    return 0.5 + 0.5 * np.cos(2 * np.pi * (hour - 3.0) / 24.0)
+
+
+def diurnal_metrics(rng: np.random.Generator, hour: np.ndarray, site_pm25: np.ndarray) -> Dict[str, np.ndarray]:
+    """Sensor metric columns for readings taken at fractional ``hour`` of day."""
+    n = len(hour)
+    pm25 = site_pm25 * (1.0 + 0.6 * _rush(hour)) * rng.lognormal(0.0, 0.45, n)
+    co2 = 480.0 + 650.0 * _night(hour) * rng.lognormal(0.0, 0.35, n)
+    tvoc = 60.0 * (1.0 + 0.5 * _night(hour)) * rng.lognormal(0.0, 0.6, n)
+    temperature = 21.0 + 3.5 * np.sin(2 * np.pi * (hour - 9.0) / 24.0) + rng.normal(0.0, 1.5, n)
+    humidity = 45.0 + 12.0 * _night(hour) - 6.0 + rng.normal(0.0, 9.0, n)
+    humidity = np.clip(humidity, 5.0, 99.0)
+    mold_risk = np.clip((humidity - 45.0) / 35.0 + rng.normal(0.0, 0.08, n), 0.0, 1.0)
+    return {
+        "pm25": np.clip(pm25, 0.0, 999.0).round(1),
+        "co2": np.clip(co2, 300.0, 9999.0).round(0),
+        "tvoc": np.clip(tvoc, 0.0, 999.0).round(1),
+        "temperature": temperature.round(1),
+        "humidity": humidity.round(1),
+        "mold_risk": mold_risk.round(2),
+    }
+
+
+def _timestamps(rng: np.random.Generator, n: int, start: datetime, seconds: int) -> Tuple[List[datetime], np.ndarray]:
+    offsets = np.sort(rng.integers(0, seconds, n))
+    base = start.hour * 3600 + start.minute * 60 + start.second
+    hour = ((offsets + base) % 86400) / 3600.0
+    return [start + timedelta(seconds=int(s)) for s in offsets.tolist()], hour
+
+
+def _next_id(db: Session, column) -> int:
+    return (db.scalar(select(func.max(column))) or 0) + 1
+
+
+def _sync_sequence(db: Session, table: str, column: str) -> None:
+    """Move a Postgres serial past ids inserted explicitly."""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), (SELECT max({column}) FROM {table}))"))
+
+
+def _upsert_latest(db: Session, model, key_fields: Tuple[str, ...], rows: List[Dict[str, Any]]) -> None:
+    if not rows:
+        return
+    table = model.__table__
+    stmt = dialect_insert(db, table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(key_fields),
+        set_={c: stmt.excluded[c] for c in rows[0] if c not in key_fields},
+        where=stmt.excluded.timestamp > table.c.timestamp,
+    )
+    db.execute(stmt, rows)
+
+
+def _latest_per_key(keys: np.ndarray, ts_order: np.ndarray) -> np.ndarray:
+    """Index of the last row per key, given rows sorted by time (``ts_order`` ascending)."""
+    order = np.lexsort((ts_order, keys))
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = keys[order][1:] != keys[order][:-1]
+    return order[last]
+
+
+def _location_ids(db: Session, zipcodes: List[str]) -> Dict[str, int]:
+    loc = models.Location
+    existing = dict(db.execute(select(loc.zipcode, loc.id).where(loc.zipcode.in_(zipcodes))).all())
+    missing = [{"zipcode": z, "borough": borough_for_zip(z)} for z in zipcodes if z not in existing]
+    if missing:
+        db.execute(insert(loc.__table__), missing)
+        existing = dict(db.execute(select(loc.zipcode, loc.id).where(loc.zipcode.in_(zipcodes))).all())
+    return existing
+
+
+def _households(db: Session, rng: np.random.Generator, spec: FleetSpec, zipcodes: List[str], weights: np.ndarray) -> Tuple[np.ndarray, List[str]]:
+    first = _next_id(db, models.Household.household_id)
+    ids = np.arange(first, first + spec.households)
+    zips = rng.choice(len(zipcodes), spec.households, p=weights)
+    types = rng.choice(len(HOUSING_TYPES), spec.households, p=HOUSING_WEIGHTS)
+    risk = np.clip(rng.normal(3.0, 1.5, spec.households), 0.0, 10.0).round(2)
+    hh_zipcodes = [zipcodes[i] for i in zips.tolist()]
+    for lo in range(0, spec.households, spec.chunk_size):
+        hi = min(lo + spec.chunk_size, spec.households)
+        db.execute(insert(models.Household.__table__), [
+            {
+                "household_id": int(ids[i]),
+                "address": f"{100 + i % 900} Benchmark St",
+                "zipcode": hh_zipcodes[i],
+                "housing_type": HOUSING_TYPES[types[i]],
+                "risk_score": float(risk[i]),
+            }
+            for i in range(lo, hi)
+        ])
+    _sync_sequence(db, "households", "household_id")
+    return ids, hh_zipcodes
+
+
+def _sensor_chunk(
+    db: Session, rng: np.random.Generator, spec: FleetSpec, n: int, first_id: int,
+    location_ids: np.ndarray, weights: np.ndarray, site_pm25: np.ndarray, start: datetime, seconds: int,
+) -> int:
+    site = rng.choice(len(location_ids), n, p=weights)
+    timestamps, hour = _timestamps(rng, n, start, seconds)
+    metrics = diurnal_metrics(rng, hour, site_pm25[site])
+    ids = np.arange(first_id, first_id + n)
+    loc = location_ids[site]
+    columns = {k: v.tolist() for k, v in metrics.items()}
+    loc_list, id_list = loc.tolist(), ids.tolist()
+    rows = [
+        {"id": id_list[i], "location_id": loc_list[i], "timestamp": timestamps[i], **{k: columns[k][i] for k in columns}}
+        for i in range(n)
+    ]
+    db.execute(insert(models.SensorReading.__table__), rows)
+    crud_rollups.add_sensor_readings(db, rows)
+    _upsert_latest(db, models.LatestReading, ("location_id",), [
+        {"location_id": rows[i]["location_id"], "reading_id": rows[i]["id"], "timestamp": rows[i]["timestamp"],
+         **{k: rows[i][k] for k in columns}}
+        for i in _latest_per_key(loc, np.arange(n)).tolist()
+    ])
+
+    hits = evaluate_batch(metrics)
+    keep = np.flatnonzero(rng.random(len(hits["row"])) < spec.alert_keep)
+    alerts = []
+    for k in keep.tolist():
+        row = int(hits["row"][k])
+        alerts.append({
+            "location_id": loc_list[row],
+            "reading_id": id_list[row],
+            "created_at": timestamps[row],
+            "metric": hits["metric"][k],
+            "threshold": float(hits["threshold"][k]),
+            "value": float(hits["value"][k]),
+            "severity": hits["severity"][k],
+            "message": hits["message"][k],
+        })
+    if alerts:
+        db.execute(insert(models.Alert.__table__), alerts)
+    return len(alerts)
+
+
+def _household_chunk(
+    db: Session, rng: np.random.Generator, spec: FleetSpec, n: int, first_id: int,
+    household_ids: np.ndarray, household_zipcodes: List[str], start: datetime, seconds: int,
+) -> int:
+    owner = rng.integers(0, len(household_ids), n)
+    timestamps, hour = _timestamps(rng, n, start, seconds)
+    metrics = diurnal_metrics(rng, hour, np.full(n, 9.0))
+    device = rng.integers(0, 2, n)
+    ids = np.arange(first_id, first_id + n)
+    hid = household_ids[owner]
+    pm25, co2, voc, humidity = (metrics[k].tolist() for k in ("pm25", "co2", "tvoc", "humidity"))
+    mold = (metrics["mold_risk"] >= THRESHOLDS["mold_risk"]["limit"]).tolist()
+    hid_list, id_list, owner_list, device_list = hid.tolist(), ids.tolist(), owner.tolist(), device.tolist()
+    rows = [
+        {
+            "reading_id": id_list[i],
+            "household_id": hid_list[i],
+            "device_id": f"dev-{hid_list[i]}-{device_list[i]}",
+            "timestamp": timestamps[i],
+            "pm25": pm25[i],
+            "co2": int(co2[i]),
+            "voc": voc[i],
+            "humidity": humidity[i],
+            "mold_flag": mold[i],
+        }
+        for i in range(n)
+    ]
+    db.execute(insert(models.HouseholdSensorReading.__table__), rows)
+    crud_rollups.add_household_readings(db, [
+        {"zipcode": household_zipcodes[owner_list[i]], "timestamp": r["timestamp"], "pm25": r["pm25"], "co2": r["co2"],
+         "voc": r["voc"], "humidity": r["humidity"]}
+        for i, r in enumerate(rows)
+    ])
+    _upsert_latest(db, models.LatestHouseholdReading, ("household_id", "device_id"), [
+        rows[i] for i in _latest_per_key(hid * 2 + device, np.arange(n)).tolist()
+    ])
+
+    hits = evaluate_batch({"pm25": metrics["pm25"], "co2": metrics["co2"], "tvoc": metrics["tvoc"], "humidity": metrics["humidity"]})
+    keep = np.flatnonzero(rng.random(len(hits["row"])) < spec.alert_keep)
+    alerts = []
+    for k in keep.tolist():
+        row = int(hits["row"][k])
+        alert = {"metric": hits["metric"][k], "threshold": float(hits["threshold"][k]), "value": float(hits["value"][k])}
+        alerts.append({
+            "reading_id": id_list[row],
+            "household_id": hid_list[row],
+            "event_type": household_event_type(alert),
+            "alert_message": hits["message"][k],
+            "timestamp": timestamps[row],
+        })
+    if alerts:
+        db.execute(insert(models.HouseholdAlert.__table__), alerts)
+    return len(alerts)
+
+
+def load_fleet(db: Session, spec: FleetSpec, progress: Optional[Callable[[str], None]] = None) -> Dict[str, int]:
+    """Generate the fleet described by ``spec`` and bulk-load it, committing per chunk.
+
+    Loads into an existing database too: new rows get ids after the current
+    maximum, and locations that already exist are reused.
+    """
+    rng = np.random.default_rng(spec.seed)
+    end = (spec.end or datetime.utcnow()).replace(microsecond=0)
+    seconds = spec.days * 86400
+    start = end - timedelta(seconds=seconds)
+    counts = {"locations": 0, "households": 0, "sensor_readings": 0, "alerts": 0, "household_sensor_readings": 0, "household_alerts": 0}
+
+    zipcodes, weights = zipcode_weights(rng)
+    by_zip = _location_ids(db, zipcodes)
+    location_ids = np.array([by_zip[z] for z in zipcodes])
+    site_pm25 = rng.lognormal(np.log(8.0), 0.3, len(zipcodes))
+    counts["locations"] = len(zipcodes)
+    household_ids, household_zipcodes = _households(db, rng, spec, zipcodes, weights)
+    counts["households"] = spec.households
+    db.commit()
+
+    next_id = _next_id(db, models.SensorReading.id)
+    for lo in range(0, spec.readings, spec.chunk_size):
+        n = min(spec.chunk_size, spec.readings - lo)
+        counts["alerts"] += _sensor_chunk(db, rng, spec, n, next_id, location_ids, weights, site_pm25, start, seconds)
+        next_id += n
+        counts["sensor_readings"] += n
+        db.commit()
+        if progress:
+            progress(f"sensor readings {counts['sensor_readings']}/{spec.readings}")
+    _sync_sequence(db, "sensor_readings", "id")
+
+    if spec.households:
+        next_id = _next_id(db, models.HouseholdSensorReading.reading_id)
+        for lo in range(0, spec.household_readings, spec.chunk_size):
+            n = min(spec.chunk_size, spec.household_readings - lo)
+            counts["household_alerts"] += _household_chunk(db, rng, spec, n, next_id, household_ids, household_zipcodes, start, seconds)
+            next_id += n
+            counts["household_sensor_readings"] += n
+            db.commit()
+            if progress:
+                progress(f"household readings {counts['household_sensor_readings']}/{spec.household_readings}")
+        _sync_sequence(db, "household_sensor_readings", "reading_id")
+    db.commit()
+    return counts
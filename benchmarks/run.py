@@ -0,0 +1,230 @@
+"""Time the API's hot paths against a synthetic fleet and write the results as JSON.
+
+    python -m benchmarks.run --database-url sqlite:///./bench.db --readings 1000000 -o bench.json
+    python -m benchmarks.run --database-url sqlite:///./bench.db --skip-load -o after.json
+    python -m benchmarks.run --compare bench.json after.json
+
+Requests go through the ASGI app in-process (TestClient), so the numbers
+cover routing, validation, SQL and serialization but no network. Each case
+runs ``--warmup`` untimed calls, then ``--iterations`` timed ones, and reports
+latency percentiles in milliseconds. The response cache is off unless
+``--cache`` is given, so read endpoints are measured against the database.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency summary (milliseconds) of per-call durations in seconds."""
+    import numpy as np
+
+    ms = np.asarray(samples, dtype=np.float64) * 1000.0
+    summary = {"count": int(ms.size), "mean_ms": float(ms.mean()), "min_ms": float(ms.min()), "max_ms": float(ms.max())}
+    for p, value in zip(PERCENTILES, np.percentile(ms, PERCENTILES)):
+        summary[f"p{p}_ms"] = float(value)
+    summary["ops_per_sec"] = float(ms.size / (ms.sum() / 1000.0)) if ms.sum() else 0.0
+    return {k: round(v, 4) if isinstance(v, float) else v for k, v in summary.items()}
+
+
+def time_case(call: Callable[[int], None], iterations: int, warmup: int) -> Dict[str, float]:
+    """Run ``call(i)`` ``warmup`` times untimed, then ``iterations`` times timed."""
+    for i in range(warmup):
+        call(i)
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        call(warmup + i)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def _git_commit() -> Optional[Dict[str, Any]]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return {"sha": commit, "dirty": dirty}
+
+
+def build_cases(client, zipcodes: List[str], seed: int) -> Dict[str, Callable[[int], None]]:
+    """Hot-path calls, each taking the iteration number (used to vary the zipcode and payload)."""
+    import numpy as np
+
+    from app.services.alert_engine import evaluate_reading
+    from app.services.nyc_geo import borough_for_zip
+    from benchmarks.fleet import diurnal_metrics
+
+    rng = np.random.default_rng(seed)
+    pool = 4096
+    hours = rng.uniform(0, 24, pool)
+    metrics = {k: v.tolist() for k, v in diurnal_metrics(rng, hours, np.full(pool, 8.0)).items()}
+    payloads = [{k: metrics[k][i] for k in metrics} for i in range(pool)]
+
+    def zipcode(i: int) -> str:
+        return zipcodes[i % len(zipcodes)]
+
+    def get(url: str) -> None:
+        r = client.get(url)
+        if r.status_code != 200:
+            raise RuntimeError(f"GET {url} -> {r.status_code}: {r.text[:200]}")
+
+    def post(url: str, body: Any) -> None:
+        r = client.post(url, json=body)
+        if r.status_code != 200:
+            raise RuntimeError(f"POST {url} -> {r.status_code}: {r.text[:200]}")
+
+    def sensor_ingest(i: int) -> None:
+        z = zipcode(i)
+        post("/api/v1/sensor-ingest", {"zipcode": z, "borough": borough_for_zip(z), **payloads[i % pool]})
+
+    def readings_bulk(i: int) -> None:
+        post("/api/v1/readings/bulk/", {"readings": [
+            {"location_zipcode": zipcode(i + k), **payloads[(i * 100 + k) % pool]} for k in range(100)
+        ]})
+
+    def evaluate(i: int) -> None:
+        evaluate_reading(payloads[i % pool])
+
+    return {
+        "sensor_ingest": sensor_ingest,
+        "readings_bulk_100": readings_bulk,
+        "alerts": lambda i: get(f"/api/v1/alerts?zipcode={zipcode(i)}&time_window_hours=24"),
+        "alerts_all": lambda i: get("/api/v1/alerts?time_window_hours=24&limit=200"),
+        "readings_stats": lambda i: get(f"/api/v1/readings/stats/?location_zipcode={zipcode(i)}&time_window_hours=24"),
+        "readings_stats_all": lambda i: get("/api/v1/readings/stats/?time_window_hours=168"),
+        "readings_latest": lambda i: get("/api/v1/readings/latest/?limit=100"),
+        "zip_trends": lambda i: get("/api/v1/aggregations/zip-trends?hours_back=24"),
+        "evaluate_reading": evaluate,
+    }
+
+
+# Pure-Python cases are far faster than requests; time more calls so percentiles are stable
+ITERATION_MULTIPLIER = {"evaluate_reading": 100}
+
+
+def run(args) -> Dict[str, Any]:
+    from fastapi.testclient import TestClient
+
+    from app.database import Base, SessionLocal, engine
+    from app.main import app
+    from benchmarks.fleet import FleetSpec, load_fleet, zipcode_weights
+
+    Base.metadata.create_all(bind=engine)
+    report: Dict[str, Any] = {
+        "created_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "git": _git_commit(),
+        "python": platform.python_version(),
+        "database": engine.dialect.name,
+        "fleet": None,
+        "cases": {},
+    }
+
+    spec = FleetSpec(
+        readings=args.readings,
+        household_readings=args.household_readings,
+        households=args.households,
+        days=args.days,
+        alert_keep=args.alert_keep,
+        seed=args.seed,
+    )
+    if not args.skip_load:
+        started = time.perf_counter()
+        with SessionLocal() as db:
+            counts = load_fleet(db, spec, progress=lambda msg: print(f"  loading {msg}", file=sys.stderr))
+        report["fleet"] = {"spec": spec.as_dict(), "rows": counts, "load_seconds": round(time.perf_counter() - started, 2)}
+        print(f"Loaded {counts} in {report['fleet']['load_seconds']}s", file=sys.stderr)
+
+    import numpy as np
+
+    zipcodes, _ = zipcode_weights(np.random.default_rng(args.seed))
+    with TestClient(app) as client:
+        cases = build_cases(client, zipcodes, args.seed)
+        selected = args.cases or list(cases)
+        for name in selected:
+            if name not in cases:
+                raise SystemExit(f"Unknown case {name!r}; choose from {', '.join(cases)}")
+            multiplier = ITERATION_MULTIPLIER.get(name, 1)
+            result = time_case(cases[name], args.iterations * multiplier, args.warmup * multiplier)
+            report["cases"][name] = result
+            print(f"{name:<20} p50 {result['p50_ms']:>9.3f} ms  p95 {result['p95_ms']:>9.3f} ms  "
+                  f"p99 {result['p99_ms']:>9.3f} ms  {result['ops_per_sec']:>10.1f} ops/s", file=sys.stderr)
+    return report
+
+
+def compare(old_path: str, new_path: str, threshold: float) -> int:
+    """Print per-case p50/p95 changes; returns 1 if any case slowed down by more than ``threshold`` percent."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    regressed = False
+    print(f"{'case':<20} {'p50 old':>10} {'p50 new':>10} {'Δ':>8}   {'p95 old':>10} {'p95 new':>10} {'Δ':>8}")
+    for name, result in new["cases"].items():
+        base = old["cases"].get(name)
+        if base is None:
+            print(f"{name:<20} (new case)")
+            continue
+        cells = []
+        for stat in ("p50_ms", "p95_ms"):
+            change = (result[stat] - base[stat]) / base[stat] * 100.0 if base[stat] else 0.0
+            regressed |= stat == "p50_ms" and change > threshold
+            cells.append(f"{base[stat]:>10.3f} {result[stat]:>10.3f} {change:>+7.1f}%")
+        print(f"{name:<20} " + "   ".join(cells))
+    return 1 if regressed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="Database to load and benchmark (default: DATABASE_URL)")
+    parser.add_argument("-o", "--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--skip-load", action="store_true", help="Benchmark the data already in the database")
+    parser.add_argument("--readings", type=int, default=100_000)
+    parser.add_argument("--household-readings", type=int, default=25_000)
+    parser.add_argument("--households", type=int, default=2_000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--alert-keep", type=float, default=0.1, help="Share of rule hits stored as alerts")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--cases", nargs="*", help="Only these cases (default: all)")
+    parser.add_argument("--cache", action="store_true", help="Leave the response cache on")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two reports instead of running")
+    parser.add_argument("--threshold", type=float, default=10.0, help="p50 slowdown (percent) that --compare reports as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+
+    # Configure the app before it is imported
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    os.environ["INGEST_MODE"] = "sync"
+    os.environ["RESPONSE_CACHE_ENABLED"] = "true" if args.cache else "false"
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    # Bulk writes exceed the per-request statement budget by design; one warning per call would drown the report
+    logging.getLogger("app.services.query_audit").setLevel(logging.ERROR)
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
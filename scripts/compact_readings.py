@@ -0,0 +1,35 @@
+"""Replace raw sensor readings older than the compaction age with 5-minute aggregates.
+
+    python -m scripts.compact_readings
+    python -m scripts.compact_readings --batch-rows 2000 --pause 0.05 --max-batches 500
+
+Works oldest first and commits every batch, so it can run next to live
+ingest (and be stopped at any point). The age comes from COMPACT_AFTER_DAYS,
+which the API also reads to know where compacted data starts.
+"""
+import argparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.services.compaction import COMPACT_AFTER_DAYS, COMPACTION_BATCH_ROWS, compact_readings, compaction_cutoff  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-rows", type=int, default=COMPACTION_BATCH_ROWS, help="Raw readings per committed batch")
+    parser.add_argument("--max-batches", type=int, help="Stop after this many batches (default: until caught up)")
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        stats = compact_readings(db, batch_rows=args.batch_rows, max_batches=args.max_batches, pause=args.pause)
+    print(f"Compacted {stats['readings']} readings older than {compaction_cutoff()} ({COMPACT_AFTER_DAYS} days) "
+          f"into {stats['buckets']} 5-minute buckets in {stats['batches']} batches")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Write readings and alerts to hive-partitioned Parquet for offline analytics.
+
+    python -m scripts.export_parquet --out exports/ --start 2025-09-01 --end 2025-10-01
+
+Each dataset lands in ``<out>/<dataset>/date=YYYY-MM-DD/borough=<name>/``.
+Partitions written by a run replace earlier files, so nightly re-runs of the
+same range are idempotent.
+"""
+import argparse
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.database import SessionLocal  # noqa: E402
+from app.services.columnar import BATCH_ROWS, DATASETS, write_parquet  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="Start time, inclusive (UTC)")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="End time, exclusive (UTC)")
+    parser.add_argument("--dataset", action="append", choices=sorted(DATASETS), help="Repeatable; default all")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        written = write_parquet(
+            db,
+            args.out,
+            args.dataset or tuple(DATASETS),
+            start_time=args.start,
+            end_time=args.end,
+            batch_rows=args.batch_rows,
+        )
+    for name, rows in written.items():
+        print(f"{name}: {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
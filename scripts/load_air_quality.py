@@ -0,0 +1,36 @@
+"""Load the NYC open-data air quality CSV into overlays and public health data.
+
+    python -m scripts.load_air_quality Air_Quality_20250927.csv
+
+UHF42 neighborhood rows are written per zipcode. Re-running replaces the
+previous load in a single transaction.
+"""
+import argparse
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.services.open_data import CHUNK_ROWS, load_air_quality  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", default=["Air_Quality_20250927.csv"], help="CSV file(s); default the bundled extract")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        stats = load_air_quality(db, args.paths, chunk_rows=args.chunk_rows)
+    print(f"Loaded {stats['overlays']} overlays and {stats['public_health']} public health rows "
+          f"from {stats['rows_read']} CSV rows in {time.perf_counter() - started:.1f}s "
+          f"(skipped {stats['skipped_geography']} non-UHF42, {stats['duplicates']} duplicate, "
+          f"{stats['unmapped']} unmapped rows)")
+
+
+if __name__ == "__main__":
+    main()
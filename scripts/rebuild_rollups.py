@@ -0,0 +1,23 @@
+"""Recompute the hourly/daily rollup tables from raw readings.
+
+Ingest keeps the rollups current; run this after bulk-loading readings outside
+the API or when first deploying the rollup tables on an existing database.
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.crud import crud_rollups  # noqa: E402
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        scanned = crud_rollups.rebuild(db)
+    print(f"Rebuilt rollups from {scanned['sensor_readings']} sensor readings "
+          f"and {scanned['household_sensor_readings']} household readings")
+
+
+if __name__ == "__main__":
+    main()
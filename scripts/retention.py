@@ -0,0 +1,52 @@
+"""Retire months of readings and alerts older than the retention period.
+
+    python -m scripts.retention --keep-months 13
+    python -m scripts.retention --keep-months 13 --mode detach --archive-dir archive/ --dry-run
+
+On Postgres each expired month is a partition: it is detached and dropped
+(or, with ``--mode detach``, left as a standalone table). On SQLite each
+month is removed with one range DELETE, after being copied into a
+``<table>_pYYYY_MM`` table in detach mode. ``--archive-dir`` writes every
+month to Parquet first. The job also creates the coming months' partitions,
+so it is safe to run from cron daily.
+"""
+import argparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.services.partitions import (  # noqa: E402
+    PARTITION_PREMAKE_MONTHS,
+    RETENTION_MODES,
+    RETENTION_MONTHS,
+    apply_retention,
+    ensure_partitions,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keep-months", type=int, default=RETENTION_MONTHS, help="Full months to keep besides the current one")
+    parser.add_argument("--mode", choices=RETENTION_MODES, default="drop")
+    parser.add_argument("--archive-dir", help="Write expired months here as Parquet before retiring them")
+    parser.add_argument("--premake", type=int, default=PARTITION_PREMAKE_MONTHS, help="Months of partitions to create ahead")
+    parser.add_argument("--dry-run", action="store_true", help="List what would be retired and change nothing")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        if not args.dry_run:
+            for name in ensure_partitions(db, ahead=args.premake):
+                print(f"created {name}")
+        actions = apply_retention(db, args.keep_months, mode=args.mode, archive_dir=args.archive_dir, dry_run=args.dry_run)
+    for action in actions:
+        rows = f" ({action['rows']} rows)" if "rows" in action else ""
+        print(f"{'would ' if args.dry_run else ''}{action['action']} {action['partition']}{rows}")
+    if not actions:
+        print(f"Nothing older than {args.keep_months} months")
+
+
+if __name__ == "__main__":
+    main()
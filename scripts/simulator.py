@@ -1,51 +1,350 @@
+"""Open-loop load generator: simulated sensor devices driving the API over a shared keep-alive pool.
+
+    python -m scripts.simulator --rps 500 --duration 60 --ramp 10
+    python -m scripts.simulator --asgi --devices 50000 --rps 200 --mix ingest=60,batch=10,alerts=15,latest=10,stats=5
+
+Requests are scheduled on a clock (uniform or Poisson arrivals at the
+target rate, ramped up linearly over ``--ramp`` seconds) and sent without
+waiting for earlier responses, so a slow server builds up in-flight
+requests and latency instead of quietly lowering the offered load.
+Latency is measured from each request's scheduled time, which keeps
+queueing delay (including the generator's own) in the numbers.
+
+``--asgi`` serves requests from the app in-process through httpx's ASGI
+transport, with no server or network; otherwise ``--base-url`` (default
+``SIMULATOR_BASE_URL``) is used.
+"""
+import argparse
+import asyncio
+import json
+import math
 import os
-import time
 import random
-import requests
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
 from dotenv import load_dotenv
 
 load_dotenv()
 
-BASE_URL = os.getenv("SIMULATOR_BASE_URL", "http://localhost:8000")
-ENDPOINT = f"{BASE_URL}/api/v1/sensor-ingest"
-ZIPS = os.getenv("SIMULATOR_ZIPCODES", "10001,11201").split(",")
-BOROUGH = os.getenv("SIMULATOR_BOROUGH", "Manhattan")
-INTERVAL = int(os.getenv("SIMULATOR_INTERVAL_SECONDS", "5"))
+from app.services.nyc_geo import UHF42_ZIPCODES, borough_for_zip  # noqa: E402
+
+API = "/api/v1"
+DEFAULT_MIX = "ingest=70,batch=5,alerts=10,latest=10,stats=5"
+SCENARIOS = ("ingest", "batch", "alerts", "latest", "stats", "trends")
+PERCENTILES = (50, 90, 95, 99)
+
+
+@dataclass
+class Device:
+    device_id: int
+    zipcode: str
+    borough: str
+    pm25_base: float
+    co2_base: float
+    humidity_base: float
+
 
+def make_devices(count: int, zipcodes: Sequence[str], fallback_borough: str, rng: random.Random) -> List[Device]:
+    """``count`` devices spread over ``zipcodes``, each with its own baseline levels."""
+    devices = []
+    for i in range(count):
+        zipcode = zipcodes[rng.randrange(len(zipcodes))]
+        devices.append(Device(
+            device_id=i,
+            zipcode=zipcode,
+            borough=borough_for_zip(zipcode) or fallback_borough,
+            pm25_base=rng.lognormvariate(math.log(9.0), 0.4),
+            co2_base=rng.uniform(450.0, 900.0),
+            humidity_base=rng.uniform(30.0, 60.0),
+        ))
+    return devices
 
-def generate_payload(zipcode: str, borough: str):
+
+def generate_payload(device: Device, rng: random.Random, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """A reading from ``device``; PM2.5 follows the rush hours and CO2 builds up overnight."""
+    now = now or datetime.now(timezone.utc)
+    hour = now.hour + now.minute / 60.0
+    rush = math.exp(-((hour - 8.0) ** 2) / 4.0) + 0.8 * math.exp(-((hour - 18.0) ** 2) / 6.0)
+    night = 0.5 + 0.5 * math.cos(2 * math.pi * (hour - 3.0) / 24.0)
+    humidity = min(99.0, max(5.0, device.humidity_base + rng.gauss(0.0, 6.0)))
     return {
-        "zipcode": zipcode,
-        "borough": borough,
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-        "pm25": round(random.uniform(2, 120), 1),
-        "co2": random.randint(400, 2000),
-        "tvoc": round(random.uniform(10, 600), 1),
-        "humidity": round(random.uniform(20, 75), 1),
-        "temperature": round(random.uniform(16, 30), 1),
-        "mold_risk": round(random.uniform(0, 1), 2),
+        "zipcode": device.zipcode,
+        "borough": device.borough,
+        "timestamp": now.isoformat(),
+        "pm25": round(min(999.0, device.pm25_base * (1.0 + 0.6 * rush) * rng.lognormvariate(0.0, 0.4)), 1),
+        "co2": round(min(9999.0, device.co2_base + 600.0 * night * rng.lognormvariate(0.0, 0.3))),
+        "tvoc": round(min(999.0, rng.lognormvariate(math.log(70.0), 0.6)), 1),
+        "humidity": round(humidity, 1),
+        "temperature": round(21.0 + 3.5 * math.sin(2 * math.pi * (hour - 9.0) / 24.0) + rng.gauss(0.0, 1.5), 1),
+        "mold_risk": round(min(1.0, max(0.0, (humidity - 45.0) / 35.0)), 2),
     }
 
 
+def parse_mix(text: str) -> Dict[str, float]:
+    """``"ingest=70,alerts=30"`` -> normalized weights per scenario."""
+    weights: Dict[str, float] = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("Scenario weights must add up to more than zero")
+    return {name: w / total for name, w in weights.items() if w > 0}
+
+
+@dataclass
+class ScenarioStats:
+    latencies: List[float] = field(default_factory=list)  # seconds, successful requests
+    statuses: Dict[str, int] = field(default_factory=dict)
+    errors: int = 0
+    readings: int = 0
+
+    def record(self, status: str, latency: float, ok: bool, readings: int) -> None:
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if ok:
+            self.latencies.append(latency)
+            self.readings += readings
+        else:
+            self.errors += 1
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        completed = len(self.latencies) + self.errors
+        out: Dict[str, Any] = {
+            "requests": completed,
+            "errors": self.errors,
+            "error_rate": round(self.errors / completed, 4) if completed else 0.0,
+            "throughput_rps": round(completed / elapsed, 2) if elapsed else 0.0,
+            "statuses": dict(sorted(self.statuses.items())),
+        }
+        if self.readings:
+            out["readings_per_sec"] = round(self.readings / elapsed, 2) if elapsed else 0.0
+        if self.latencies:
+            ordered = sorted(self.latencies)
+            for p in PERCENTILES:
+                out[f"p{p}_ms"] = round(ordered[min(len(ordered) - 1, math.ceil(p / 100.0 * len(ordered)) - 1)] * 1000.0, 3)
+            out["max_ms"] = round(ordered[-1] * 1000.0, 3)
+            out["mean_ms"] = round(sum(ordered) / len(ordered) * 1000.0, 3)
+        return out
+
+
+class LoadGenerator:
+    """Schedules scenario requests at a target rate and records their outcomes.
+
+    Scenarios:
+    - ``ingest``: POST /sensor-ingest with one device's reading.
+    - ``batch``: POST /sensor-ingest/batch with ``batch_size`` devices' readings.
+    - ``alerts``, ``latest``, ``stats`` and ``trends``: the dashboard reads.
+
+    Devices are used round-robin, so every simulated device reports about
+    once per ``devices / ingest rate`` seconds.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        devices: List[Device],
+        mix: Dict[str, float],
+        *,
+        batch_size: int = 50,
+        max_inflight: int = 1000,
+        seed: int = 0,
+    ):
+        self.client = client
+        self.devices = devices
+        self.mix = mix
+        self.batch_size = batch_size
+        self.max_inflight = max_inflight
+        self.rng = random.Random(seed)
+        self.stats: Dict[str, ScenarioStats] = {name: ScenarioStats() for name in mix}
+        self.skipped = 0  # arrivals dropped because max_inflight requests were already open
+        self._next_device = 0
+        self._inflight: set = set()
+        self._names = list(mix)
+        self._cumulative = [sum(list(mix.values())[: i + 1]) for i in range(len(mix))]
+
+    def _devices(self, n: int) -> List[Device]:
+        start = self._next_device
+        self._next_device = (start + n) % len(self.devices)
+        return [self.devices[(start + k) % len(self.devices)] for k in range(n)]
+
+    def _request(self, scenario: str) -> Tuple[str, str, Optional[Any], int]:
+        """(method, path, json body, readings carried) for one request of ``scenario``."""
+        if scenario == "ingest":
+            return "POST", f"{API}/sensor-ingest", generate_payload(self._devices(1)[0], self.rng), 1
+        if scenario == "batch":
+            now = datetime.now(timezone.utc)
+            readings = [generate_payload(d, self.rng, now) for d in self._devices(self.batch_size)]
+            return "POST", f"{API}/sensor-ingest/batch", {"readings": readings}, len(readings)
+        zipcode = self.devices[self.rng.randrange(len(self.devices))].zipcode
+        if scenario == "alerts":
+            return "GET", f"{API}/alerts?zipcode={zipcode}&time_window_hours=24", None, 0
+        if scenario == "latest":
+            return "GET", f"{API}/readings/latest/?limit=100", None, 0
+        if scenario == "stats":
+            return "GET", f"{API}/readings/stats/?location_zipcode={zipcode}&time_window_hours=24", None, 0
+        return "GET", f"{API}/aggregations/zip-trends?hours_back=24", None, 0
+
+    def _pick(self) -> str:
+        x = self.rng.random()
+        for name, bound in zip(self._names, self._cumulative):
+            if x < bound:
+                return name
+        return self._names[-1]
+
+    async def _send(self, scenario: str, scheduled: float) -> None:
+        method, path, body, readings = self._request(scenario)
+        try:
+            response = await self.client.request(method, path, json=body)
+            status, ok = str(response.status_code), response.is_success
+        except httpx.TimeoutException:
+            status, ok = "timeout", False
+        except (httpx.HTTPError, OSError) as exc:
+            status, ok = type(exc).__name__, False
+        self.stats[scenario].record(status, time.perf_counter() - scheduled, ok, readings)
+
+    def _launch(self, scheduled: float) -> None:
+        if len(self._inflight) >= self.max_inflight:
+            self.skipped += 1
+            return
+        task = asyncio.ensure_future(self._send(self._pick(), scheduled))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def run(self, rps: float, duration: float, ramp: float = 0.0, arrivals: str = "poisson", drain_timeout: float = 30.0) -> Dict[str, Any]:
+        """Offer load for ``ramp + duration`` seconds and wait for open requests; returns the report."""
+        started = time.perf_counter()
+        end = ramp + duration
+        offset = 0.0  # seconds since start of the next arrival
+        offered = 0
+        while True:
+            rate = rps * min(1.0, (offset + 1e-9) / ramp) if ramp > 0 else rps
+            rate = max(rate, 1.0)
+            offset += self.rng.expovariate(rate) if arrivals == "poisson" else 1.0 / rate
+            if offset >= end:
+                break
+            delay = started + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._launch(started + offset)
+            offered += 1
+        offered_elapsed = time.perf_counter() - started
+        if self._inflight:
+            await asyncio.wait(set(self._inflight), timeout=drain_timeout)
+        elapsed = time.perf_counter() - started
+        abandoned = len(self._inflight)
+        for task in list(self._inflight):
+            task.cancel()
+
+        scenarios = {name: s.summary(elapsed) for name, s in self.stats.items()}
+        completed = sum(s["requests"] for s in scenarios.values())
+        errors = sum(s["errors"] for s in scenarios.values())
+        latencies = sorted(l for s in self.stats.values() for l in s.latencies)
+        total = ScenarioStats(latencies=latencies, errors=errors).summary(elapsed)
+        return {
+            "target_rps": rps,
+            "ramp_seconds": ramp,
+            "duration_seconds": duration,
+            "arrivals": arrivals,
+            "devices": len(self.devices),
+            "offered": offered,
+            "offered_rps": round(offered / offered_elapsed, 2) if offered_elapsed else 0.0,
+            "completed": completed,
+            "skipped": self.skipped,
+            "abandoned": abandoned,
+            "errors": errors,
+            "error_rate": total["error_rate"],
+            "throughput_rps": round(completed / elapsed, 2) if elapsed else 0.0,
+            "latency": {k: v for k, v in total.items() if k.endswith("_ms")},
+            "scenarios": scenarios,
+        }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"offered {report['offered']} requests ({report['offered_rps']}/s target {report['target_rps']}/s), "
+        f"completed {report['completed']} ({report['throughput_rps']}/s), errors {report['errors']} "
+        f"({report['error_rate']:.2%}), skipped {report['skipped']}, abandoned {report['abandoned']}",
+        f"{'scenario':<8} {'requests':>9} {'rps':>9} {'err%':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}  statuses",
+    ]
+    for name, s in report["scenarios"].items():
+        lines.append(
+            f"{name:<8} {s['requests']:>9} {s['throughput_rps']:>9} {s['error_rate'] * 100:>6.2f}% "
+            + " ".join(f"{s.get(k, float('nan')):>9.2f}" for k in ("p50_ms", "p95_ms", "p99_ms", "max_ms"))
+            + f"  {s['statuses']}"
+        )
+    return "\n".join(lines)
+
+
+@asynccontextmanager
+async def asgi_client(limits: httpx.Limits, timeout: float) -> AsyncIterator[httpx.AsyncClient]:
+    """Client served by the app in-process, with its startup/shutdown run around the load."""
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        # Unhandled app errors become 500 responses, as behind a real server
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://simulator", limits=limits, timeout=timeout) as client:
+            yield client
+
+
+async def simulate(args, log: Callable[[str], None] = print) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    zipcodes = args.zipcodes or sorted({z for zips in UHF42_ZIPCODES.values() for z in zips})
+    devices = make_devices(args.devices, zipcodes, args.borough, rng)
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    if args.asgi:
+        client_cm = asgi_client(limits, args.timeout)
+    else:
+        client_cm = httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout)
+    async with client_cm as client:
+        generator = LoadGenerator(
+            client, devices, parse_mix(args.mix), batch_size=args.batch_size, max_inflight=args.max_inflight, seed=args.seed
+        )
+        target = "in-process app" if args.asgi else args.base_url
+        log(f"Simulating {len(devices)} devices against {target}: {args.rps} req/s for {args.duration}s "
+            f"after a {args.ramp}s ramp, {args.arrivals} arrivals, mix {args.mix}")
+        return await generator.run(args.rps, args.duration, args.ramp, args.arrivals)
+
+
 def main():
-    print(f"Simulator posting to {ENDPOINT} every {INTERVAL}s; zipcodes={ZIPS}")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default=os.getenv("SIMULATOR_BASE_URL", "http://localhost:8000"))
+    parser.add_argument("--asgi", action="store_true", help="Serve requests from the app in-process (no server or network)")
+    parser.add_argument("--devices", type=int, default=int(os.getenv("SIMULATOR_DEVICES", "10000")))
+    parser.add_argument("--rps", type=float, default=float(os.getenv("SIMULATOR_RPS", "100")), help="Target requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds at the target rate, after the ramp")
+    parser.add_argument("--ramp", type=float, default=0.0, help="Seconds to ramp linearly up to the target rate")
+    parser.add_argument("--arrivals", choices=("poisson", "uniform"), default="poisson")
+    parser.add_argument("--mix", default=os.getenv("SIMULATOR_MIX", DEFAULT_MIX), help=f"Scenario weights, from {', '.join(SCENARIOS)}")
+    parser.add_argument("--batch-size", type=int, default=50, help="Readings per batch ingest request")
+    parser.add_argument("--connections", type=int, default=100, help="Keep-alive connection pool size")
+    parser.add_argument("--max-inflight", type=int, default=5000, help="Open requests before arrivals are skipped")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--zipcodes", type=lambda s: [z.strip() for z in s.split(",") if z.strip()],
+                        default=[z.strip() for z in os.getenv("SIMULATOR_ZIPCODES", "").split(",") if z.strip()],
+                        help="Comma-separated zipcodes (default: every UHF42 zipcode)")
+    parser.add_argument("--borough", default=os.getenv("SIMULATOR_BOROUGH", "Manhattan"), help="Borough for non-NYC zipcodes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="Also write the report as JSON")
+    args = parser.parse_args()
+
     try:
-        while True:
-            for z in ZIPS:
-                payload = generate_payload(z.strip(), BOROUGH)
-                try:
-                    resp = requests.post(ENDPOINT, json=payload, timeout=5)
-                    if resp.ok:
-                        data = resp.json()
-                        print(f"[{datetime.now().isoformat()}] {z}: created reading {data.get('reading_id')} with {data.get('alerts_created')} alerts")
-                    else:
-                        print(f"Error {resp.status_code}: {resp.text}")
-                except requests.RequestException as e:
-                    print(f"Request failed: {e}")
-            time.sleep(INTERVAL)
+        report = asyncio.run(simulate(args))
     except KeyboardInterrupt:
         print("\nSimulator stopped.")
+        return
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
 
 
 if __name__ == "__main__":
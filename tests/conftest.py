@@ -0,0 +1,43 @@
+import uuid
+from contextlib import contextmanager
+
+import pytest
+
+
+@pytest.fixture
+def assert_max_queries():
+    """``with assert_max_queries(n): ...`` fails if the block runs more than n SQL statements.
+
+    Statements are counted on every thread, so requests made through the
+    TestClient are included. The failure message lists the statements by
+    shape, which makes a row-by-row lazy load (N+1) obvious.
+    """
+    from app.services.query_audit import capture_queries, describe
+
+    @contextmanager
+    def check(limit: int):
+        with capture_queries() as log:
+            yield log
+        assert log.count <= limit, f"expected at most {limit} statements, ran {log.count}:\n{describe(log)}"
+
+    return check
+
+
+@pytest.fixture
+def unique_zip():
+    """``unique_zip("10128")`` -> e.g. "10128-3fa9": a zipcode no earlier run has written, in the same borough.
+
+    ./test_air_quality.db outlives a run, and alert states, latest readings
+    and cache entries are kept per zipcode, so tests that count alerts or rows
+    must not reuse a fixed zipcode.
+    """
+    return lambda zipcode: f"{zipcode}-{uuid.uuid4().hex[:4]}"
+
+
+@pytest.fixture(autouse=True)
+def _fresh_alert_states():
+    """Start every test with no alert states in memory; they reload from the table on demand."""
+    from app.services.alert_state import alert_states
+
+    alert_states.reset()
+    yield
@@ -0,0 +1,45 @@
+import numpy as np
+
+from app.services.alert_engine import (
+    DEFAULT_ENGINE,
+    Rule,
+    RuleEngine,
+    THRESHOLDS,
+    columns_from_payloads,
+    evaluate_batch,
+    evaluate_reading,
+)
+
+
+READINGS = [
+    {"pm25": 50.0, "co2": 900, "humidity": 20.0},
+    {"pm25": 10.0, "tvoc": 250.0, "mold_risk": 0.6},
+    {"humidity": 75.0, "co2": None},
+    {},
+]
+
+
+def test_evaluate_reading_matches_thresholds():
+    alerts = evaluate_reading(READINGS[0])
+    assert [(a["metric"], a["threshold"]) for a in alerts] == [("pm25", 35.0), ("humidity", 30.0)]
+    assert alerts[0]["severity"] == THRESHOLDS["pm25"]["severity"]
+    assert evaluate_reading(READINGS[3]) == []
+
+
+def test_batch_evaluation_matches_single_reading_path():
+    assert DEFAULT_ENGINE.evaluate_many(READINGS) == [evaluate_reading(r) for r in READINGS]
+
+    result = evaluate_batch(columns_from_payloads(READINGS))
+    assert result["row"].tolist() == [0, 0, 1, 1, 2]
+    assert result["metric"].tolist() == ["pm25", "humidity", "tvoc", "mold_risk", "humidity"]
+
+
+def test_structured_array_and_extra_rules():
+    engine = RuleEngine.from_thresholds(
+        THRESHOLDS,
+        extra_rules=[Rule("temperature_high", "temperature", ">", 30.0, "info", "Too warm", "°C")],
+    )
+    arr = np.array([(25.0, 31.0), (np.nan, 35.0)], dtype=[("pm25", "f8"), ("temperature", "f8")])
+    result = engine.evaluate_batch(arr)
+    assert result["row"].tolist() == [0, 1]
+    assert result["message"].tolist() == ["Too warm", "Too warm"]
@@ -0,0 +1,61 @@
+import os
+from datetime import datetime
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+# Ensure tests use a separate SQLite DB file
+os.environ["DATABASE_URL"] = "sqlite:///./test_air_quality.db"
+
+from app import models  # noqa: E402  (import after env var set)
+from app.database import Base  # noqa: E402
+from benchmarks.fleet import FleetSpec, load_fleet  # noqa: E402
+from benchmarks.run import summarize  # noqa: E402
+
+
+def test_fleet_loads_consistent_readings_rollups_and_latest(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fleet.db'}")
+    Base.metadata.create_all(engine)
+    spec = FleetSpec(readings=3000, household_readings=800, households=40, days=3, chunk_size=1000, end=datetime(2025, 6, 1))
+    with sessionmaker(bind=engine)() as db:
+        counts = load_fleet(db, spec)
+        count = lambda model: db.scalar(select(func.count()).select_from(model))  # noqa: E731
+        assert count(models.SensorReading) == 3000
+        assert count(models.HouseholdSensorReading) == 800
+        assert count(models.Household) == 40
+        assert count(models.Alert) == counts["alerts"] > 0
+        assert count(models.HouseholdAlert) == counts["household_alerts"]
+
+        # Rollups count every reading; latest rows point at each location's newest reading
+        r = models.ReadingRollupDaily
+        assert db.scalar(select(func.sum(r.count)).where(r.metric == "readings")) == 3000
+        newest = dict(db.execute(
+            select(models.SensorReading.location_id, func.max(models.SensorReading.timestamp)).group_by(models.SensorReading.location_id)
+        ).all())
+        latest = dict(db.execute(select(models.LatestReading.location_id, models.LatestReading.timestamp)).all())
+        assert latest == newest
+
+        # Readings follow the borough population: Brooklyn outnumbers Staten Island
+        by_borough = dict(db.execute(
+            select(models.Location.borough, func.count()).join(models.SensorReading).group_by(models.Location.borough)
+        ).all())
+        assert by_borough["Brooklyn"] > 3 * by_borough["Staten Island"]
+
+        # Same seed, same data
+        first = db.scalars(select(models.SensorReading.pm25).order_by(models.SensorReading.id).limit(20)).all()
+    engine.dispose()
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'again.db'}")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        load_fleet(db, spec)
+        assert db.scalars(select(models.SensorReading.pm25).order_by(models.SensorReading.id).limit(20)).all() == first
+    engine.dispose()
+
+
+def test_summarize_reports_percentiles_in_milliseconds():
+    summary = summarize([i / 1000.0 for i in range(1, 101)])
+    assert summary["count"] == 100
+    assert summary["min_ms"] == 1.0 and summary["max_ms"] == 100.0
+    assert summary["p50_ms"] == 50.5
+    assert 98.0 < summary["p99_ms"] <= 100.0
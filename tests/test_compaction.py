@@ -0,0 +1,83 @@
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+# Ensure tests use a separate SQLite DB file
+os.environ["DATABASE_URL"] = "sqlite:///./test_air_quality.db"
+
+from app import models  # noqa: E402  (import after env var set)
+from app.crud import crud_rollups  # noqa: E402
+from app.crud.crud_sensor_reading import get_sensor_readings, readings_export_query  # noqa: E402
+from app.database import Base  # noqa: E402
+from app.services.compaction import compact_readings, floor_bucket  # noqa: E402
+
+
+def _fleet(tmp_path):
+    """Session with 5-second readings for 12 minutes 40 days ago, 5 recent readings and an alert on an old reading."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'compaction.db'}")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    loc = models.Location(zipcode="10005", borough="Manhattan")
+    db.add(loc)
+    db.flush()
+    old = floor_bucket(datetime.utcnow() - timedelta(days=40))
+    rows = [{"location_id": loc.id, "timestamp": old + timedelta(seconds=5 * i), "pm25": float(i), "co2": 400.0 + i}
+            for i in range(144)]
+    rows += [{"location_id": loc.id, "timestamp": datetime.utcnow() - timedelta(minutes=i), "pm25": 10.0, "co2": 500.0}
+             for i in range(5)]
+    db.execute(models.SensorReading.__table__.insert(), rows)
+    crud_rollups.add_sensor_readings(db, rows)
+    first_id = db.scalar(select(func.min(models.SensorReading.id)))
+    db.add(models.Alert(location_id=loc.id, reading_id=first_id + 100, created_at=old, metric="pm25",
+                        threshold=35.0, value=100.0, severity="warning", message="PM2.5 high"))
+    db.commit()
+    return db, old
+
+
+def test_compaction_replaces_old_readings_with_five_minute_buckets(tmp_path):
+    db, old = _fleet(tmp_path)
+    # Batches smaller than a bucket (60 readings) still take whole buckets
+    stats = compact_readings(db, batch_rows=50)
+    assert stats["readings"] == 144 and stats["buckets"] == 3
+    assert db.scalar(select(func.count()).select_from(models.SensorReading)) == 5
+    assert db.scalar(select(models.Alert.reading_id)) is None
+
+    c = models.CompactedReading
+    first = db.scalars(select(c).order_by(c.bucket_start)).first()
+    assert (first.bucket_start, first.samples, first.last_timestamp) == (old, 60, old + timedelta(seconds=295))
+    assert (first.pm25, first.pm25_min, first.pm25_max, first.pm25_last) == (29.5, 0.0, 59.0, 59.0)
+    assert first.tvoc is None and first.tvoc_last is None
+    assert db.scalar(select(func.sum(c.samples))) == 144
+    assert compact_readings(db)["readings"] == 0
+
+    # Rebuilt rollups still count every original reading
+    crud_rollups.rebuild(db)
+    r = models.ReadingRollupDaily
+    assert db.scalar(select(func.sum(r.count)).where(r.metric == "readings")) == 149
+    assert db.scalar(select(func.max(r.max_value)).where(r.metric == "pm25")) == 143.0
+    db.close()
+
+
+def test_readings_queries_serve_compacted_rows_for_old_ranges(tmp_path):
+    db, old = _fleet(tmp_path)
+    compact_readings(db)
+
+    # Recent raw readings first, then the buckets, across cursor pages
+    page = get_sensor_readings(db, limit=6)
+    assert [type(r).__name__ for r in page] == ["SensorReading"] * 5 + ["CompactedReading"]
+    assert page[-1].timestamp == old + timedelta(minutes=10) and page[-1].location.zipcode == "10005"
+    rest = get_sensor_readings(db, limit=10, after=(page[-1].timestamp, page[-1].id))
+    assert [r.timestamp for r in rest] == [old + timedelta(minutes=5), old]
+
+    window = get_sensor_readings(db, start_time=old, end_time=old + timedelta(minutes=6))
+    assert [r.samples for r in window] == [60, 60]
+
+    exported = db.execute(readings_export_query(location_zipcode="10005")).mappings().all()
+    assert len(exported) == 8
+    assert [row["timestamp"] for row in exported[:3]] == [old, old + timedelta(minutes=5), old + timedelta(minutes=10)]
+    assert exported[0]["pm25"] == 29.5
+    recent = db.execute(readings_export_query(start_time=datetime.utcnow() - timedelta(days=1))).all()
+    assert len(recent) == 5
+    db.close()
@@ -86,3 +86,34 @@ def test_health_context_upsert_and_get():
     ctx = r2.json()
     assert ctx["zipcode"] == "10001"
     assert ctx["asthma_rate"] == 18.3
+
+
+def test_health_context_update_invalidates_cached_answer_on_commit(unique_zip):
+    zipcode = unique_zip("10001")
+    payload = {"zipcode": zipcode, "asthma_rate": 18.3, "er_visit_rate": 22.7, "ej_index": 0.63}
+    assert client.put("/api/v1/health-context", json=payload).status_code == 200
+    assert client.get(f"/api/v1/health-context/{zipcode}").json()["asthma_rate"] == 18.3
+
+    assert client.put("/api/v1/health-context", json={**payload, "asthma_rate": 20.1}).status_code == 200
+    assert client.get(f"/api/v1/health-context/{zipcode}").json()["asthma_rate"] == 20.1
+
+
+def test_list_households_pages_without_zip_fallback(unique_zip):
+    zipcode = unique_zip("10314")
+    ids = [
+        client.post("/api/v1/households", json={"zipcode": zipcode, "housing_type": "house"}).json()["household_id"]
+        for _ in range(3)
+    ]
+
+    r = client.get(f"/api/v1/households?zipcode={zipcode}&limit=2")
+    assert r.status_code == 200, r.text
+    first = [h["household_id"] for h in r.json()]
+    cursor = r.headers["x-next-cursor"]
+    r = client.get(f"/api/v1/households?zipcode={zipcode}&limit=2&cursor={cursor}")
+    rest = [h["household_id"] for h in r.json()]
+    assert first + rest == sorted(ids)
+    assert "x-next-cursor" not in r.headers
+
+    # without a zipcode every household is listed, not just 10001
+    r = client.get(f"/api/v1/households?limit=1000&cursor={cursor}")
+    assert ids[2] in {h["household_id"] for h in r.json()}
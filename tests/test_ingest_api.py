@@ -0,0 +1,345 @@
+import os
+from fastapi.testclient import TestClient
+
+# Ensure tests use a separate SQLite DB file
+os.environ["DATABASE_URL"] = "sqlite:///./test_air_quality.db"
+
+from app.main import app  # noqa: E402  (import after env var set)
+
+client = TestClient(app)
+
+
+def test_batch_ingest_persists_readings_and_alerts(unique_zip):
+    brooklyn, bronx = unique_zip("11201"), unique_zip("10451")
+    r = client.post(
+        "/api/v1/households",
+        json={"zipcode": brooklyn, "housing_type": "apartment"},
+    )
+    assert r.status_code == 200, r.text
+    hid = r.json()["household_id"]
+
+    batch = {
+        "readings": [
+            {"zipcode": brooklyn, "borough": "Brooklyn", "pm25": 80.0, "co2": 1500, "household_id": hid},
+            {"zipcode": brooklyn, "borough": "Brooklyn", "pm25": 10.0, "humidity": 45.0},
+            {"zipcode": bronx, "borough": "Bronx", "humidity": 20.0},
+        ]
+    }
+    r2 = client.post("/api/v1/sensor-ingest/batch", json=batch)
+    assert r2.status_code == 200, r2.text
+    data = r2.json()
+    assert data["count"] == 3
+    assert [res["alerts_created"] for res in data["results"]] == [2, 0, 1]
+    assert data["alerts_created"] == 3
+    assert data["results"][0]["household_reading_id"] is not None
+    assert data["results"][1]["household_reading_id"] is None
+    assert len({res["reading_id"] for res in data["results"]}) == 3
+
+    r3 = client.get(f"/api/v1/households/{hid}/alerts?hours_back=24")
+    assert r3.status_code == 200, r3.text
+    event_types = {a["event_type"] for a in r3.json()}
+    assert {"pm25_high", "co2_high"} <= event_types
+
+    r4 = client.get(f"/api/v1/alerts?zipcode={bronx}")
+    assert r4.status_code == 200, r4.text
+    assert any(a["metric"] == "humidity" and a["borough"] == "Bronx" for a in r4.json()["alerts"])
+
+
+def test_batch_ingest_rejects_unknown_household():
+    batch = {"readings": [{"zipcode": "10001", "borough": "Manhattan", "pm25": 5.0, "household_id": 987654321}]}
+    r = client.post("/api/v1/sensor-ingest/batch", json=batch)
+    assert r.status_code == 404, r.text
+
+
+def test_single_ingest_mirrors_household_reading_and_alerts(unique_zip):
+    zipcode = unique_zip("10001")
+    r = client.post(
+        "/api/v1/households",
+        json={"zipcode": zipcode, "housing_type": "apartment"},
+    )
+    assert r.status_code == 200, r.text
+    hid = r.json()["household_id"]
+
+    payload = {"zipcode": zipcode, "borough": "Manhattan", "household_id": hid, "humidity": 75.0, "mold_risk": 0.7}
+    r2 = client.post("/api/v1/sensor-ingest", json=payload)
+    assert r2.status_code == 200, r2.text
+    data = r2.json()
+    assert data["alerts_created"] == 2
+    assert data["household_reading_id"] is not None
+    assert data["advice"]
+
+    r3 = client.get(f"/api/v1/households/{hid}/alerts?hours_back=24")
+    alerts = r3.json()
+    assert {a["event_type"] for a in alerts} == {"humidity_high", "mold_risk_high"}
+    assert all(a["reading_id"] == data["household_reading_id"] for a in alerts)
+
+
+def test_new_zipcode_gets_borough_and_cached_location():
+    from app.services.location_cache import location_cache
+
+    r = client.post("/api/v1/readings/", json={"location_zipcode": "11375", "pm25": 12.0})
+    assert r.status_code == 200, r.text
+    location = r.json()["location"]
+    assert location["borough"] == "Queens"
+    assert location_cache.get("11375") == location["id"]
+
+    r2 = client.post("/api/v1/readings/", json={"location_zipcode": "11375", "pm25": 13.0})
+    assert r2.json()["location"]["id"] == location["id"]
+
+
+def test_queued_ingest_acknowledges_and_drains_on_shutdown():
+    from app.services.ingest_queue import ingest_queue
+
+    ingest_queue.enabled = True
+    try:
+        with TestClient(app) as queued:
+            r = queued.post("/api/v1/sensor-ingest", json={"zipcode": "10029", "borough": "Manhattan", "pm25": 77.0})
+            assert r.status_code == 202, r.text
+            assert r.json()["status"] == "accepted"
+        # leaving the client ran shutdown, which drains the queue
+        stats = client.get("/api/v1/sensor-ingest/queue").json()
+        assert stats["depth"] == 0 and stats["written"] >= 1 and not stats["running"]
+    finally:
+        ingest_queue.enabled = False
+
+    r = client.get("/api/v1/alerts?zipcode=10029&time_window_hours=1")
+    assert r.status_code == 200, r.text
+    assert any(a["metric"] == "pm25" and a["value"] == 77.0 for a in r.json()["alerts"])
+
+    # not running -> 503
+    ingest_queue.enabled = True
+    try:
+        r = client.post("/api/v1/sensor-ingest", json={"zipcode": "10029", "borough": "Manhattan"})
+        assert r.status_code == 503, r.text
+    finally:
+        ingest_queue.enabled = False
+
+
+def test_ingest_queue_rejects_when_full():
+    import asyncio
+    from app.schemas.alerts import IngestPayload
+    from app.services.ingest_queue import IngestQueue, QueueFull
+
+    async def scenario():
+        queue = IngestQueue(maxsize=2, batch_size=10, max_wait=0.05, enabled=True)
+        await queue.start()
+        payload = IngestPayload(zipcode="10029", borough="Manhattan", co2=900)
+        queue.submit(payload)
+        queue.submit(payload)
+        try:
+            queue.submit(payload)
+            raise AssertionError("expected QueueFull")
+        except QueueFull:
+            pass
+        await queue.stop(timeout=10)
+        return queue.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["accepted"] == 2 and stats["rejected_full"] == 1
+    assert stats["written"] == 2 and stats["batches"] == 1
+
+
+def test_ingest_queue_drops_only_the_reading_that_fails():
+    import asyncio
+    from sqlalchemy.exc import IntegrityError, OperationalError
+    from app.schemas.alerts import IngestPayload
+    from app.services.ingest_queue import IngestQueue
+    from app.services.metrics import INGEST_DROPPED
+
+    outages = [OperationalError("INSERT", {}, Exception("server closed the connection"))] * 2
+
+    class FlakyQueue(IngestQueue):
+        @staticmethod
+        def _write(db, payloads):
+            # The database is unreachable twice, then rejects one row
+            if outages:
+                raise outages.pop()
+            if any(p.co2 == 1313 for p in payloads):
+                raise IntegrityError("INSERT", {}, Exception("bad row"))
+            return IngestQueue._write(db, payloads)
+
+    async def scenario():
+        queue = FlakyQueue(maxsize=20, batch_size=8, max_wait=0.05, enabled=True, retry_delay=0.01)
+        await queue.start()
+        for co2 in range(8):
+            queue.submit(IngestPayload(zipcode="10006", borough="Manhattan", co2=1313 if co2 == 5 else 400 + co2))
+        assert queue.stats()["depth"] == 8 and queue.stats()["oldest_pending_seconds"] >= 0
+        await queue.stop(timeout=10)
+        return queue.stats()
+
+    dropped = INGEST_DROPPED.value("write_error")
+    stats = asyncio.run(scenario())
+    # Outages retry the whole batch; only the rejected row is dropped
+    assert stats["batches"] == 1 and stats["retries"] == 2 and stats["split_batches"] == 3
+    assert stats["written"] == 7 and stats["failed"] == 1
+    assert INGEST_DROPPED.value("write_error") == dropped + 1
+    assert stats["depth"] == 0 and stats["oldest_pending_seconds"] == 0.0
+
+
+def test_concurrent_ingest_on_async_sessions():
+    import asyncio
+    import httpx
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            return await asyncio.gather(*(
+                ac.post("/api/v1/sensor-ingest", json={"zipcode": "10035", "borough": "Manhattan", "co2": 400 + i})
+                for i in range(20)
+            ))
+
+    responses = asyncio.run(scenario())
+    assert all(r.status_code == 200 for r in responses), [r.text for r in responses if r.status_code != 200]
+    assert len({r.json()["reading_id"] for r in responses}) == 20
+
+
+def test_alert_state_machine_deduplicates_with_hysteresis(unique_zip):
+    from app.services.alert_state import alert_states
+
+    zipcode = unique_zip("10309")
+    r = client.post("/api/v1/households", json={"zipcode": zipcode, "housing_type": "apartment"})
+    hid = r.json()["household_id"]
+
+    def ingest(minute, co2):
+        ts = f"2030-01-01T{minute // 60:02d}:{minute % 60:02d}:00"
+        reading = {"zipcode": zipcode, "borough": "Staten Island", "household_id": hid, "timestamp": ts, "co2": co2}
+        r = client.post("/api/v1/sensor-ingest/batch", json={"readings": [reading]})
+        assert r.status_code == 200, r.text
+        return r.json()["alerts_created"]
+
+    # Stuck high: one alert, then silence until the re-notify interval (1h)
+    assert [ingest(m, 1500) for m in range(0, 30, 5)] == [1, 0, 0, 0, 0, 0]
+    # Between exit (1000) and limit (1200) the alert stays active
+    assert ingest(30, 1100) == 0 and ingest(35, 1300) == 0
+    assert ingest(61, 1500) == 1
+    # Dropping below the exit bound clears it; crossing the limit again alerts
+    assert ingest(70, 900) == 0
+    assert ingest(75, 1250) == 1
+
+    # State survives a restart: reloaded from alert_states, still active
+    alert_states.reset()
+    assert ingest(80, 1500) == 0
+
+    r = client.get(f"/api/v1/households/{hid}/alerts?hours_back=24")
+    assert [a["event_type"] for a in r.json()].count("co2_high") == 3
+
+    # The single-reading endpoint still gives advice while the alert is deduplicated
+    r = client.post("/api/v1/sensor-ingest", json={"zipcode": zipcode, "borough": "Staten Island", "co2": 1500, "timestamp": "2030-01-01T01:25:00"})
+    assert r.json()["alerts_created"] == 0 and r.json()["advice"]
+    assert client.get("/api/v1/alerts/state").json()["states"]["active"] >= 2
+
+
+def test_alert_stream_fans_out_by_zipcode_and_household(unique_zip):
+    watched, other = unique_zip("10307"), unique_zip("10308")
+    r = client.post("/api/v1/households", json={"zipcode": watched, "housing_type": "house"})
+    hid = r.json()["household_id"]
+    readings = [
+        {"zipcode": other, "borough": "Staten Island", "pm25": 80, "timestamp": "2030-02-01T00:00:00"},
+        {"zipcode": watched, "borough": "Staten Island", "household_id": hid, "co2": 1500, "timestamp": "2030-02-01T00:00:00"},
+    ]
+    with client.websocket_connect(f"/api/v1/alerts/ws?zipcode={watched}") as by_zip, \
+            client.websocket_connect(f"/api/v1/alerts/ws?household_id={hid}") as by_household:
+        assert client.get("/api/v1/alerts/stream/stats").json()["subscribers"] == 2
+        r = client.post("/api/v1/sensor-ingest/batch", json={"readings": readings})
+        assert r.json()["alerts_created"] == 2
+
+        # The other zipcode's alert is filtered out; the household alert only goes to household subscribers
+        event = by_zip.receive_json()
+        assert (event["scope"], event["zipcode"], event["metric"]) == ("location", watched, "co2")
+        event = by_household.receive_json()
+        assert (event["scope"], event["household_id"], event["event_type"]) == ("household", hid, "co2_high")
+        assert event["zipcode"] == watched
+
+
+def test_alert_hub_drops_slow_subscribers():
+    import asyncio
+    from app.services.alert_hub import AlertHub, HubFull
+
+    async def scenario():
+        hub = AlertHub(buffer=2, max_subscribers=2)
+        slow = hub.subscribe(boroughs=["Brooklyn"])
+        fast = hub.subscribe(zipcodes=["11201"])
+        try:
+            hub.subscribe()
+        except HubFull:
+            pass
+        else:
+            raise AssertionError("subscriber limit not enforced")
+
+        for i in range(3):
+            hub.publish([{"zipcode": "11201", "borough": "Brooklyn", "value": i}])
+            assert (await fast.next(1))["value"] == i
+        # The slow subscriber never read: two events buffered, then dropped
+        assert [await slow.next(1) for _ in range(3)] == [
+            {"zipcode": "11201", "borough": "Brooklyn", "value": 0},
+            {"zipcode": "11201", "borough": "Brooklyn", "value": 1},
+            None,
+        ]
+        hub.unsubscribe(slow)
+        hub.unsubscribe(fast)
+        return hub.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["dropped_subscribers"] == 1 and stats["subscribers"] == 0
+
+
+def test_polling_endpoints_answer_304_when_unchanged(unique_zip):
+    zipcode = unique_zip("10128")
+
+    def ingest(pm25):
+        reading = {"zipcode": zipcode, "borough": "Manhattan", "pm25": pm25}
+        assert client.post("/api/v1/sensor-ingest/batch", json={"readings": [reading]}).status_code == 200
+
+    ingest(90)
+    for url in (f"/api/v1/alerts?zipcode={zipcode}", "/api/v1/readings/latest/?limit=100", "/api/v1/aggregations/zip-trends"):
+        r = client.get(url)
+        assert r.status_code == 200, r.text
+        etag = r.headers["etag"]
+        r = client.get(url, headers={"If-None-Match": etag})
+        assert r.status_code == 304 and r.content == b"" and r.headers["etag"] == etag
+
+    r = client.get(f"/api/v1/alerts?zipcode={zipcode}")
+    etag, last_modified = r.headers["etag"], r.headers["last-modified"]
+    assert client.get(f"/api/v1/alerts?zipcode={zipcode}", headers={"If-Modified-Since": last_modified}).status_code == 304
+    # Other parameters get their own ETag
+    assert client.get(f"/api/v1/alerts?zipcode={zipcode}&limit=5", headers={"If-None-Match": etag}).status_code == 200
+
+    # A new reading for the zip changes the latest readings, not this zip's alerts (pm25 stays active)
+    r = client.get("/api/v1/readings/latest/?limit=100")
+    latest_etag = r.headers["etag"]
+    ingest(95)
+    assert client.get(f"/api/v1/alerts?zipcode={zipcode}", headers={"If-None-Match": etag}).status_code == 304
+    r = client.get("/api/v1/readings/latest/?limit=100", headers={"If-None-Match": latest_etag})
+    assert r.status_code == 200 and r.headers["etag"] != latest_etag
+
+    # Clearing and re-crossing the limit writes a new alert
+    ingest(5)
+    ingest(80)
+    r = client.get(f"/api/v1/alerts?zipcode={zipcode}", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.json()["count"] == 2
+
+
+def test_alert_state_loads_do_not_block_concurrent_async_ingest():
+    import asyncio
+    import threading
+    from datetime import datetime
+    from app.database import AsyncSessionLocal
+    from app.services.alert_state import AlertStateMachine
+
+    machine = AlertStateMachine()
+    results = []
+
+    async def ingest(subject_id):
+        # Subjects not in memory yet: each call loads its states from the table
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(lambda s: machine.process(s, "location", [subject_id], [datetime.utcnow()], [{"co2": 2000}]))
+
+    async def scenario():
+        results.extend(await asyncio.gather(*(ingest(900001 + i) for i in range(4))))
+
+    # A lock held across the state query would stall the event loop for good; run it where a hang can time out
+    worker = threading.Thread(target=asyncio.run, args=(scenario(),), daemon=True)
+    worker.start()
+    worker.join(timeout=30)
+    assert not worker.is_alive(), "concurrent alert state loads deadlocked the event loop"
+    assert [[a["metric"] for a in alerts[0]] for alerts in results] == [["co2"]] * 4
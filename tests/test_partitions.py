@@ -0,0 +1,78 @@
+import os
+from datetime import datetime
+
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.orm import sessionmaker
+
+# Ensure tests use a separate SQLite DB file
+os.environ["DATABASE_URL"] = "sqlite:///./test_air_quality.db"
+
+from app import models  # noqa: E402  (import after env var set)
+from app.database import Base  # noqa: E402
+from app.services import partitions  # noqa: E402
+
+
+def test_month_math_and_partition_names():
+    assert partitions.add_months(datetime(2025, 11, 1), 3) == datetime(2026, 2, 1)
+    assert partitions.add_months(datetime(2025, 1, 1), -13) == datetime(2023, 12, 1)
+    assert partitions.months_between(datetime(2025, 11, 15, 8), datetime(2026, 1, 1)) == [datetime(2025, 11, 1), datetime(2025, 12, 1)]
+    assert partitions.PARTITIONED_TABLES < set(partitions.RETENTION_TABLES)
+    assert "sensor_readings_compacted" not in partitions.PARTITIONED_TABLES
+    assert partitions.partition_name("alerts", datetime(2025, 3, 1)) == "alerts_p2025_03"
+    assert partitions.partition_month("alerts", "alerts_p2025_03") == datetime(2025, 3, 1)
+    assert partitions.partition_month("alerts", "household_alerts_p2025_03") is None
+    assert partitions.partition_month("alerts", "alerts_default") is None
+    assert partitions.create_partition_sql("sensor_readings", datetime(2025, 12, 1)) == (
+        "CREATE TABLE IF NOT EXISTS sensor_readings_p2025_12 PARTITION OF sensor_readings "
+        "FOR VALUES FROM ('2025-12-01 00:00:00+00') TO ('2026-01-01 00:00:00+00')"
+    )
+    ts = models.SensorReading.timestamp
+    assert str(partitions.time_window(ts, datetime(2025, 1, 1), datetime(2025, 2, 1))) == (
+        "sensor_readings.timestamp >= :timestamp_1 AND sensor_readings.timestamp < :timestamp_2")
+    assert str(partitions.time_window(ts, until=datetime(2025, 2, 1), inclusive_until=True)) == "sensor_readings.timestamp <= :timestamp_1"
+
+
+def test_sqlite_retention_detaches_then_drops_expired_months(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'retention.db'}")
+    Base.metadata.create_all(engine)
+    now = datetime(2025, 6, 10)
+    with sessionmaker(bind=engine)() as db:
+        loc = models.Location(zipcode="10005", borough="Manhattan")
+        db.add(loc)
+        db.flush()
+        reading_ids = []
+        for ts in (datetime(2025, 1, 31, 23), datetime(2025, 2, 1), datetime(2025, 2, 20), datetime(2025, 3, 1), datetime(2025, 6, 1)):
+            reading = models.SensorReading(location_id=loc.id, timestamp=ts, pm25=40.0)
+            db.add(reading)
+            db.flush()
+            reading_ids.append(reading.id)
+            db.add(models.Alert(location_id=loc.id, reading_id=reading.id, created_at=ts, metric="pm25",
+                                threshold=35.0, value=40.0, severity="warning", message="PM2.5 high"))
+        # A back-dated January reading that raised an alert in June
+        late = models.Alert(location_id=loc.id, reading_id=reading_ids[0], created_at=now, metric="pm25",
+                            threshold=35.0, value=40.0, severity="warning", message="PM2.5 high")
+        db.add(late)
+        db.commit()
+        count = lambda model: db.scalar(select(func.count()).select_from(model))  # noqa: E731
+
+        # Keeping 3 full months before June retires January and February only
+        planned = partitions.apply_retention(db, 3, now=now, mode="detach", dry_run=True)
+        assert [(a["table"], a["month"], a["rows"]) for a in planned] == [
+            ("alerts", "2025-01", 1), ("alerts", "2025-02", 2),
+            ("sensor_readings", "2025-01", 1), ("sensor_readings", "2025-02", 2),
+        ]
+        assert count(models.SensorReading) == 5
+
+        partitions.apply_retention(db, 3, now=now, mode="detach")
+        assert count(models.SensorReading) == 2 and count(models.Alert) == 3
+        db.refresh(late)
+        assert late.reading_id is None
+        assert list(partitions.list_partitions(db, "sensor_readings")) == [datetime(2025, 1, 1), datetime(2025, 2, 1)]
+        assert db.scalar(text("SELECT count(*) FROM sensor_readings_p2025_02")) == 2
+        assert partitions.apply_retention(db, 3, now=now) == []
+
+        # A shorter retention drops March without keeping a copy
+        dropped = partitions.apply_retention(db, 2, now=now)
+        assert [(a["table"], a["partition"]) for a in dropped] == [("alerts", "alerts_p2025_03"), ("sensor_readings", "sensor_readings_p2025_03")]
+        assert count(models.SensorReading) == 1
+        assert "sensor_readings_p2025_03" not in partitions.list_partitions(db, "sensor_readings").values()
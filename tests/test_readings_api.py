@@ -0,0 +1,442 @@
+import os
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+# Ensure tests use a separate SQLite DB file
+os.environ["DATABASE_URL"] = "sqlite:///./test_air_quality.db"
+
+from app.main import app  # noqa: E402  (import after env var set)
+
+client = TestClient(app)
+
+
+def test_latest_readings_returns_newest_reading_per_location():
+    for ts, pm25 in (("2025-01-01T08:00:00", 11.0), ("2025-01-01T10:00:00", 33.0), ("2025-01-01T09:00:00", 22.0)):
+        r = client.post("/api/v1/readings/", json={"location_zipcode": "10314", "timestamp": ts, "pm25": pm25})
+        assert r.status_code == 200, r.text
+
+    r = client.get("/api/v1/readings/latest/?limit=100")
+    assert r.status_code == 200, r.text
+    readings = r.json()
+    zipcodes = [rd["location"]["zipcode"] for rd in readings]
+    assert len(zipcodes) == len(set(zipcodes))
+
+    latest = next(rd for rd in readings if rd["location"]["zipcode"] == "10314")
+    assert latest["pm25"] == 33.0
+    assert latest["location"]["borough"] == "Staten Island"
+
+
+def test_recommendations_use_last_known_reading():
+    r = client.post("/api/v1/sensor-ingest", json={"zipcode": "10463", "borough": "Bronx", "co2": 1800})
+    assert r.status_code == 200, r.text
+    # An older, replayed reading must not replace the last known value
+    r = client.post(
+        "/api/v1/sensor-ingest",
+        json={"zipcode": "10463", "borough": "Bronx", "co2": 500, "timestamp": "2020-01-01T00:00:00Z"},
+    )
+    assert r.status_code == 200, r.text
+
+    rec = client.get("/api/v1/recommendations?zipcode=10463").json()
+    assert rec["status"] == "action recommended"
+    assert any(reason.startswith("co2=1800") for reason in rec["reasons"])
+
+
+def test_household_latest_reading_per_device():
+    hid = client.post("/api/v1/households", json={"zipcode": "10463", "housing_type": "house"}).json()["household_id"]
+    for device, pm25 in (("dev-a", 5.0), ("dev-b", 7.0), ("dev-a", 9.0)):
+        r = client.post(
+            f"/api/v1/households/{hid}/readings",
+            json={"household_id": hid, "device_id": device, "pm25": pm25},
+        )
+        assert r.status_code == 200, r.text
+
+    r = client.get(f"/api/v1/households/{hid}/readings/latest")
+    assert r.status_code == 200, r.text
+    assert sorted((rd["device_id"], rd["pm25"]) for rd in r.json()) == [("dev-a", 9.0), ("dev-b", 7.0)]
+
+
+def test_mixed_naive_and_aware_timestamps_in_one_write():
+    # A defaulted (naive UTC) timestamp and an explicit aware one for the same location
+    r = client.post("/api/v1/readings/bulk/", json={"readings": [
+        {"location_zipcode": "10022", "pm25": 12.0},
+        {"location_zipcode": "10022", "pm25": 99.0, "timestamp": "2025-01-01T00:00:00Z"},
+    ]})
+    assert r.status_code == 200, r.text
+    latest = next(rd for rd in client.get("/api/v1/readings/latest/?limit=100").json() if rd["location"]["zipcode"] == "10022")
+    assert latest["pm25"] == 12.0
+
+    hid = client.post("/api/v1/households", json={"zipcode": "10022", "housing_type": "apartment"}).json()["household_id"]
+    for body in ({"pm25": 8.0}, {"pm25": 60.0, "timestamp": "2025-01-01T05:00:00+05:00"}):
+        r = client.post(f"/api/v1/households/{hid}/readings", json={"household_id": hid, "device_id": "dev-a", **body})
+        assert r.status_code == 200, r.text
+    assert [rd["pm25"] for rd in client.get(f"/api/v1/households/{hid}/readings/latest").json()] == [8.0]
+
+
+def test_stats_are_answered_from_rollups():
+    from datetime import datetime, timedelta
+
+    now = datetime.utcnow()
+    batch = {"readings": [
+        {"zipcode": "10280", "borough": "Manhattan", "pm25": pm25, "timestamp": (now - timedelta(hours=h)).isoformat()}
+        for pm25, h in ((10.0, 0), (20.0, 2.5), (60.0, 23.5), (500.0, 30))
+    ]}
+    r = client.post("/api/v1/sensor-ingest/batch", json=batch)
+    assert r.status_code == 200, r.text
+
+    r = client.get("/api/v1/readings/stats/?location_zipcode=10280&time_window_hours=24")
+    assert r.status_code == 200, r.text
+    (result,) = r.json()["results"]
+    pm25 = result["stats"]["pm25"]
+    assert (pm25["min"], pm25["max"]) == (10.0, 60.0)
+    assert abs(pm25["avg"] - 30.0) < 1e-9
+
+
+def test_read_endpoints_are_cached_until_their_zipcode_is_written(unique_zip):
+    from datetime import datetime
+
+    written, other = unique_zip("10004"), unique_zip("10006")
+
+    def ingest(zipcode, pm25):
+        reading = {"zipcode": zipcode, "borough": "Manhattan", "pm25": pm25, "timestamp": datetime.utcnow().isoformat()}
+        assert client.post("/api/v1/sensor-ingest/batch", json={"readings": [reading]}).status_code == 200
+
+    def max_pm25(zipcode):
+        r = client.get(f"/api/v1/readings/stats/?time_window_hours=24&location_zipcode={zipcode}")
+        return r.json()["results"][0]["stats"]["pm25"]["max"]
+
+    def hits():
+        return client.get("/api/v1/cache/stats").json()["routes"]["readings_stats"]["hits"]
+
+    ingest(written, 12.0)
+    ingest(other, 14.0)
+    assert max_pm25(written) == 12.0 and max_pm25(other) == 14.0
+    before = hits()
+    # Parameter order and whitespace do not change the key
+    r = client.get(f"/api/v1/readings/stats/?location_zipcode={written}%20&time_window_hours=24")
+    assert r.json()["results"][0]["stats"]["pm25"]["max"] == 12.0
+    assert hits() == before + 1
+
+    # A write for one zipcode invalidates its entries only
+    ingest(written, 40.0)
+    assert max_pm25(written) == 40.0
+    assert max_pm25(other) == 14.0
+    assert hits() == before + 2
+
+
+def test_export_streams_ndjson_csv_and_gzip(unique_zip):
+    import csv
+    import gzip
+    import io
+    import json
+
+    zipcode = unique_zip("10282")
+    batch = {"readings": [{"zipcode": zipcode, "borough": "Manhattan", "pm25": float(i), "co2": 500 + i} for i in range(25)]}
+    assert client.post("/api/v1/sensor-ingest/batch", json=batch).status_code == 200
+
+    r = client.get(f"/api/v1/readings/export?location_zipcode={zipcode}")
+    assert r.status_code == 200, r.text
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert [row["pm25"] for row in rows] == [float(i) for i in range(25)]
+    assert rows[0]["zipcode"] == zipcode and rows[0]["borough"] == "Manhattan"
+
+    r = client.get(f"/api/v1/readings/export?location_zipcode={zipcode}&format=csv&gzip=true")
+    assert r.status_code == 200, r.text
+    assert r.headers["content-disposition"].endswith('readings.csv.gz"')
+    table = list(csv.DictReader(io.StringIO(gzip.decompress(r.content).decode())))
+    assert len(table) == 25 and table[-1]["co2"] == "524.0"
+
+    r = client.get("/api/v1/readings/export?format=xml")
+    assert r.status_code == 422
+
+
+def test_household_readings_export(unique_zip):
+    import json
+
+    zipcode = unique_zip("10282")
+    hid = client.post("/api/v1/households", json={"zipcode": zipcode, "housing_type": "apartment"}).json()["household_id"]
+    for pm25 in (5.5, 6.5):
+        client.post(f"/api/v1/households/{hid}/readings", json={"household_id": hid, "device_id": "d1", "pm25": pm25})
+
+    r = client.get(f"/api/v1/household-readings/export?household_id={hid}")
+    assert r.status_code == 200, r.text
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert [(row["device_id"], row["pm25"], row["zipcode"]) for row in rows] == [("d1", 5.5, zipcode), ("d1", 6.5, zipcode)]
+
+
+def test_readings_keyset_pagination(unique_zip):
+    from datetime import datetime, timedelta
+
+    zipcode = unique_zip("10301")
+    base = datetime(2026, 1, 1, 12, 0, 0)
+    # Equal timestamps on purpose: ties are broken by id
+    batch = {"readings": [
+        {"zipcode": zipcode, "borough": "Staten Island", "pm25": float(i), "timestamp": (base + timedelta(minutes=i // 2)).isoformat()}
+        for i in range(7)
+    ]}
+    assert client.post("/api/v1/sensor-ingest/batch", json=batch).status_code == 200
+
+    seen, url, pages = [], f"/api/v1/readings/?location_zipcode={zipcode}&limit=3", 0
+    while url:
+        r = client.get(url)
+        assert r.status_code == 200, r.text
+        seen += [row["pm25"] for row in r.json()]
+        pages += 1
+        cursor = r.headers.get("x-next-cursor")
+        url = f"/api/v1/readings/?location_zipcode={zipcode}&limit=3&cursor={cursor}" if cursor else None
+        if cursor:
+            assert 'rel="next"' in r.headers["link"]
+    assert pages == 3
+    assert seen == [6.0, 5.0, 4.0, 3.0, 2.0, 1.0, 0.0]
+
+    assert client.get("/api/v1/readings/?cursor=not-a-cursor").status_code == 400
+
+
+def test_arrow_stream_and_parquet_snapshot(tmp_path, unique_zip):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from datetime import datetime
+    from app.database import SessionLocal
+    from app.services.columnar import write_parquet
+
+    bronx, brooklyn = unique_zip("10451"), unique_zip("11201")
+    start, end = "2025-03-01T00:00:00", "2025-03-03T00:00:00"
+    batch = {"readings": [
+        {"zipcode": bronx, "borough": "Bronx", "pm25": 40.0, "timestamp": "2025-03-01T10:00:00"},
+        {"zipcode": brooklyn, "borough": "Brooklyn", "pm25": 5.0, "timestamp": "2025-03-02T10:00:00"},
+        {"zipcode": brooklyn, "borough": "Brooklyn", "pm25": 6.0, "timestamp": "2025-03-04T10:00:00"},
+    ]}
+    assert client.post("/api/v1/sensor-ingest/batch", json=batch).status_code == 200
+
+    r = client.get(f"/api/v1/readings/arrow?location_zipcode={brooklyn}&start_time={start}&end_time={end}")
+    assert r.status_code == 200, r.text
+    assert r.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    table = pa.ipc.open_stream(r.content).read_all()
+    assert table.column("pm25").to_pylist() == [5.0]
+    assert table.schema.field("timestamp").type == pa.timestamp("us")
+
+    # The snapshot covers every zipcode in the range; earlier runs may have added to it
+    with SessionLocal() as db:
+        written = write_parquet(
+            db, str(tmp_path), ["sensor_readings"],
+            start_time=datetime.fromisoformat(start), end_time=datetime.fromisoformat(end),
+        )
+    assert written["sensor_readings"] >= 2
+    assert (tmp_path / "sensor_readings" / "date=2025-03-01" / "borough=Bronx").is_dir()
+    dataset = ds.dataset(tmp_path / "sensor_readings", format="parquet", partitioning="hive")
+    ours = dataset.to_table(filter=ds.field("zipcode").isin([bronx, brooklyn]))
+    assert sorted(ours.column("pm25").to_pylist()) == [5.0, 40.0]
+
+
+AIR_QUALITY_CSV = (
+    "Unique ID,Indicator ID,Name,Measure,Measure Info,Geo Type Name,Geo Join ID,Geo Place Name,Time Period,Start_Date,Data Value,Message\n"
+    "1,365,Fine particles (PM 2.5),Mean,mcg/m3,UHF42,101,Kingsbridge - Riverdale,Annual Average 2022,12/31/2021,6.1,\n"
+    "2,365,Fine particles (PM 2.5),Mean,mcg/m3,UHF42,503,Willowbrook,Annual Average 2022,12/31/2021,5.2,\n"
+    "3,657,Asthma emergency department visits due to PM2.5,Estimated annual rate (age 18+),\"per 100,000 adults\",UHF42,101,Kingsbridge - Riverdale,2017-2019,01/01/2017,40.0,\n"
+    "4,365,Fine particles (PM 2.5),Mean,mcg/m3,UHF34,105106107,Hunts Point - Mott Haven,Annual Average 2022,12/31/2021,7.0,\n"
+    "5,365,Fine particles (PM 2.5),Mean,mcg/m3,Citywide,1,New York City,Annual Average 2022,12/31/2021,6.4,\n"
+    "1,365,Fine particles (PM 2.5),Mean,mcg/m3,UHF42,101,Kingsbridge - Riverdale,Annual Average 2022,12/31/2021,6.1,\n"
+)
+
+
+def test_air_quality_csv_loads_overlays_idempotently(tmp_path):
+    from app.database import SessionLocal
+    from app.services.open_data import load_air_quality
+
+    csv_path = tmp_path / "air_quality.csv"
+    csv_path.write_text(AIR_QUALITY_CSV)
+
+    for _ in range(2):
+        with SessionLocal() as db:
+            stats = load_air_quality(db, str(csv_path), chunk_rows=2)
+        # UHF 101 covers 10463 and 10471, UHF 503 only 10314
+        assert stats["overlays"] == 2 + 1 + 2
+        assert stats["public_health"] == 2
+        assert stats["skipped_geography"] == 2
+        assert stats["duplicates"] == 1
+
+    r = client.get("/api/v1/context?zipcode=10471")
+    assert r.status_code == 200, r.text
+    overlays = r.json()["overlays"]
+    assert [(o["type"], o["year"], o["value"]) for o in overlays] == [("pm25", 2022, 6.1), ("asthma_ed_pm25_adults", 2017, 40.0)]
+    assert overlays[0]["meta"]["geo_place_name"] == "Kingsbridge - Riverdale"
+
+    r = client.get("/api/v1/context?zipcode=10314&type=pm25&year=2022")
+    assert [o["value"] for o in r.json()["overlays"]] == [5.2]
+
+    r = client.get("/api/v1/public-health/10463?year=2017")
+    assert r.status_code == 200, r.text
+    assert [row["asthma_rate"] for row in r.json()] == [4.0]
+
+
+def test_indicator_store_serves_context_and_memory_maps_its_cache(tmp_path):
+    from app.services.indicator_store import IndicatorStore, indicator_store
+
+    csv_path = tmp_path / "air_quality.csv"
+    csv_path.write_text(AIR_QUALITY_CSV)
+
+    first, second = IndicatorStore(), IndicatorStore()
+    assert first.load(str(csv_path)) and first.source == "csv"
+    assert second.load(str(csv_path)) and second.source == "cache"
+    assert isinstance(second._rows, np.memmap)
+    assert first.query(zipcode="10463") == second.query(zipcode="10463")
+    assert second.query(zipcode="10471", type="pm25", year=2022)[0]["value"] == 6.1
+    assert second.query(zipcode="10001") == []
+
+    assert indicator_store.load(str(csv_path))
+    try:
+        r = client.get("/api/v1/context?zipcode=10314")
+        assert r.status_code == 200, r.text
+        assert [(o["type"], o["year"], o["value"]) for o in r.json()["overlays"]] == [("pm25", 2022, 5.2)]
+        assert r.json()["overlays"][0]["meta"]["geo_place_name"] == "Willowbrook"
+
+        r = client.get("/api/v1/context?type=asthma_ed_pm25_adults")
+        assert sorted(o["zipcode"] for o in r.json()["overlays"]) == ["10463", "10471"]
+    finally:
+        indicator_store.close()
+
+
+def test_outdoor_nearest_neighborhoods_and_recommendations(tmp_path):
+    from app import models
+    from app.database import SessionLocal
+    from app.services.spatial_index import outdoor_index
+
+    header = "Unique ID,Indicator ID,Name,Measure,Measure Info,Geo Type Name,Geo Join ID,Geo Place Name,Time Period,Start_Date,Data Value,Message,geo_norm,lat,lon\n"
+    rows = []
+    for uid, (geo, name, lat, lon) in enumerate((
+        ("104", "Clinton and Chelsea", 40.7567, -73.9981),
+        ("105", "Midtown", 40.7508, -73.9876),
+        ("503", "Tottenville and Great Kills", 40.5271, -74.1813),
+    )):
+        for indicator, period, value in ((365, "Annual Average 2022", 8.0 + uid), (365, "Winter 2022-23", 99.0), (386, "Summer 2023", 30.0 + uid)):
+            rows.append(f"{uid * 10 + indicator},{indicator},x,Mean,ppb,CD,{geo},{name} (CD),{period},01/01/22,{value},,{name},{lat},{lon}\n")
+    csv_path = tmp_path / "latlon.csv"
+    csv_path.write_text(header + "".join(rows))
+
+    assert outdoor_index.load(str(csv_path))
+    try:
+        r = client.get("/api/v1/outdoor?lat=40.7506&lon=-73.9974&k=2")
+        assert r.status_code == 200, r.text
+        nearest = r.json()["neighborhoods"]
+        assert [n["geo_join_id"] for n in nearest] == ["104", "105"]
+        assert nearest[0]["distance_km"] < nearest[1]["distance_km"]
+        # Annual averages win over more recent seasonal values
+        assert (nearest[0]["pm25"], nearest[0]["periods"]["pm25"]) == (8.0, "Annual Average 2022")
+        assert nearest[0]["no2"] is None and nearest[0]["o3"] == 30.0
+
+        points = [{"lat": 40.75, "lon": -73.99}, {"lat": 40.53, "lon": -74.18}] * 500
+        r = client.post("/api/v1/outdoor/batch", json={"points": points, "k": 1})
+        assert r.status_code == 200, r.text
+        results = r.json()["results"]
+        assert len(results) == 1000
+        assert [res[0]["geo_join_id"] for res in results[:2]] == ["105", "503"]
+
+        r = client.post("/api/v1/sensor-ingest", json={"zipcode": "10018", "borough": "Manhattan", "pm25": 80})
+        assert r.status_code == 200, r.text
+        with SessionLocal() as db:
+            location = db.query(models.Location).filter_by(zipcode="10018").one()
+            location.latitude, location.longitude = 40.7550, -73.9930
+            db.commit()
+        r = client.get("/api/v1/recommendations?zipcode=10018")
+        body = r.json()
+        assert body["outdoor"]["geo_join_id"] == "104"
+        assert any(reason.startswith("outdoor pm25=8.0") for reason in body["reasons"])
+    finally:
+        outdoor_index.close()
+
+    assert client.get("/api/v1/outdoor?lat=40.75&lon=-73.99").status_code == 503
+
+
+def test_metrics_endpoint_exposes_request_db_and_ingest_metrics(unique_zip):
+    import re
+
+    zipcode = unique_zip("10128")
+
+    def sample(text, name, **labels):
+        selector = "{%s}" % ",".join(f'{k}="{v}"' for k, v in labels.items()) if labels else ""
+        match = re.search(rf"^{re.escape(name + selector)} (\S+)$", text, re.M)
+        return float(match.group(1)) if match else 0.0
+
+    before = client.get("/metrics").text
+    r = client.post("/api/v1/sensor-ingest/batch", json={"readings": [
+        {"zipcode": zipcode, "borough": "Manhattan", "co2": 2500},
+        {"zipcode": zipcode, "borough": "Manhattan", "co2": 2600},
+    ]})
+    assert r.status_code == 200
+    hid = client.post("/api/v1/households", json={"zipcode": zipcode, "housing_type": "house"}).json()["household_id"]
+    assert client.get(f"/api/v1/households/{hid}").status_code == 200
+    assert client.get("/api/v1/households/999999999").status_code == 404
+
+    r = client.get("/metrics")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain")
+    text = r.text
+    route = "/api/v1/households/{household_id}"
+    assert sample(text, "http_requests_total", method="GET", route=route, status="200") >= 1
+    assert sample(text, "http_requests_total", method="GET", route=route, status="404") >= 1
+    assert sample(text, "http_request_duration_seconds_count", method="GET", route=route, status="200") >= 1
+    # Statements run in AsyncSession greenlets are attributed to the route
+    assert sample(text, "db_queries_total", route=route) >= 2
+    assert sample(text, "db_query_duration_seconds_count", route=route) >= 2
+    assert 'db_pool_checkout_seconds_bucket{engine="async",le="+Inf"}' in text
+    # Two readings; one alert (the second is deduplicated)
+    assert sample(text, "ingest_readings_total") - sample(before, "ingest_readings_total") == 2
+    assert sample(text, "alerts_created_total", metric="co2", scope="location") - sample(
+        before, "alerts_created_total", metric="co2", scope="location") == 1
+    assert "# TYPE response_cache_hit_ratio gauge" in text
+
+
+def test_list_endpoints_stay_within_query_budgets(assert_max_queries):
+    hid = client.post("/api/v1/households", json={"zipcode": "10002", "housing_type": "apartment"}).json()["household_id"]
+    readings = [{"zipcode": "10002", "borough": "Manhattan", "pm25": 60.0 + i, "co2": 1500 + i, "household_id": hid} for i in range(8)]
+    readings += [{"zipcode": "10003", "borough": "Manhattan", "humidity": 20.0 + i} for i in range(4)]
+    with assert_max_queries(25) as log:
+        r = client.post("/api/v1/sensor-ingest/batch", json={"readings": readings})
+    assert r.status_code == 200, r.text
+    # Readings, rollups and alerts are written set-wise, not row by row
+    assert not log.repeated(2), log.shapes
+
+    # Row counts grow with the data; statement counts must not (no N+1)
+    budgets = {
+        "/api/v1/readings/?limit=50": 2,
+        "/api/v1/readings/latest/?limit=50": 2,
+        "/api/v1/alerts?zipcode=10002": 3,
+        "/api/v1/households?limit=50": 2,
+        f"/api/v1/households/{hid}/readings": 2,
+        f"/api/v1/households/{hid}/readings/latest": 2,
+        f"/api/v1/households/{hid}/alerts?hours_back=24": 2,
+    }
+    for url, budget in budgets.items():
+        with assert_max_queries(budget):
+            r = client.get(url)
+        assert r.status_code == 200, (url, r.text)
+        assert r.json(), url
+
+    with assert_max_queries(2):
+        r = client.post("/api/v1/context/refresh")
+    assert r.status_code == 200 and "10002" in r.json()["updated"]
+
+
+def test_query_audit_flags_repeated_statements(caplog):
+    from fastapi import FastAPI
+    from sqlalchemy import text
+
+    from app.database import SessionLocal
+    from app.services.query_audit import BUDGET_EXCEEDED, QueryAuditMiddleware
+
+    probe = FastAPI()
+
+    @probe.get("/n-plus-one")
+    def n_plus_one():
+        with SessionLocal() as db:
+            for i in range(4):
+                db.execute(text("SELECT :i"), {"i": i})
+        return {}
+
+    probe.add_middleware(QueryAuditMiddleware, budget=10, repeat_limit=3)
+    before = BUDGET_EXCEEDED.value("/n-plus-one", "repeat")
+    with caplog.at_level("WARNING", logger="app.services.query_audit"):
+        assert TestClient(probe).get("/n-plus-one").status_code == 200
+    assert BUDGET_EXCEEDED.value("/n-plus-one", "repeat") == before + 1
+    assert BUDGET_EXCEEDED.value("/n-plus-one", "budget") == 0
+    assert "possible N+1" in caplog.text and "4 x SELECT ?" in caplog.text
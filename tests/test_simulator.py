@@ -0,0 +1,52 @@
+import asyncio
+import os
+import random
+
+import httpx
+import pytest
+
+# Ensure tests use a separate SQLite DB file
+os.environ["DATABASE_URL"] = "sqlite:///./test_air_quality.db"
+
+from app.main import app  # noqa: E402  (import after env var set)
+from scripts.simulator import LoadGenerator, ScenarioStats, make_devices, parse_mix  # noqa: E402
+
+
+def test_parse_mix_normalizes_weights():
+    assert parse_mix("ingest=3,alerts=1") == {"ingest": 0.75, "alerts": 0.25}
+    with pytest.raises(ValueError):
+        parse_mix("ingest=1,delete=1")
+
+
+def test_scenario_stats_report_percentiles_and_error_rate():
+    stats = ScenarioStats()
+    for i in range(1, 101):
+        stats.record("200", i / 1000.0, True, 1)
+    stats.record("500", 0.5, False, 1)
+    summary = stats.summary(elapsed=10.0)
+    assert summary["requests"] == 101 and summary["errors"] == 1
+    assert summary["p50_ms"] == 50.0 and summary["p99_ms"] == 99.0 and summary["max_ms"] == 100.0
+    assert summary["statuses"] == {"200": 100, "500": 1}
+    assert summary["readings_per_sec"] == 10.0
+
+
+def test_load_generator_drives_app_in_process():
+    devices = make_devices(500, ["10012"], "Manhattan", random.Random(1))
+
+    async def go():
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://simulator") as client:
+            # One request at a time: SQLite serializes writers, and this checks accounting, not throughput
+            generator = LoadGenerator(
+                client, devices, parse_mix("ingest=4,batch=1,alerts=2,latest=1"), batch_size=5, max_inflight=1, seed=3
+            )
+            return await generator.run(rps=40, duration=1.0, arrivals="uniform")
+
+    report = asyncio.run(go())
+    assert 38 <= report["offered"] <= 40
+    assert report["completed"] + report["skipped"] == report["offered"]
+    assert report["completed"] > 0 and report["errors"] == 0, report
+    assert report["latency"]["p50_ms"] > 0
+    ingested = sum(report["scenarios"][s].get("readings_per_sec", 0) for s in ("ingest", "batch"))
+    assert ingested > 0
+